@@ -1,20 +1,27 @@
 from __future__ import annotations
 
 import os
+import re
+import json
 import uuid
+import wave
 import tempfile
-from typing import List
+from typing import List, Optional
 
 import ffmpeg  # type: ignore
-import requests
+import numpy as np
 
 from .config import settings
+from .clients import http_session
+from .profiles import OutputProfile, resolve
 
 
-def download_audio(url: str, suffix: str = ".mp3") -> str:
-    os.makedirs(settings.tmp_dir, exist_ok=True)
-    local_path = os.path.join(settings.tmp_dir, f"seg-{uuid.uuid4().hex}{suffix}")
-    with requests.get(url, stream=True, timeout=600) as r:
+def download_audio(url: str, suffix: str = ".mp3", dest_dir: Optional[str] = None) -> str:
+    dest_dir = dest_dir or settings.tmp_dir
+    os.makedirs(dest_dir, exist_ok=True)
+    local_path = os.path.join(dest_dir, f"seg-{uuid.uuid4().hex}{suffix}")
+    timeout = (settings.download_connect_timeout, settings.download_read_timeout)
+    with http_session().get(url, stream=True, timeout=timeout) as r:
         r.raise_for_status()
         with open(local_path, "wb") as f:
             for chunk in r.iter_content(chunk_size=8192):
@@ -23,32 +30,106 @@ def download_audio(url: str, suffix: str = ".mp3") -> str:
     return local_path
 
 
-def mock_tone(duration: float = 1.0, frequency: int = 440) -> str:
-    os.makedirs(settings.tmp_dir, exist_ok=True)
-    out_path = os.path.join(settings.tmp_dir, f"mock-{uuid.uuid4().hex}.mp3")
-    # Generate a tone as placeholder audio
-    (
-        ffmpeg
-        .input(f"sine=frequency={frequency}:duration={duration}", f="lavfi")
-        .output(out_path, acodec="libmp3lame", ar=44100, ac=2, **{"qscale:a": 2}, loglevel="error")
-        .overwrite_output()
-        .run()
-    )
+def mock_speech(
+    duration: float, frequency: float = 220.0, sample_rate: int = 24000, dest_dir: Optional[str] = None
+) -> str:
+    """Write a speech-like placeholder WAV (syllable-rate modulated tone) without spawning ffmpeg."""
+    dest_dir = dest_dir or settings.tmp_dir
+    os.makedirs(dest_dir, exist_ok=True)
+    out_path = os.path.join(dest_dir, f"mock-{uuid.uuid4().hex}.wav")
+    t = np.arange(int(duration * sample_rate), dtype=np.float32) / sample_rate
+    # ~4 Hz amplitude envelope roughly matches syllable rate; slight vibrato keeps it from sounding flat
+    envelope = 0.5 * (1.0 - np.cos(2 * np.pi * 4.0 * t))
+    phase = 2 * np.pi * frequency * t + 0.8 * np.sin(2 * np.pi * 5.0 * t)
+    pcm = (0.3 * 32767 * envelope * np.sin(phase)).astype("<i2")
+    with wave.open(out_path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm.tobytes())
     return out_path
 
 
-def concat_and_normalize(inputs: List[str], out_path: str) -> str:
+def concat_and_normalize(inputs: List[str], out_path: str, profile: Optional[OutputProfile] = None) -> str:
     if not inputs:
         raise ValueError("No input audio segments to concatenate")
     os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
 
     streams = [ffmpeg.input(p) for p in inputs]
     joined = ffmpeg.concat(*streams, v=0, a=1)
-    audio = joined.filter("loudnorm")
+    audio = joined.filter("loudnorm", **_loudnorm_targets())
     (
         ffmpeg
-        .output(audio, out_path, acodec="libmp3lame", ar=44100, ac=2, **{"qscale:a": 2}, loglevel="error")
+        .output(audio, out_path, **(profile or resolve()).encode_args(), loglevel="error")
         .overwrite_output()
         .run()
     )
     return out_path
+
+
+def _loudnorm_targets() -> dict:
+    return {"I": settings.loudnorm_i, "TP": settings.loudnorm_tp, "LRA": settings.loudnorm_lra}
+
+
+def measure_loudness(path: str) -> dict:
+    """First loudnorm pass: analyse a segment and return ffmpeg's measured stats."""
+    _, err = (
+        ffmpeg
+        .input(path)
+        .filter("loudnorm", print_format="json", **_loudnorm_targets())
+        .output("-", f="null")
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    # loudnorm prints its JSON block last on stderr
+    blocks = re.findall(r"\{[^{}]*\}", err.decode("utf-8", errors="replace"))
+    if not blocks:
+        raise RuntimeError(f"loudnorm produced no measurement for {path}")
+    return json.loads(blocks[-1])
+
+
+def normalize_segment(in_path: str, out_path: str, profile: Optional[OutputProfile] = None) -> str:
+    """Two-pass loudnorm + encode of a single segment; measured stats are kept next to the output."""
+    stats = measure_loudness(in_path)
+    (
+        ffmpeg
+        .input(in_path)
+        .filter(
+            "loudnorm",
+            measured_I=stats["input_i"],
+            measured_TP=stats["input_tp"],
+            measured_LRA=stats["input_lra"],
+            measured_thresh=stats["input_thresh"],
+            offset=stats["target_offset"],
+            linear="true",
+            **_loudnorm_targets(),
+        )
+        .output(out_path, **(profile or resolve()).encode_args(segment=True), loglevel="error")
+        .overwrite_output()
+        .run()
+    )
+    with open(f"{out_path}.loudnorm.json", "w") as f:
+        json.dump(stats, f)
+    return out_path
+
+
+def concat_segments(inputs: List[str], out_path: str, profile: Optional[OutputProfile] = None) -> str:
+    """Join already-encoded segments with the concat demuxer (stream copy, no re-encode)."""
+    if not inputs:
+        raise ValueError("No input audio segments to concatenate")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    fd, list_path = tempfile.mkstemp(suffix=".txt", dir=os.path.dirname(out_path) or ".")
+    try:
+        with os.fdopen(fd, "w") as f:
+            for p in inputs:
+                escaped = os.path.abspath(p).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        (
+            ffmpeg
+            .input(list_path, f="concat", safe=0)
+            .output(out_path, c="copy", **(profile or resolve()).remux_args(), loglevel="error")
+            .overwrite_output()
+            .run()
+        )
+    finally:
+        os.remove(list_path)
+    return out_path
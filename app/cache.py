@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import os
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+from redis import Redis
+
+from .config import settings
+from .clients import redis_client, s3_client
+
+logger = logging.getLogger(__name__)
+
+
+def segment_key(script: str, preset: str, endpoint: Optional[str] = None) -> str:
+    """Content address of a synthesized segment: same script + preset + endpoint → same audio."""
+    h = hashlib.sha256()
+    for part in (endpoint or settings.fal_url, preset, script):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class LocalSegmentCache:
+    """Size-bounded on-disk cache; file mtime doubles as the LRU clock."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.mp3")
+
+    def _scan(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                p = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+        return entries
+
+    def get(self, key: str, dest_dir: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        os.makedirs(dest_dir, exist_ok=True)
+        # Hand out a private link so eviction can't pull the file from under the job
+        dst = os.path.join(dest_dir, f"seg-{uuid.uuid4().hex}.mp3")
+        try:
+            _link_or_copy(path, dst)
+        except FileNotFoundError:
+            return None
+        return dst
+
+    def put(self, key: str, src_path: str) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.part"
+        _link_or_copy(src_path, tmp)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._scan())
+            else:
+                self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        # Evict down to 90% so we don't rescan on every put once full
+        target = int(self.max_bytes * 0.9)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except FileNotFoundError:
+                pass
+        logger.info("[Cache] Evicted segment cache down to %d bytes", total)
+        self._size = total
+
+
+class SharedSegmentCache:
+    """Local LRU in front of a cluster-wide index in Redis pointing at S3/MinIO objects."""
+
+    prefix = "tts:segcache:"
+
+    def __init__(self, local: LocalSegmentCache):
+        self.local = local
+
+    @property
+    def redis(self) -> Redis:
+        # Looked up on every use: the shared client is rebuilt after a fork, this cache is not
+        return redis_client()
+
+    def get(self, key: str, dest_dir: str) -> Optional[str]:
+        hit = self.local.get(key, dest_dir)
+        if hit:
+            return hit
+        obj_key = self.redis.get(self.prefix + key)
+        if not obj_key:
+            return None
+        os.makedirs(dest_dir, exist_ok=True)
+        dst = os.path.join(dest_dir, f"seg-{uuid.uuid4().hex}.mp3")
+        try:
+            s3_client().download_file(settings.s3_bucket, obj_key.decode(), dst)
+        except Exception as e:
+            logger.warning("[Cache] Shared segment %s unavailable: %s", key[:12], e)
+            return None
+        self.local.put(key, dst)
+        return dst
+
+    def put(self, key: str, src_path: str) -> None:
+        self.local.put(key, src_path)
+        if self.redis.exists(self.prefix + key):
+            return
+        obj_key = f"{settings.segment_cache_prefix}{key}.mp3"
+        s3_client().upload_file(src_path, settings.s3_bucket, obj_key, ExtraArgs={"ContentType": "audio/mpeg"})
+        self.redis.set(self.prefix + key, obj_key, ex=settings.segment_cache_ttl)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_segment_cache():
+    """Return the configured segment cache, or None when caching is disabled."""
+    global _cache
+    if settings.segment_cache == "off":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            local = LocalSegmentCache(settings.segment_cache_dir, settings.segment_cache_max_bytes)
+            if settings.segment_cache == "shared":
+                if not settings.s3_bucket:
+                    raise RuntimeError("STORAGE_BUCKET not configured for shared segment cache")
+                _cache = SharedSegmentCache(local)
+            else:
+                _cache = local
+        return _cache
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import random
+import logging
+from typing import Optional
+
+from redis import Redis
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "tts:chunkstats"
+
+
+def _key(preset: str, source: str) -> str:
+    return f"{PREFIX}:{source}:{preset}"
+
+
+def record(redis: Redis, preset: str, chars: int, seconds: float, ok: bool, source: str = "fal") -> None:
+    """Account one upstream request (including its internal retries) to its size bucket.
+
+    Time is summed over failed and successful requests alike, characters only over successful
+    ones, so secs/char directly reflects what a chunk size costs a document end to end.
+    """
+    bucket = chars // settings.chunk_bucket_chars
+    key = _key(preset, source)
+    pipe = redis.pipeline()
+    # Floats throughout: decay halves the counters
+    pipe.hincrbyfloat(key, f"{bucket}:n", 1)
+    pipe.hincrbyfloat(key, f"{bucket}:secs", seconds)
+    if ok:
+        pipe.hincrbyfloat(key, f"{bucket}:chars", chars)
+    else:
+        pipe.hincrbyfloat(key, f"{bucket}:fail", 1)
+    n = float(pipe.execute()[0])
+    if n > settings.chunk_stats_window:
+        # Halve the bucket so upstream behaviour changes show up within a window's worth of requests
+        fields = [f"{bucket}:{f}" for f in ("n", "secs", "chars", "fail")]
+        values = redis.hmget(key, fields)
+        redis.hset(key, mapping={f: float(v or 0) / 2 for f, v in zip(fields, values)})
+
+
+def stats(redis: Redis, preset: str, source: str = "fal") -> dict[int, dict]:
+    """Per-bucket {"n", "failure_rate", "secs_per_char"} keyed by bucket lower bound in chars."""
+    raw = redis.hgetall(_key(preset, source))
+    buckets: dict[int, dict] = {}
+    for field, value in raw.items():
+        b, name = field.decode().split(":")
+        buckets.setdefault(int(b), {})[name] = float(value)
+    out = {}
+    for b, v in sorted(buckets.items()):
+        n = v.get("n", 0)
+        if n <= 0:
+            continue
+        chars = v.get("chars", 0)
+        out[b * settings.chunk_bucket_chars] = {
+            "n": round(n, 1),
+            "failure_rate": round(v.get("fail", 0) / n, 3),
+            "secs_per_char": round(v.get("secs", 0) / chars, 5) if chars else None,
+        }
+    return out
+
+
+def _clamp(min_chars: int, max_chars: int) -> tuple[int, int]:
+    max_chars = max(settings.chunk_floor_chars, min(max_chars, settings.chunk_ceiling_chars))
+    min_chars = max(settings.chunk_floor_chars, min(min_chars, max_chars))
+    return min_chars, max_chars
+
+
+def override_bounds(min_chars: Optional[int], max_chars: Optional[int]) -> Optional[tuple[int, int]]:
+    """Validate a per-job override; either bound may be omitted. Raises ValueError when out of range."""
+    if min_chars is None and max_chars is None:
+        return None
+    lo, hi = settings.chunk_floor_chars, settings.chunk_ceiling_chars
+    for name, v in (("min_chars", min_chars), ("max_chars", max_chars)):
+        if v is not None and not lo <= v <= hi:
+            raise ValueError(f"{name} must be between {lo} and {hi}")
+    if min_chars is None:
+        min_chars = min(settings.chunk_min_chars, max_chars)
+    if max_chars is None:
+        max_chars = max(settings.chunk_max_chars, min_chars)
+    if min_chars > max_chars:
+        raise ValueError("min_chars must not exceed max_chars")
+    return min_chars, max_chars
+
+
+def choose_bounds(redis: Redis, preset: str, source: str = "fal", explore: bool = True) -> tuple[int, int]:
+    """Pick (min_chars, max_chars) for a new job from the cheapest well-sampled size bucket.
+
+    The splitter fills chunks greedily up to max_chars, so the window (of the configured width)
+    ends at the top of that bucket. A small share of jobs is shifted one bucket either way so
+    neighbouring sizes keep getting measured.
+    """
+    default = _clamp(settings.chunk_min_chars, settings.chunk_max_chars)
+    if not settings.chunk_adaptive:
+        return default
+    try:
+        measured = stats(redis, preset, source)
+    except Exception as e:
+        logger.warning("[TTS] Chunk stats unavailable, using default sizes: %s", e)
+        return default
+    eligible = {
+        b: s["secs_per_char"]
+        for b, s in measured.items()
+        if s["n"] >= settings.chunk_min_samples and s["secs_per_char"] is not None
+    }
+    if not eligible:
+        return default
+    step = settings.chunk_bucket_chars
+    best = min(eligible, key=eligible.get)
+    if explore and random.random() < settings.chunk_explore:
+        best += random.choice((-step, step))
+    width = max(step, settings.chunk_max_chars - settings.chunk_min_chars)
+    return _clamp(best + step - width, best + step - 1)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Optional
+
+import boto3
+import requests
+from redis import Redis
+from botocore.client import Config as BotoConfig
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .config import settings
+
+# One pooled HTTP session, S3 client and Redis client per process, shared by every request/chunk/job.
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_s3 = None
+_redis: Optional[Redis] = None
+
+
+def redis_client() -> Redis:
+    global _redis
+    if _redis is None:
+        with _lock:
+            if _redis is None:
+                _redis = Redis.from_url(settings.redis_url, health_check_interval=30)
+    return _redis
+
+
+def http_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                # Only retry connection setup here: the request never reached the server, so even
+                # POSTs are safe. Status/read failures are handled by call_vibevoice's own backoff.
+                retry = Retry(
+                    total=settings.http_connect_retries,
+                    connect=settings.http_connect_retries,
+                    read=0,
+                    status=0,
+                    other=0,
+                    backoff_factor=0.2,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=settings.http_pool_connections,
+                    pool_maxsize=settings.http_pool_maxsize,
+                    max_retries=retry,
+                )
+                s = requests.Session()
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _session = s
+    return _session
+
+
+def s3_client():
+    global _s3
+    if _s3 is None:
+        with _lock:
+            if _s3 is None:
+                _s3 = boto3.client(
+                    "s3",
+                    endpoint_url=settings.s3_endpoint_url,
+                    region_name=settings.s3_region or "us-east-1",
+                    aws_access_key_id=settings.s3_access_key,
+                    aws_secret_access_key=settings.s3_secret_key,
+                    config=BotoConfig(
+                        signature_version="s3v4",
+                        max_pool_connections=settings.s3_max_pool_connections,
+                        connect_timeout=settings.s3_connect_timeout,
+                        read_timeout=settings.s3_read_timeout,
+                        retries={"max_attempts": settings.s3_max_attempts, "mode": "standard"},
+                    ),
+                )
+    return _s3
+
+
+def pool_stats() -> dict:
+    """Per-host connection reuse for the shared HTTP session (connections opened vs requests sent)."""
+    if _session is None:
+        return {}
+    stats = {}
+    seen = set()
+    for adapter in _session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                # The pool queue is pre-filled with None placeholders; count real idle sockets only
+                "idle": sum(1 for c in list(pool.pool.queue) if c is not None) if pool.pool is not None else 0,
+                "maxsize": settings.http_pool_maxsize,
+            }
+    return stats
+
+
+def _reset_after_fork() -> None:
+    # Sockets must not be shared with a parent process; children build their own pools lazily
+    global _session, _s3, _redis, _lock
+    _lock = threading.Lock()
+    _session = None
+    _s3 = None
+    _redis = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -15,9 +15,44 @@ class Settings:
     redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     queue_name: str = os.getenv("QUEUE_NAME", "tts")
 
+    # Scheduling (priority lanes by estimated job cost)
+    lanes: bool = os.getenv("LANES", "true").lower() in {"1", "true", "yes"}  # off: everything on QUEUE_NAME
+    lane_high_max_chunks: int = int(os.getenv("LANE_HIGH_MAX_CHUNKS", "8"))  # estimated chunks for <queue>-high
+    lane_normal_max_chunks: int = int(os.getenv("LANE_NORMAL_MAX_CHUNKS", "80"))  # above this: <queue>-low
+    fair_share_jobs: int = int(os.getenv("FAIR_SHARE_JOBS", "2"))  # active jobs per submitter before demotion; 0 = off
+    sched_chars_per_page: int = int(os.getenv("SCHED_CHARS_PER_PAGE", "1800"))  # PDF text estimate
+    sched_secs_per_char: float = float(os.getenv("SCHED_SECS_PER_CHAR", "0.03"))  # upstream cost until measured
+    job_timeout_factor: float = float(os.getenv("JOB_TIMEOUT_FACTOR", "3"))  # timeout = factor x estimated runtime
+    job_timeout_min: int = int(os.getenv("JOB_TIMEOUT_MIN", "300"))  # seconds
+    job_timeout_max: int = int(os.getenv("JOB_TIMEOUT_MAX", str(6 * 3600)))  # seconds
+
+    # Uploads
+    max_upload_bytes: int = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024**2)))  # 0 disables the limit
+    upload_chunk_size: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024**2)))
+
+    # Parsing
+    parse_workers: int = int(os.getenv("PARSE_WORKERS", "0"))  # PDF page-extraction processes; 0 = CPU count
+    parse_page_timeout: float = float(os.getenv("PARSE_PAGE_TIMEOUT", "60"))  # seconds per PDF page
+    parse_pool_min_pages: int = int(os.getenv("PARSE_POOL_MIN_PAGES", "16"))  # smaller PDFs are parsed inline
+    parse_txt_block: int = int(os.getenv("PARSE_TXT_BLOCK", str(1024**2)))  # chars read per .txt block
+
+    # Chunk sizing (chars per VibeVoice request)
+    chunk_min_chars: int = int(os.getenv("CHUNK_MIN_CHARS", "400"))  # defaults until enough stats exist
+    chunk_max_chars: int = int(os.getenv("CHUNK_MAX_CHARS", "700"))
+    chunk_adaptive: bool = os.getenv("CHUNK_ADAPTIVE", "true").lower() in {"1", "true", "yes"}
+    chunk_floor_chars: int = int(os.getenv("CHUNK_FLOOR_CHARS", "150"))  # hard limits, also for per-job overrides
+    chunk_ceiling_chars: int = int(os.getenv("CHUNK_CEILING_CHARS", "2000"))
+    chunk_bucket_chars: int = int(os.getenv("CHUNK_BUCKET_CHARS", "100"))  # stats granularity
+    chunk_min_samples: int = int(os.getenv("CHUNK_MIN_SAMPLES", "20"))  # per bucket before it is trusted
+    chunk_stats_window: int = int(os.getenv("CHUNK_STATS_WINDOW", "500"))  # per bucket; older samples decay
+    chunk_explore: float = float(os.getenv("CHUNK_EXPLORE", "0.1"))  # share of jobs trying a neighbouring size
+
     # Storage
     storage_backend: str = os.getenv("STORAGE_BACKEND", "local")  # local | s3
     storage_dir: str = os.path.realpath(os.getenv("STORAGE_DIR", "storage"))
+    # Let a front proxy send file bytes: "" (serve from API) | X-Accel-Redirect | X-Sendfile
+    sendfile_header: str = os.getenv("SENDFILE_HEADER", "")
+    sendfile_prefix: str = os.getenv("SENDFILE_PREFIX", "/protected-files")  # nginx internal location for STORAGE_DIR
 
     # S3 / MinIO
     s3_bucket: str | None = os.getenv("STORAGE_BUCKET")
@@ -25,15 +60,49 @@ class Settings:
     s3_region: str | None = os.getenv("AWS_REGION")
     s3_access_key: str | None = os.getenv("AWS_ACCESS_KEY_ID")
     s3_secret_key: str | None = os.getenv("AWS_SECRET_ACCESS_KEY")
+    s3_max_pool_connections: int = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "16"))
+    s3_connect_timeout: int = int(os.getenv("S3_CONNECT_TIMEOUT", "10"))
+    s3_read_timeout: int = int(os.getenv("S3_READ_TIMEOUT", "60"))
+    s3_max_attempts: int = int(os.getenv("S3_MAX_ATTEMPTS", "5"))
+    s3_multipart_threshold: int = int(os.getenv("S3_MULTIPART_THRESHOLD", str(16 * 1024**2)))
+    s3_multipart_chunksize: int = int(os.getenv("S3_MULTIPART_CHUNKSIZE", str(16 * 1024**2)))
+    s3_upload_concurrency: int = int(os.getenv("S3_UPLOAD_CONCURRENCY", "8"))
 
     # FAL / VibeVoice
     fal_key: str | None = os.getenv("FAL_KEY")
     fal_url: str = os.getenv("FAL_URL", "https://fal.run/fal-ai/vibevoice")
     mock_tts: bool = os.getenv("MOCK_TTS", "false").lower() in {"1", "true", "yes"}
+    mock_tts_latency: float = float(os.getenv("MOCK_TTS_LATENCY", "0"))  # mean seconds per simulated request
+    mock_tts_failure_rate: float = float(os.getenv("MOCK_TTS_FAILURE_RATE", "0"))  # 0..1 per attempt
+    mock_tts_chars_per_second: float = float(os.getenv("MOCK_TTS_CHARS_PER_SECOND", "15"))
+    # Put mock requests through the (UPSTREAM_*-configured) limiter too, e.g. to exercise the breaker
+    mock_upstream_limiter: bool = os.getenv("MOCK_UPSTREAM_LIMITER", "false").lower() in {"1", "true", "yes"}
     # Network behavior
     fal_connect_timeout: int = int(os.getenv("FAL_CONNECT_TIMEOUT", "10"))
     fal_read_timeout: int = int(os.getenv("FAL_READ_TIMEOUT", "300"))  # per request, seconds
     fal_max_attempts: int = int(os.getenv("FAL_MAX_ATTEMPTS", "5"))
+    download_connect_timeout: int = int(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", "10"))
+    download_read_timeout: int = int(os.getenv("DOWNLOAD_READ_TIMEOUT", "600"))
+    # Shared keep-alive HTTP pool (per worker process)
+    http_pool_connections: int = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))  # distinct hosts kept pooled
+    http_pool_maxsize: int = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))  # connections per host; >= TTS_CONCURRENCY
+    http_connect_retries: int = int(os.getenv("HTTP_CONNECT_RETRIES", "2"))
+    # Cluster-wide admission control for the VibeVoice endpoint (state in Redis, shared by all workers)
+    upstream_limiter: bool = os.getenv("UPSTREAM_LIMITER", "true").lower() in {"1", "true", "yes"}
+    upstream_rate: float = float(os.getenv("UPSTREAM_RATE", "5"))  # starting requests/second
+    upstream_rate_min: float = float(os.getenv("UPSTREAM_RATE_MIN", "0.2"))
+    upstream_rate_max: float = float(os.getenv("UPSTREAM_RATE_MAX", "50"))
+    upstream_rate_increase: float = float(os.getenv("UPSTREAM_RATE_INCREASE", "0.1"))  # per success
+    upstream_burst: int = int(os.getenv("UPSTREAM_BURST", "10"))
+    upstream_concurrency: int = int(os.getenv("UPSTREAM_CONCURRENCY", "16"))  # starting requests in flight
+    upstream_concurrency_min: int = int(os.getenv("UPSTREAM_CONCURRENCY_MIN", "1"))
+    upstream_concurrency_max: int = int(os.getenv("UPSTREAM_CONCURRENCY_MAX", "64"))
+    upstream_decrease_factor: float = float(os.getenv("UPSTREAM_DECREASE_FACTOR", "0.5"))  # on 429/503/504/timeout
+    upstream_decrease_cooldown: float = float(os.getenv("UPSTREAM_DECREASE_COOLDOWN", "2"))  # seconds
+    upstream_breaker_threshold: int = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "5"))  # failures to open
+    upstream_breaker_window: float = float(os.getenv("UPSTREAM_BREAKER_WINDOW", "60"))  # seconds
+    upstream_breaker_cooldown: float = float(os.getenv("UPSTREAM_BREAKER_COOLDOWN", "30"))  # open → probe
+    upstream_breaker_max_wait: float = float(os.getenv("UPSTREAM_BREAKER_MAX_WAIT", "120"))  # park, then fail
     fallback_preset: str = os.getenv("FALLBACK_PRESET", "Frank [EN]")
     presets: list[str] = field(default_factory=lambda: (
         [p.strip() for p in os.getenv("PRESETS", "").split(",") if p.strip()]
@@ -47,9 +116,75 @@ class Settings:
         ]
     ))
 
+    # Assembly
+    assembly_mode: str = os.getenv("ASSEMBLY_MODE", "single")  # single (one concat+loudnorm graph) | segmented
+    loudnorm_i: float = float(os.getenv("LOUDNORM_I", "-24"))
+    loudnorm_tp: float = float(os.getenv("LOUDNORM_TP", "-2"))
+    loudnorm_lra: float = float(os.getenv("LOUDNORM_LRA", "7"))
+
+    # Output profile (per-job override on POST /tts)
+    output_format: str = os.getenv("OUTPUT_FORMAT", "mp3")  # mp3 | aac (.m4a) | opus (.ogg)
+    # Empty/0 = the format's default: 44.1 kHz stereo VBR for mp3, 24 kHz mono 48k/32k for aac/opus
+    output_bitrate: str = os.getenv("OUTPUT_BITRATE", "")  # e.g. 48k, or vbr (mp3)
+    output_channels: int = int(os.getenv("OUTPUT_CHANNELS") or "0")
+    output_sample_rate: int = int(os.getenv("OUTPUT_SAMPLE_RATE") or "0")
+
+    # Progressive playback (HLS playlist of segments as they finish)
+    stream_output: bool = os.getenv("STREAM_OUTPUT", "false").lower() in {"1", "true", "yes"}
+    stream_ttl: int = int(os.getenv("STREAM_TTL", str(24 * 3600)))  # seconds
+    stream_target_duration: int = int(os.getenv("STREAM_TARGET_DURATION", "60"))  # HLS EXT-X-TARGETDURATION floor
+
     # Runtime
     tmp_dir: str = os.path.realpath(os.getenv("TMP_DIR", "tmp"))
+    disk_min_free_bytes: int = int(os.getenv("DISK_MIN_FREE_BYTES", str(2 * 1024**3)))  # on TMP_DIR's volume
+    disk_wait_max: int = int(os.getenv("DISK_WAIT_MAX", "600"))  # seconds a job waits for space before failing
+    sweep_interval: int = int(os.getenv("SWEEP_INTERVAL", "600"))  # seconds between orphan sweeps per host; 0 = off
+    sweep_grace: int = int(os.getenv("SWEEP_GRACE", "3600"))  # min age of loose files/workspaces before removal
+    upload_retention: int = int(os.getenv("UPLOAD_RETENTION", "86400"))  # uploads of failed jobs, for resume
     tts_job_timeout: int = int(os.getenv("TTS_JOB_TIMEOUT", "1800"))  # seconds
+    tts_concurrency: int = int(os.getenv("TTS_CONCURRENCY", "4"))  # chunks in flight per job
+    tts_job_retries: int = int(os.getenv("TTS_JOB_RETRIES", "1"))  # automatic RQ retries; each resumes from its checkpoint
+    tts_job_retry_interval: int = int(os.getenv("TTS_JOB_RETRY_INTERVAL", "0"))  # seconds; >0 needs --with-scheduler
+    pipeline_prefetch: int = int(os.getenv("PIPELINE_PREFETCH", "4"))  # split chunks queued ahead of synthesis
+    distributed: bool = os.getenv("DISTRIBUTED", "false").lower() in {"1", "true", "yes"}  # default for POST /tts
+    distributed_batch_chunks: int = int(os.getenv("DISTRIBUTED_BATCH_CHUNKS", "8"))  # chunks per part job
+
+    # Worker supervisor (start_supervisor.py: preloaded, forked SimpleWorkers on one node)
+    workers_min: int = int(os.getenv("WORKERS_MIN", "1"))
+    workers_max: int = int(os.getenv("WORKERS_MAX", str(os.cpu_count() or 2)))
+    workers_scale_interval: float = float(os.getenv("WORKERS_SCALE_INTERVAL", "5"))  # seconds between queue-depth checks
+    workers_idle_grace: int = int(os.getenv("WORKERS_IDLE_GRACE", "120"))  # empty-queue seconds before scaling down
+    worker_max_jobs: int = int(os.getenv("WORKER_MAX_JOBS", "200"))  # jobs before a child is recycled; 0 = never
+    worker_max_rss_bytes: int = int(os.getenv("WORKER_MAX_RSS_BYTES", str(2 * 1024**3)))  # checked after each job; 0 = off
+    worker_restart_backoff_max: int = int(os.getenv("WORKER_RESTART_BACKOFF_MAX", "60"))  # seconds, after repeated crashes
+    worker_log_level: str = os.getenv("WORKER_LOG_LEVEL", "INFO")
+
+    # Chunk checkpoints (resume interrupted jobs without re-synthesizing finished chunks)
+    checkpoints: bool = os.getenv("CHECKPOINTS", "true").lower() in {"1", "true", "yes"}
+    checkpoint_dir: str = os.path.realpath(os.getenv("CHECKPOINT_DIR", "checkpoints"))  # local backend; share it across workers
+    checkpoint_prefix: str = os.getenv("CHECKPOINT_PREFIX", "checkpoints/")  # S3 key prefix
+    checkpoint_ttl: int = int(os.getenv("CHECKPOINT_TTL", str(7 * 24 * 3600)))  # Redis manifest, seconds
+    checkpoint_manifest_every: int = int(os.getenv("CHECKPOINT_MANIFEST_EVERY", "10"))  # chunks per durable copy
+
+    # Progress events (Redis pub/sub → SSE)
+    progress_interval: float = float(os.getenv("PROGRESS_INTERVAL", "0.5"))  # min seconds between meta saves/events
+    job_index_ttl: int = int(os.getenv("JOB_INDEX_TTL", str(7 * 24 * 3600)))  # job listing retention, seconds
+    events_keepalive: float = float(os.getenv("EVENTS_KEEPALIVE", "15"))  # SSE keepalive + resync from job, seconds
+
+    # Metrics (per-job stage timings + Prometheus /metrics, aggregated in Redis)
+    metrics_enabled: bool = os.getenv("METRICS", "true").lower() in {"1", "true", "yes"}
+    metrics_flush_interval: float = float(os.getenv("METRICS_FLUSH_INTERVAL", "10"))  # seconds per process
+
+    # Segment cache (content-addressed by preset + script + endpoint)
+    segment_cache: str = os.getenv("SEGMENT_CACHE", "local")  # off | local | shared
+    segment_cache_dir: str = os.path.realpath(os.getenv("SEGMENT_CACHE_DIR", "cache/segments"))
+    segment_cache_max_bytes: int = int(os.getenv("SEGMENT_CACHE_MAX_BYTES", str(2 * 1024**3)))
+    segment_cache_ttl: int = int(os.getenv("SEGMENT_CACHE_TTL", str(30 * 24 * 3600)))  # shared index, seconds
+    segment_cache_prefix: str = os.getenv("SEGMENT_CACHE_PREFIX", "segments/")  # S3 key prefix
+
+    # Document dedupe (keyed on upload content hash)
+    dedupe_enabled: bool = os.getenv("DEDUPE_ENABLED", "true").lower() in {"1", "true", "yes"}
+    dedupe_ttl: int = int(os.getenv("DEDUPE_TTL", str(24 * 3600)))  # seconds; keep below presigned URL expiry
 
 
 settings = Settings()
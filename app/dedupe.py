@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import os
+import re
+import json
+import uuid
+import logging
+from typing import Iterable, Iterator, Optional
+
+from redis import Redis
+from rq.job import Job
+
+from .config import settings
+from . import fanout
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "tts:dedupe"
+
+# Upload hashes are sha256 hex digests; anything else could carry SCAN glob characters
+_CONTENT_HASH = re.compile(r"[0-9a-f]{64}")
+
+
+def _audio_key(content_hash: str, preset: str, output: str) -> str:
+    # The same document rendered with another output profile is different audio
+    return f"{PREFIX}:audio:{content_hash}:{preset}:{output}"
+
+
+def _inflight_key(content_hash: str, preset: str, output: str) -> str:
+    return f"{PREFIX}:inflight:{content_hash}:{preset}:{output}"
+
+
+def _chunks_key(content_hash: str, bounds: tuple[int, int]) -> str:
+    # Chunking depends on the splitter bounds as much as on the document
+    return f"{PREFIX}:chunks:{content_hash}:{bounds[0]}-{bounds[1]}"
+
+
+def _bounds_key(content_hash: str) -> str:
+    # Bounds of the chunk list last recorded for a document, so later jobs can reuse it
+    return f"{PREFIX}:bounds:{content_hash}"
+
+
+def _still_available(audio_url: str) -> bool:
+    # Local files can be removed out from under us; presigned S3 URLs outlive DEDUPE_TTL
+    if audio_url.startswith("/files/"):
+        return os.path.exists(os.path.join(settings.storage_dir, audio_url[len("/files/"):]))
+    return True
+
+
+def lookup_audio(redis: Redis, content_hash: str, preset: str, output: str) -> Optional[dict]:
+    """Return {"audio_url", "job_id"} of a finished identical submission, if still valid."""
+    raw = redis.get(_audio_key(content_hash, preset, output))
+    if not raw:
+        return None
+    hit = json.loads(raw)
+    if not _still_available(hit.get("audio_url") or ""):
+        redis.delete(_audio_key(content_hash, preset, output))
+        return None
+    return hit
+
+
+def record_audio(
+    redis: Redis, content_hash: str, preset: str, output: str, audio_url: str, job_id: Optional[str]
+) -> None:
+    redis.set(
+        _audio_key(content_hash, preset, output),
+        json.dumps({"audio_url": audio_url, "job_id": job_id}),
+        ex=settings.dedupe_ttl,
+    )
+
+
+def claim_inflight(redis: Redis, content_hash: str, preset: str, output: str, job_id: str) -> Optional[str]:
+    """Register job_id as the one producing this audio; returns the id of a live job that already is."""
+    key = _inflight_key(content_hash, preset, output)
+    # Bound by how long a job may legitimately sit in the queue and run
+    ttl = max(settings.tts_job_timeout, settings.job_timeout_max) * 2
+    if redis.set(key, job_id, nx=True, ex=ttl):
+        return None
+    existing = redis.get(key)
+    if existing:
+        existing_id = existing.decode()
+        try:
+            job = Job.fetch(existing_id, connection=redis)
+            status = job.get_status(refresh=True)
+            if status == "finished" and job.meta.get("finalize_job_id"):
+                # A distributed parent finishes once its parts are enqueued; its finalize job
+                # records or releases the claim, so the document is still in flight until then
+                status = fanout.parent_status(redis, job)["status"]
+        except Exception:
+            status = None
+        if status in {"queued", "started", "deferred", "scheduled"}:
+            return existing_id
+    # Stale claim (job gone, failed or finished without recording audio) — take it over
+    redis.set(key, job_id, ex=ttl)
+    return None
+
+
+def release_inflight(redis: Redis, content_hash: str, preset: str, output: str, job_id: Optional[str]) -> None:
+    key = _inflight_key(content_hash, preset, output)
+    current = redis.get(key)
+    if current is not None and (job_id is None or current.decode() == job_id):
+        redis.delete(key)
+
+
+def recorded_bounds(redis: Redis, content_hash: str) -> Optional[tuple[int, int]]:
+    """Splitter bounds of the document's cached chunks, if any; adaptive sizing would rarely hit them again."""
+    raw = redis.get(_bounds_key(content_hash))
+    if not raw:
+        return None
+    lo, _, hi = raw.decode().partition("-")
+    return int(lo), int(hi)
+
+
+def load_chunks(redis: Redis, content_hash: str, bounds: tuple[int, int]) -> Optional[list[str]]:
+    chunks = redis.lrange(_chunks_key(content_hash, bounds), 0, -1)
+    if not chunks:
+        return None
+    return [c.decode("utf-8") for c in chunks]
+
+
+def record_chunks(redis: Redis, content_hash: str, bounds: tuple[int, int], chunks: Iterable[str]) -> Iterator[str]:
+    """Pass chunks through while appending them to a staging list; published only if the stream completes."""
+    key = _chunks_key(content_hash, bounds)
+    staging = f"{key}:staging:{uuid.uuid4().hex}"
+    count = 0
+    for chunk in chunks:
+        pipe = redis.pipeline()
+        pipe.rpush(staging, chunk)
+        # A stream abandoned mid-way (job failed) expires along with the job
+        pipe.expire(staging, settings.tts_job_timeout * 2)
+        pipe.execute()
+        count += 1
+        yield chunk
+    if count:
+        pipe = redis.pipeline()
+        pipe.rename(staging, key)
+        pipe.expire(key, settings.dedupe_ttl)
+        pipe.set(_bounds_key(content_hash), f"{bounds[0]}-{bounds[1]}", ex=settings.dedupe_ttl)
+        pipe.execute()
+
+
+def valid_content_hash(content_hash: str) -> bool:
+    return bool(_CONTENT_HASH.fullmatch(content_hash))
+
+
+def invalidate(redis: Redis, content_hash: str) -> int:
+    """Drop every cached artefact (chunks and their bounds, audio for all presets and profiles) for a document; returns keys removed."""
+    if not valid_content_hash(content_hash):
+        raise ValueError("content_hash must be a sha256 hex digest (64 lowercase hex characters)")
+    # Only the preset/profile or bounds suffix varies; the hash itself is matched exactly
+    keys = [
+        k
+        for pattern in (
+            _audio_key(content_hash, "*", "*"),
+            _chunks_key(content_hash, ("*", "*")),
+            _bounds_key(content_hash),
+        )
+        for k in redis.scan_iter(match=pattern, count=500)
+        if b":staging:" not in k
+    ]
+    return redis.delete(*keys) if keys else 0
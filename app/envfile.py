@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+# Imported by the start_* scripts before app.config, whose settings are read at import time.
+# Deliberately nothing else from app/ here.
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+
+
+def load_env(path: Optional[str] = None) -> int:
+    """Lightweight .env loader (no external dependency); returns how many variables it set.
+
+    Variables already in the environment win over the file.
+    """
+    path = path or DEFAULT_PATH
+    if not os.path.exists(path):
+        return 0
+    loaded = 0
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, val = line.split("=", 1)
+            key = key.strip()
+            # Trailing "# comment" as in .env.example, unless the value is quoted
+            val = val.strip()
+            if val[:1] not in {'"', "'"}:
+                val = val.split(" #", 1)[0].strip()
+            val = val.strip('"').strip("'")
+            if key and key not in os.environ:
+                os.environ[key] = val
+                loaded += 1
+    return loaded
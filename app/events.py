@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import json
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+import redis.asyncio as aioredis
+from redis import Redis
+
+from .config import settings
+from . import jobindex, metrics
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "tts:events"
+# Stopped and canceled jobs never move on by themselves (a resume starts a new event stream)
+TERMINAL = {"finished", "failed", "stopped", "canceled"}
+# Meta fields that clients see; the rest (cache stats, pool stats, ...) is only persisted
+PUBLIC_FIELDS = ("total_chunks", "processed_chunks", "stream")
+
+
+def _channel(job_id: str) -> str:
+    return f"{CHANNEL_PREFIX}:{job_id}"
+
+
+def timestamp(value) -> Optional[float]:
+    """Epoch seconds from RQ's naive-UTC datetimes (or pass a number through)."""
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+    return value
+
+
+def publish(redis: Redis, job_id: str, event: dict) -> None:
+    redis.publish(_channel(job_id), json.dumps(event))
+
+
+class ProgressPublisher:
+    """Worker side: job meta updates, saved and published at most every PROGRESS_INTERVAL.
+
+    Updates in between are merged; a timer flushes the last one so clients never stay behind
+    for longer than the interval. Terminal events are published immediately. The job listing
+    index (app.jobindex) is kept in step with the same writes.
+    """
+
+    def __init__(self, job, redis: Redis, started_at: Optional[float] = None):
+        self.job = job
+        self.redis = redis
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_flush = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._started_at = started_at or time.time()
+        self._created_at = self._started_at
+        if job is not None:
+            self._created_at = timestamp(job.meta.get("created_at") or job.created_at) or self._started_at
+
+    def _index(self, status: Optional[str] = None, **fields) -> None:
+        try:
+            if status:
+                jobindex.set_status(self.redis, self.job.id, status, self._created_at, **fields)
+            else:
+                jobindex.update(self.redis, self.job.id, **fields)
+        except Exception as e:
+            logger.warning("[TTS] Could not update job index for %s: %s", self.job.id, e)
+
+    def start(self) -> None:
+        if self.job is None:
+            return
+        queued = max(0.0, self._started_at - self._created_at)
+        self._index("started", started_at=self._started_at, queued_seconds=round(queued, 3))
+        metrics.observe("tts_job_queue_seconds", queued, lane=self.job.meta.get("lane") or "default")
+
+    def update(self, **fields) -> None:
+        if self.job is None:
+            return
+        with self._lock:
+            self.job.meta.update(fields)
+            self._dirty = True
+            wait = settings.progress_interval - (time.monotonic() - self._last_flush)
+            if wait <= 0:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._dirty:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        try:
+            self.job.save_meta()
+            event = {k: self.job.meta.get(k) for k in PUBLIC_FIELDS}
+            self._publish({"status": "started", **event})
+        except Exception as e:
+            # Progress is advisory; never fail a job over it
+            logger.warning("[TTS] Could not publish progress for %s: %s", self.job.id, e)
+        self._index(total_chunks=self.job.meta.get("total_chunks"), processed_chunks=self.job.meta.get("processed_chunks"))
+
+    def _publish(self, event: dict) -> None:
+        publish(self.redis, self.job.id, event)
+
+    def finish(self, audio_url: str) -> None:
+        self._terminal({"status": "finished", "audio_url": audio_url})
+
+    def fail(self, exc: BaseException) -> None:
+        # Same shape as the last line of RQ's exc_info, which GET /tts/{job_id} reports
+        self._terminal({"status": "failed", "error": f"{type(exc).__name__}: {exc}"})
+
+    def requeued(self, exc: BaseException) -> None:
+        """The attempt failed but RQ will retry it: back to queued (not terminal, so SSE clients stay)."""
+        if self.job is None:
+            return
+        self.flush()
+        error = f"{type(exc).__name__}: {exc}"
+        self._index("queued", error=error)
+        try:
+            self._publish({**{k: self.job.meta.get(k) for k in PUBLIC_FIELDS}, "status": "queued", "error": error})
+        except Exception as e:
+            logger.warning("[TTS] Could not publish retry for %s: %s", self.job.id, e)
+
+    def _terminal(self, event: dict) -> None:
+        if self.job is None:
+            return
+        self.flush()
+        ended_at = time.time()
+        metrics.observe("tts_job_seconds", ended_at - self._started_at, status=event["status"])
+        self._index(
+            event["status"],
+            ended_at=ended_at,
+            run_seconds=round(ended_at - self._started_at, 3),
+            audio_url=event.get("audio_url"),
+            error=event.get("error"),
+        )
+        try:
+            self._publish({**{k: self.job.meta.get(k) for k in PUBLIC_FIELDS}, **event})
+        except Exception as e:
+            logger.warning("[TTS] Could not publish completion for %s: %s", self.job.id, e)
+
+
+class EventHub:
+    """API side: one pattern subscription per process, fanned out to per-request queues.
+
+    However many clients are watching, each API process holds a single pub/sub connection.
+    """
+
+    def __init__(self):
+        self._subs: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready: Optional[asyncio.Event] = None
+
+    async def subscribe(self, job_id: str) -> asyncio.Queue:
+        self._ensure_running()
+        try:
+            # Don't hand out a queue before the subscription is live, or early events are lost
+            await asyncio.wait_for(self._ready.wait(), timeout=2)
+        except asyncio.TimeoutError:
+            logger.warning("Event hub not connected yet; subscriber for %s relies on resync", job_id)
+        q: asyncio.Queue = asyncio.Queue(maxsize=16)
+        self._subs.setdefault(job_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, job_id: str, q: asyncio.Queue) -> None:
+        subs = self._subs.get(job_id)
+        if subs is not None:
+            subs.discard(q)
+            if not subs:
+                del self._subs[job_id]
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._ready = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    def _dispatch(self, job_id: str, event: dict) -> None:
+        for q in list(self._subs.get(job_id, ())):
+            if q.full():
+                # Slow consumer: only the newest state matters
+                q.get_nowait()
+            q.put_nowait(event)
+
+    async def _run(self) -> None:
+        prefix = len(CHANNEL_PREFIX) + 1
+        while True:
+            client = aioredis.Redis.from_url(settings.redis_url)
+            try:
+                pubsub = client.pubsub()
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}:*")
+                self._ready.set()
+                async for msg in pubsub.listen():
+                    if msg["type"] != "pmessage":
+                        continue
+                    try:
+                        self._dispatch(msg["channel"].decode()[prefix:], json.loads(msg["data"]))
+                    except ValueError:
+                        continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Event hub lost Redis (%s); reconnecting", e)
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await client.aclose()
+                except Exception:
+                    pass
+
+
+event_hub = EventHub()
+
+
+def sse(data: dict, event: Optional[str] = None) -> str:
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import time
+import logging
+import threading
+from typing import Iterator, List, Optional
+
+from redis import Redis
+from rq.job import Job
+
+from .config import settings
+from . import jobindex
+from .events import PUBLIC_FIELDS, publish
+from .manifest import PREFIX as MANIFEST_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Distributed jobs: the parent (planner) job splits the document into part jobs of
+# DISTRIBUTED_BATCH_CHUNKS chunks each, which any worker on the queue can pick up, plus a
+# finalize job that depends on all of them. Progress is aggregated under the parent job id.
+PREFIX = "tts:fanout"
+# Summed over parts; processed_chunks is read off the shared checkpoint manifest instead, which
+# stays exact when a part is retried
+COUNTERS = ("cache_hits", "cache_misses", "resumed_chunks")
+
+
+def _key(parent_id: str) -> str:
+    return f"{PREFIX}:{parent_id}"
+
+
+def _chunks_key(parent_id: str) -> str:
+    return f"{PREFIX}:{parent_id}:chunks"
+
+
+def part_job_id(parent_id: str, part: int) -> str:
+    return f"{parent_id}-part-{part:04d}"
+
+
+def finalize_job_id(parent_id: str) -> str:
+    return f"{parent_id}-finalize"
+
+
+def parent_of(job_id: str) -> Optional[str]:
+    """The parent id of a part or finalize job id; None for any other job."""
+    if job_id.endswith("-finalize"):
+        return job_id[: -len("-finalize")]
+    head, sep, part = job_id.rpartition("-part-")
+    return head if sep and part.isdigit() else None
+
+
+def reset(redis: Redis, parent_id: str) -> None:
+    redis.delete(_key(parent_id), _chunks_key(parent_id))
+
+
+def push_chunks(redis: Redis, parent_id: str, chunks: List[str]) -> None:
+    pipe = redis.pipeline()
+    pipe.rpush(_chunks_key(parent_id), *chunks)
+    pipe.expire(_chunks_key(parent_id), settings.checkpoint_ttl)
+    pipe.execute()
+
+
+def load_chunks(redis: Redis, parent_id: str, first: int = 1, count: Optional[int] = None) -> List[str]:
+    """Chunks first..first+count-1 (1-based, like chunk indexes); all of them without count."""
+    last = -1 if count is None else first + count - 2
+    return [c.decode("utf-8") for c in redis.lrange(_chunks_key(parent_id), first - 1, last)]
+
+
+def set_plan(redis: Redis, parent_id: str, **fields) -> None:
+    pipe = redis.pipeline()
+    pipe.hset(_key(parent_id), mapping=fields)
+    pipe.expire(_key(parent_id), settings.checkpoint_ttl)
+    pipe.execute()
+
+
+def progress(redis: Redis, parent_id: str) -> dict:
+    pipe = redis.pipeline(transaction=False)
+    pipe.hgetall(_key(parent_id))
+    pipe.hlen(f"{MANIFEST_PREFIX}:{parent_id}")
+    raw, recorded = pipe.execute()
+    raw = {k.decode(): int(v) for k, v in raw.items()}
+    out = {k: raw.get(k) for k in ("total_chunks", "parts", *COUNTERS)}
+    # One manifest field is the chunking info, the rest are finished chunks; once the manifest
+    # is cleared the finalize job has stored the final count
+    out["processed_chunks"] = raw.get("processed_chunks", max(0, recorded - 1))
+    return out
+
+
+def clear(redis: Redis, parent_id: str, processed: int) -> None:
+    # Counters stay for status reads until they expire; the chunk texts are no longer needed
+    set_plan(redis, parent_id, processed_chunks=processed)
+    redis.delete(_chunks_key(parent_id))
+
+
+class PartProgress:
+    """Progress sink for part jobs, with the ProgressPublisher interface the synthesis loop uses.
+
+    Per-part counters are added to the parent's totals as deltas; the aggregate is published on
+    the parent's event channel and job index at most every PROGRESS_INTERVAL per part.
+    """
+
+    def __init__(self, redis: Redis, parent_id: str, report: bool = True):
+        self.redis = redis
+        self.parent_id = parent_id
+        self.report = report
+        self._seen = {k: 0 for k in COUNTERS}
+        self._lock = threading.Lock()
+        self._last_publish = 0.0
+        self._dirty = False
+
+    def update(self, **fields) -> None:
+        if not self.report:
+            return
+        with self._lock:
+            deltas = {k: int(fields[k] or 0) - self._seen[k] for k in COUNTERS if k in fields}
+            deltas = {k: d for k, d in deltas.items() if d}
+            if deltas:
+                pipe = self.redis.pipeline()
+                for k, d in deltas.items():
+                    pipe.hincrby(_key(self.parent_id), k, d)
+                    self._seen[k] += d
+                pipe.execute()
+            if "processed_chunks" in fields:
+                self._dirty = True
+            if self._dirty and time.monotonic() - self._last_publish >= settings.progress_interval:
+                self._publish_locked()
+
+    def flush(self, force: bool = False) -> None:
+        with self._lock:
+            if self._dirty or force:
+                self._publish_locked()
+
+    def _publish_locked(self) -> None:
+        self._dirty = False
+        self._last_publish = time.monotonic()
+        try:
+            agg = progress(self.redis, self.parent_id)
+            event = {k: agg.get(k) for k in PUBLIC_FIELDS}
+            publish(self.redis, self.parent_id, {**event, "status": "started", "stream": False})
+            jobindex.update(self.redis, self.parent_id, total_chunks=agg["total_chunks"], processed_chunks=agg["processed_chunks"])
+        except Exception as e:
+            logger.warning("[TTS] Could not publish progress for %s: %s", self.parent_id, e)
+
+
+def parent_status(redis: Redis, job: Job) -> dict:
+    """Status of a distributed job: the finalize job's outcome plus the aggregated part progress."""
+    agg = progress(redis, job.id)
+    out = {"status": "started", "audio_url": None, "error": None, **agg}
+    try:
+        final = Job.fetch(job.meta["finalize_job_id"], connection=redis)
+    except Exception:
+        return out
+    status = final.get_status()
+    if status == "finished":
+        out.update(status="finished", audio_url=final.result)
+    elif status in {"failed", "stopped", "canceled"}:
+        error = str(final.exc_info).splitlines()[-1] if final.exc_info else f"Finalize job {status}"
+        out.update(status="failed", error=error)
+    return out
+
+
+def iter_batches(chunks: Iterator[str], size: int) -> Iterator[List[str]]:
+    batch: List[str] = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
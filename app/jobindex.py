@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import time
+from typing import Iterable, Optional
+
+from redis import Redis
+
+from .config import settings
+
+# Secondary index of TTS jobs: one sorted set by creation time for all jobs and one per status
+# (same score, so every listing is newest-first), plus a hash per job with the fields listings show.
+PREFIX = "tts:jobs"
+STATUSES = ("queued", "started", "finished", "failed")
+FIELDS = (
+    "job_id",
+    "status",
+    "filename",
+    "preset",
+    "created_at",
+    "started_at",
+    "ended_at",
+    "queued_seconds",
+    "run_seconds",
+    "total_chunks",
+    "processed_chunks",
+    "audio_url",
+    "error",
+)
+_NUMERIC = {"created_at", "started_at", "ended_at", "queued_seconds", "run_seconds"}
+_INTEGER = {"total_chunks", "processed_chunks"}
+
+
+def _all_key() -> str:
+    return f"{PREFIX}:created"
+
+
+def _status_key(status: str) -> str:
+    return f"{PREFIX}:status:{status}"
+
+
+def _job_key(job_id: str) -> str:
+    return f"{PREFIX}:job:{job_id}"
+
+
+def _encode(fields: dict) -> dict:
+    # Unknown values (None) are left out rather than stored as strings
+    return {k: v for k, v in fields.items() if v is not None}
+
+
+def _decode(raw: dict) -> Optional[dict]:
+    if not raw:
+        return None
+    out: dict = {k: None for k in FIELDS}
+    for k, v in raw.items():
+        k, v = k.decode(), v.decode()
+        if k in _NUMERIC:
+            out[k] = float(v)
+        elif k in _INTEGER:
+            out[k] = int(v)
+        else:
+            out[k] = v
+    return out
+
+
+def add(redis: Redis, job_id: str, filename: str, preset: str, created_at: Optional[float] = None) -> None:
+    """Index a freshly enqueued job and prune entries older than JOB_INDEX_TTL."""
+    created_at = created_at or time.time()
+    pipe = redis.pipeline(transaction=False)
+    pipe.hset(
+        _job_key(job_id),
+        mapping={"job_id": job_id, "status": "queued", "filename": filename, "preset": preset, "created_at": created_at},
+    )
+    pipe.expire(_job_key(job_id), settings.job_index_ttl)
+    pipe.zadd(_all_key(), {job_id: created_at})
+    pipe.zadd(_status_key("queued"), {job_id: created_at})
+    # Hashes expire on their own; the sorted sets are trimmed here, one page at a time
+    pipe.zrangebyscore(_all_key(), "-inf", created_at - settings.job_index_ttl, start=0, num=500)
+    expired = pipe.execute()[-1]
+    if expired:
+        pipe = redis.pipeline(transaction=False)
+        for key in (_all_key(), *(_status_key(s) for s in STATUSES)):
+            pipe.zrem(key, *expired)
+        pipe.delete(*(_job_key(j.decode()) for j in expired))
+        pipe.execute()
+
+
+def set_status(redis: Redis, job_id: str, status: str, created_at: float, **fields) -> None:
+    """Move a job to another status set and update its hash, in one round trip.
+
+    Fields passed as None are removed, so a retried job doesn't keep its earlier error or outcome.
+    """
+    pipe = redis.pipeline(transaction=True)
+    for s in STATUSES:
+        if s != status:
+            pipe.zrem(_status_key(s), job_id)
+    pipe.zadd(_status_key(status), {job_id: created_at})
+    cleared = [k for k, v in fields.items() if v is None]
+    if cleared:
+        pipe.hdel(_job_key(job_id), *cleared)
+    pipe.hset(_job_key(job_id), mapping=_encode({"status": status, **fields}))
+    pipe.expire(_job_key(job_id), settings.job_index_ttl)
+    pipe.execute()
+
+
+def update(redis: Redis, job_id: str, **fields) -> None:
+    values = _encode(fields)
+    if values:
+        redis.hset(_job_key(job_id), mapping=values)
+
+
+def _parse_cursor(cursor: str) -> tuple[float, Optional[str]]:
+    """"<created_at>:<job_id>" from a previous page; a bare created_at (older clients) has no id."""
+    score, _, job_id = cursor.partition(":")
+    try:
+        return float(score), job_id or None
+    except ValueError:
+        raise ValueError("cursor must be a next_cursor value from a previous page") from None
+
+
+def list_jobs(redis: Redis, status: Optional[str] = None, cursor: Optional[str] = None, limit: int = 50) -> dict:
+    """Newest-first page of jobs after `cursor` (the next_cursor of a previous page).
+
+    Jobs created at the same instant are ordered by id, which the cursor carries, so none are
+    skipped at a page boundary. Two round trips whatever the page size: ids + per-status counts,
+    then every hash.
+    """
+    key = _status_key(status) if status else _all_key()
+    score, last_id = _parse_cursor(cursor) if cursor is not None else (None, None)
+    pipe = redis.pipeline(transaction=False)
+    if last_id is not None:
+        # Same created_at as the last job shown: newest-first lists these by descending id
+        pipe.zrevrangebyscore(key, score, score, withscores=True)
+    pipe.zrevrangebyscore(key, f"({score}" if score is not None else "+inf", "-inf", start=0, num=limit + 1, withscores=True)
+    for s in STATUSES:
+        pipe.zcard(_status_key(s))
+    results = pipe.execute()
+    ties = results.pop(0) if last_id is not None else []
+    older, *counts = results
+    page = [(job_id, s) for job_id, s in ties if job_id.decode() < last_id] + older
+    more = len(page) > limit
+    page = page[:limit]
+
+    pipe = redis.pipeline(transaction=False)
+    for job_id, _ in page:
+        pipe.hgetall(_job_key(job_id.decode()))
+    # A hash that expired ahead of the sorted-set trim decodes to None and is skipped
+    jobs = [job for job in map(_decode, pipe.execute()) if job]
+    return {
+        "jobs": jobs,
+        "next_cursor": f"{page[-1][1]!r}:{page[-1][0].decode()}" if more else None,
+        "counts": dict(zip(STATUSES, counts)),
+    }
+
+
+def get_many(redis: Redis, job_ids: Iterable[str]) -> dict[str, Optional[dict]]:
+    """Indexed fields for each id (None when not indexed), with a single pipelined round trip."""
+    job_ids = list(job_ids)
+    pipe = redis.pipeline(transaction=False)
+    for job_id in job_ids:
+        pipe.hgetall(_job_key(job_id))
+    return {job_id: _decode(raw) for job_id, raw in zip(job_ids, pipe.execute())}
+
+
+def queue_counts(pipe, since: float) -> int:
+    """Queue per-status counts, the total and jobs created since `since` on a pipeline; returns how many results that adds.
+
+    For callers that batch these reads with their own (tts_monitor.py).
+    """
+    for s in STATUSES:
+        pipe.zcard(_status_key(s))
+    pipe.zcard(_all_key())
+    pipe.zcount(_all_key(), since, "+inf")
+    return len(STATUSES) + 2
+
+
+def queue_created_at(pipe, job_id: str) -> None:
+    pipe.hget(_job_key(job_id), "created_at")
@@ -1,27 +1,67 @@
 from __future__ import annotations
 
 import os
+import time
 import uuid
+import asyncio
+import hashlib
 import logging
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import BinaryIO, Optional
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from redis import Redis
 from rq import Queue
+from rq.exceptions import InvalidJobOperation
 from rq.job import Job
 
 from .config import settings
-from .models import TTSJobRequest, TTSJobStatus, VoiceList
+from .models import (
+    BatchStatusRequest,
+    BatchStatusResponse,
+    JobList,
+    JobSummary,
+    TTSJobRequest,
+    TTSJobStatus,
+    VoiceList,
+)
 from .worker import enqueue_tts_job
+from .tts import should_mock_tts
+from . import chunking, dedupe, fanout, jobindex, metrics, profiles, workspace
+from .streaming import render_playlist
+from .events import TERMINAL, event_hub, sse, timestamp
+from .clients import redis_client
+from .manifest import Manifest
+from .ratelimit import get_limiter
+from .serving import CachedStaticFiles, file_response
 
 
 logger = logging.getLogger("uvicorn")
 
-app = FastAPI(title="Document-to-Speech API")
+async def _sweep_tmp() -> None:
+    # Workers sweep when they pick up a job; this covers idle periods and API-only hosts
+    while True:
+        try:
+            await run_in_threadpool(workspace.maybe_sweep, redis_client())
+        except Exception as e:
+            logger.warning("Temp sweep failed: %s", e)
+        await asyncio.sleep(settings.sweep_interval)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(_sweep_tmp()) if settings.sweep_interval > 0 else None
+    try:
+        yield
+    finally:
+        if sweeper:
+            sweeper.cancel()
+
+
+app = FastAPI(title="Document-to-Speech API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,75 +73,420 @@ app.add_middleware(
 
 # Ensure dirs
 os.makedirs(settings.tmp_dir, exist_ok=True)
+os.makedirs(workspace.uploads_dir(), exist_ok=True)
 os.makedirs(settings.storage_dir, exist_ok=True)
 
 # Serve local storage (if using local backend)
 if settings.storage_backend == "local":
-    app.mount("/files", StaticFiles(directory=settings.storage_dir), name="files")
+    app.mount("/files", CachedStaticFiles(directory=settings.storage_dir), name="files")
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template, not the raw path, so job ids don't each become a series
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.observe(
+            "tts_http_request_seconds", time.perf_counter() - started, route=route, method=request.method, status=status
+        )
+
+
+def _streamable(profile: profiles.OutputProfile) -> bool:
+    # Segmented assembly streams the profile-encoded segments; single mode streams upstream audio
+    return settings.assembly_mode != "segmented" or profile.hls_segments
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds {settings.max_upload_bytes} bytes")
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    # Refuse before the multipart body is read when the client declares its size up front
+    if request.method == "POST" and request.url.path == "/tts" and settings.max_upload_bytes:
+        try:
+            declared = int(request.headers.get("content-length", "0"))
+        except ValueError:
+            declared = 0
+        # Allow some slack for multipart boundaries and form fields
+        if declared > settings.max_upload_bytes + 64 * 1024:
+            return JSONResponse(status_code=413, content={"detail": _too_large().detail})
+    return await call_next(request)
+
+
+def _save_upload(src: BinaryIO, dest: str) -> tuple[str, int]:
+    """Copy an upload to disk in fixed-size blocks, hashing it on the way; returns (sha256, size)."""
+    h = hashlib.sha256()
+    size = 0
+    with open(dest, "wb") as f:
+        while True:
+            block = src.read(settings.upload_chunk_size)
+            if not block:
+                break
+            size += len(block)
+            if settings.max_upload_bytes and size > settings.max_upload_bytes:
+                raise _too_large()
+            h.update(block)
+            f.write(block)
+    return h.hexdigest(), size
 
 
 @app.post("/tts")
 async def create_tts_job(
+    request: Request,
     file: UploadFile = File(...),
-    preset: str = Form(default="Frank [EN]")
+    preset: str = Form(default="Frank [EN]"),
+    stream: bool = Form(default=False),
+    min_chars: Optional[int] = Form(default=None),
+    max_chars: Optional[int] = Form(default=None),
+    distributed: Optional[bool] = Form(default=None),
+    output_format: Optional[str] = Form(default=None),
+    bitrate: Optional[str] = Form(default=None),
+    channels: Optional[int] = Form(default=None),
+    sample_rate: Optional[int] = Form(default=None),
 ):
     if not file:
         raise HTTPException(status_code=400, detail="Missing file upload")
     try:
-        # Persist uploaded file to tmp
-        suffix = os.path.splitext(file.filename or "upload")[1]
-        fname = f"upload-{uuid.uuid4().hex}{suffix}"
-        dest = os.path.join(settings.tmp_dir, fname)
-        with open(dest, "wb") as f:
-            f.write(await file.read())
+        # Per-job chunk size override; without one the worker picks sizes from measured latency
+        chunking.override_bounds(min_chars, max_chars)
+        # Output encoding; anything not given comes from OUTPUT_*
+        profile = profiles.resolve(output_format, bitrate, channels, sample_rate)
+        if stream and not _streamable(profile):
+            raise ValueError(f"stream is not available for {profile.format} output: HLS can't carry its segments")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if settings.max_upload_bytes and (file.size or 0) > settings.max_upload_bytes:
+        raise _too_large()
+    if not workspace.has_room(file.size or 0):
+        raise HTTPException(
+            status_code=503, detail="Not enough free disk space; try again later", headers={"Retry-After": "60"}
+        )
+    dest = None
+    try:
+        # Stream uploaded file to tmp off the event loop
+        # The id is chosen up front so the upload is named after its job (see workspace.sweep)
+        job_id = str(uuid.uuid4())
+        fname = workspace.upload_name(job_id, file.filename or "upload")
+        dest = os.path.join(workspace.uploads_dir(), fname)
+        content_hash, _ = await run_in_threadpool(_save_upload, file.file, dest)
 
         selected = preset or settings.fallback_preset
         if settings.presets and selected not in settings.presets:
             logger.warning("Unknown preset '%s' requested; using fallback '%s'", selected, settings.fallback_preset)
             selected = settings.fallback_preset
-        job = enqueue_tts_job(dest, file.filename or fname, selected)
-        return {"job_id": job.id, "status": "queued"}
+
+        if settings.dedupe_enabled:
+            redis = redis_client()
+            hit = dedupe.lookup_audio(redis, content_hash, selected, profile.key)
+            if hit:
+                os.remove(dest)
+                return {"job_id": hit["job_id"], "status": "finished", "audio_url": hit["audio_url"], "deduplicated": True}
+            existing = dedupe.claim_inflight(redis, content_hash, selected, profile.key, job_id)
+            if existing:
+                os.remove(dest)
+                return {"job_id": existing, "status": "queued", "deduplicated": True}
+        # Fair sharing is per submitter: an explicit X-Submitter (set by an auth proxy) or the client address
+        submitter = request.headers.get("x-submitter") or (request.client.host if request.client else None)
+        try:
+            # Off the event loop: the cost estimate opens the document
+            job = await run_in_threadpool(
+                enqueue_tts_job,
+                dest,
+                file.filename or fname,
+                selected,
+                content_hash=content_hash,
+                job_id=job_id,
+                # STREAM_OUTPUT only applies where the segments can be streamed
+                stream=stream or (settings.stream_output and _streamable(profile)),
+                min_chars=min_chars,
+                max_chars=max_chars,
+                distributed=distributed,
+                submitter=submitter,
+                profile=profile,
+            )
+        except Exception:
+            if settings.dedupe_enabled:
+                dedupe.release_inflight(redis, content_hash, selected, profile.key, job_id)
+            raise
+        return {"job_id": job.id, "status": "queued", "lane": job.meta.get("lane")}
+    except HTTPException:
+        if dest and os.path.exists(dest):
+            os.remove(dest)
+        raise
     except Exception as e:
         logger.exception("Failed to enqueue TTS job: %s", e)
         raise HTTPException(status_code=500, detail="Failed to enqueue job")
 
 
-@app.get("/tts/{job_id}", response_model=TTSJobStatus)
-async def get_tts_status(job_id: str):
-    redis = Redis.from_url(settings.redis_url)
+@app.get("/chunking/{preset}")
+async def get_chunking(preset: str):
+    """Measured upstream cost per chunk-size bucket and the bounds a new job would use now."""
+    redis = redis_client()
+    source = "mock" if should_mock_tts() else "fal"
+    min_chars, max_chars = chunking.choose_bounds(redis, preset, source, explore=False)
+    return {
+        "preset": preset,
+        "source": source,
+        "min_chars": min_chars,
+        "max_chars": max_chars,
+        "buckets": chunking.stats(redis, preset, source),
+    }
+
+
+def _status_from_meta(job_id: str, status: str, meta: dict, **extra) -> TTSJobStatus:
+    return TTSJobStatus(
+        job_id=job_id,
+        status=status,
+        total_chunks=meta.get("total_chunks"),
+        processed_chunks=meta.get("processed_chunks"),
+        stream_url=f"/tts/{job_id}/stream" if meta.get("stream") else None,
+        stages=meta.get("stages"),
+        upstream=meta.get("upstream"),
+        **extra,
+    )
+
+
+def _job_status(job_id: str) -> TTSJobStatus:
     try:
-        job = Job.fetch(job_id, connection=redis)
+        job = Job.fetch(job_id, connection=redis_client())
     except Exception:
         raise HTTPException(status_code=404, detail="Job not found")
+    st = _job_status_from(job)
+    if st.stages is None:
+        # Still running (or distributed, with parts reporting): the totals recorded so far
+        stats = metrics.job_stats(job.connection, job_id)
+        if stats:
+            st.stages, st.upstream = stats["stages"], stats["upstream"]
+    return st
 
-    status = job.get_status(refresh=True)
+
+def _job_status_from(job: Job, refresh: bool = True) -> TTSJobStatus:
+    job_id = job.id
+    status = job.get_status(refresh=refresh)
+    meta = job.meta or {}
+    if meta.get("distributed") and status != "failed":
+        # Handed off to part jobs: progress and outcome come from them and the finalize job
+        agg = fanout.parent_status(job.connection, job)
+        return _status_from_meta(job_id, agg.pop("status"), agg, audio_url=agg["audio_url"], error=agg["error"])
     audio_url: Optional[str] = None
     error: Optional[str] = None
-    total_chunks = None
-    processed_chunks = None
-
     if status == "finished":
         audio_url = job.result
     elif status == "failed":
         error = str(job.exc_info).splitlines()[-1] if job.exc_info else "Unknown error"
-    # read progress meta if present
+    return _status_from_meta(job_id, status, meta, audio_url=audio_url, error=error)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus exposition: stage, upstream, job and API histograms from every process, plus queue/worker gauges."""
+
+    def render() -> str:
+        redis = redis_client()
+        metrics.flush(redis)
+        return metrics.render(redis) + metrics.render_cluster(redis)
+
+    body = await run_in_threadpool(render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/upstream")
+async def get_upstream():
+    """Current shared rate/concurrency limits and circuit-breaker state for the TTS upstream."""
+    source = "mock" if should_mock_tts() else "fal"
+    return await run_in_threadpool(lambda: get_limiter(source).snapshot())
+
+
+@app.get("/workspace")
+async def get_workspace():
+    """Disk usage of this host's TMP_DIR volume and bytes reclaimed by job cleanup and the sweeper."""
+    return await run_in_threadpool(workspace.stats, redis_client())
+
+
+@app.get("/tts", response_model=JobList)
+async def list_tts_jobs(
+    status: Optional[str] = Query(default=None),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=500),
+):
+    """Newest-first job listing from the job index; pass `next_cursor` back as `cursor` for the next page."""
+    if status is not None and status not in jobindex.STATUSES:
+        raise HTTPException(status_code=422, detail=f"status must be one of {', '.join(jobindex.STATUSES)}")
+    try:
+        page = await run_in_threadpool(jobindex.list_jobs, redis_client(), status, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return JobList(**page)
+
+
+def _summary_from_job(job: Job) -> JobSummary:
+    # For jobs enqueued before the index existed (or whose entry expired while RQ kept the job)
+    st = _job_status_from(job, refresh=False)
+    return JobSummary(
+        job_id=job.id,
+        status=st.status,
+        total_chunks=st.total_chunks,
+        processed_chunks=st.processed_chunks,
+        audio_url=st.audio_url,
+        error=st.error,
+        created_at=job.created_at.timestamp() if job.created_at else None,
+    )
+
+
+def _batch_status(job_ids: list[str]) -> BatchStatusResponse:
+    redis = redis_client()
+    indexed = jobindex.get_many(redis, job_ids)
+    unindexed = [j for j, v in indexed.items() if v is None]
+    fallback = {}
+    if unindexed:
+        # Job.fetch_many pipelines its reads, so this is still a single round trip
+        for job in Job.fetch_many(unindexed, connection=redis):
+            if job is not None:
+                fallback[job.id] = _summary_from_job(job)
+    jobs, missing = [], []
+    for job_id in job_ids:
+        if indexed.get(job_id):
+            jobs.append(JobSummary(**indexed[job_id]))
+        elif job_id in fallback:
+            jobs.append(fallback[job_id])
+        else:
+            missing.append(job_id)
+    return BatchStatusResponse(jobs=jobs, missing=missing)
+
+
+@app.post("/tts/status", response_model=BatchStatusResponse)
+async def batch_tts_status(body: BatchStatusRequest):
+    """Statuses for many jobs at once (up to 1000 ids), answered from the job index."""
+    return await run_in_threadpool(_batch_status, list(dict.fromkeys(body.job_ids)))
+
+
+@app.get("/tts/{job_id}", response_model=TTSJobStatus)
+async def get_tts_status(job_id: str):
+    return await run_in_threadpool(_job_status, job_id)
+
+
+def _resume_job(job_id: str) -> dict:
+    redis = redis_client()
     try:
-        meta = job.meta or {}
-        total_chunks = meta.get("total_chunks")
-        processed_chunks = meta.get("processed_chunks")
+        job = Job.fetch(job_id, connection=redis)
     except Exception:
-        pass
+        raise HTTPException(status_code=404, detail="Job not found")
+    created_at = timestamp((job.meta or {}).get("created_at") or job.created_at) or time.time()
+    if (job.meta or {}).get("distributed") and job.get_status() == "finished":
+        # Handed off: what can fail is the finalize job, which synthesizes anything the parts left
+        try:
+            job = Job.fetch(job.meta["finalize_job_id"], connection=redis)
+        except Exception:
+            raise HTTPException(status_code=409, detail="Job is started; only failed or stopped jobs can be resumed")
+    status = job.get_status()
+    if status not in {"failed", "stopped"}:
+        raise HTTPException(status_code=409, detail=f"Job is {status}; only failed or stopped jobs can be resumed")
+    checkpointed = len(Manifest.load(redis, job_id).entries) if settings.checkpoints else 0
+    try:
+        job.requeue()
+    except InvalidJobOperation:
+        # Someone else requeued it in the meantime
+        raise HTTPException(status_code=409, detail="Job is no longer failed")
+    try:
+        jobindex.set_status(redis, job_id, "queued", created_at, ended_at=None, run_seconds=None, audio_url=None, error=None)
+    except Exception as e:
+        logger.warning("Could not update job index for %s: %s", job_id, e)
+    return {"job_id": job_id, "status": "queued", "checkpointed_chunks": checkpointed}
 
-    return TTSJobStatus(
-        job_id=job_id,
-        status=status,
-        audio_url=audio_url,
-        error=error,
-        total_chunks=total_chunks,
-        processed_chunks=processed_chunks,
+
+@app.post("/tts/{job_id}/resume")
+async def resume_tts_job(job_id: str):
+    """Requeue a failed or stopped job; it resumes from its checkpoint instead of starting over."""
+    return await run_in_threadpool(_resume_job, job_id)
+
+
+@app.get("/tts/{job_id}/events")
+async def tts_job_events(job_id: str, request: Request):
+    """Server-Sent Events: the job status (same shape as GET /tts/{job_id}) on every progress change.
+
+    The stream ends after the finished/failed/stopped/canceled event. Events come from Redis pub/sub; if none arrive
+    for EVENTS_KEEPALIVE seconds the status is re-read from the job (covers killed workers).
+    """
+    q = await event_hub.subscribe(job_id)
+    try:
+        # After subscribing, so nothing between the snapshot and the first event is lost
+        first = await run_in_threadpool(_job_status, job_id)
+    except BaseException:
+        event_hub.unsubscribe(job_id, q)
+        raise
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            yield sse(first.model_dump())
+            if first.status in TERMINAL:
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(q.get(), timeout=settings.events_keepalive)
+                    status = _status_from_meta(
+                        job_id,
+                        event["status"],
+                        event,
+                        audio_url=event.get("audio_url"),
+                        error=event.get("error"),
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    status = await run_in_threadpool(_job_status, job_id)
+                yield sse(status.model_dump())
+                if status.status in TERMINAL:
+                    return
+        finally:
+            event_hub.unsubscribe(job_id, q)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: keep nginx from holding events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/tts/{job_id}/stream")
+async def stream_tts_job(job_id: str):
+    """Growing HLS playlist of the segments finished so far; ends with EXT-X-ENDLIST once the job completes."""
+    redis = redis_client()
+    playlist = render_playlist(redis, job_id)
+    if playlist is None:
+        # Nothing published yet — only answer for jobs that were started in streaming mode
+        try:
+            job = Job.fetch(job_id, connection=redis)
+        except Exception:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if not (job.meta or {}).get("stream"):
+            raise HTTPException(status_code=404, detail="Job is not streaming")
+        playlist = render_playlist(redis, job_id, allow_empty=True)
+    return PlainTextResponse(
+        playlist,
+        media_type="application/vnd.apple.mpegurl",
+        headers={"Cache-Control": "no-cache"},
     )
 
 
+@app.delete("/tts/cache/{content_hash}")
+async def invalidate_document_cache(content_hash: str):
+    """Forget cached chunks and finished audio for a document so the next upload is processed afresh."""
+    if not dedupe.valid_content_hash(content_hash):
+        raise HTTPException(status_code=422, detail="content_hash must be a sha256 hex digest (64 lowercase hex characters)")
+    redis = redis_client()
+    removed = dedupe.invalidate(redis, content_hash)
+    return {"content_hash": content_hash, "removed": removed}
+
+
 @app.get("/")
 async def root():
     return {"ok": True, "service": "Document-to-Speech API"}
@@ -114,19 +499,21 @@ async def list_voices():
 
 
 @app.get("/download/{filename}")
-async def download_file(filename: str):
+async def download_file(filename: str, request: Request):
     """Download endpoint that forces file download with proper headers"""
-    file_path = os.path.join(settings.storage_dir, filename)
-    if not os.path.exists(file_path):
+    file_path = os.path.realpath(os.path.join(settings.storage_dir, filename))
+    if os.path.dirname(file_path) != settings.storage_dir or not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="File not found")
-    
+
     # Extract original filename without hash suffix
-    base_name = filename.rsplit('-', 1)[0] if '-' in filename else filename.rsplit('.', 1)[0]
-    clean_filename = f"{base_name}.mp3"
-    
-    return FileResponse(
-        path=file_path,
+    stem, ext = os.path.splitext(filename)
+    base_name = stem.rsplit('-', 1)[0] if '-' in stem else stem
+    clean_filename = f"{base_name}{ext}"
+
+    return file_response(
+        file_path,
+        request.headers,
         filename=clean_filename,
         media_type='application/octet-stream',
-        headers={"Content-Disposition": f"attachment; filename=\"{clean_filename}\""}
+        headers={"Content-Disposition": f"attachment; filename=\"{clean_filename}\""},
     )
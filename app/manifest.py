@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+from redis import Redis
+
+from .config import settings
+from .storage import (
+    delete_checkpoints,
+    fetch_checkpoint,
+    read_checkpoint_manifest,
+    save_checkpoint,
+    write_checkpoint_manifest,
+)
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "tts:manifest"
+_INFO = "_info"
+
+
+def chunk_hash(chunk: str, preset: str, segmented: bool, output: str = "") -> str:
+    # Everything that shapes the produced segment; a resumed chunk must match on all of it.
+    # Only segmented assembly encodes segments with the output profile.
+    shape = f"{preset}\n{int(segmented)}" + (f"\n{output}" if segmented else "")
+    return hashlib.sha256(f"{shape}\n{chunk}".encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """Per-job record of completed segments: chunk index → {"hash", "location"}.
+
+    Lives in Redis (tts:manifest:<job_id>), with a durable copy next to the checkpointed segments
+    every CHECKPOINT_MANIFEST_EVERY chunks and whenever the job stops, so a retry or requeue of
+    the same job id, on any worker, only synthesizes what is missing.
+    """
+
+    def __init__(self, redis: Redis, job_id: str):
+        self.redis = redis
+        self.job_id = job_id
+        self.key = f"{PREFIX}:{job_id}"
+        self.info: dict = {}
+        self.entries: dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._since_persist = 0
+
+    @classmethod
+    def load(cls, redis: Redis, job_id: str) -> "Manifest":
+        m = cls(redis, job_id)
+        raw = {k.decode(): json.loads(v) for k, v in redis.hgetall(m.key).items()}
+        if not raw:
+            # Redis lost it (expiry, flush, failover): fall back to the durable copy
+            raw = read_checkpoint_manifest(job_id) or {}
+        m.info = raw.pop(_INFO, {})
+        m.entries = {int(k): v for k, v in raw.items()}
+        return m
+
+    @property
+    def bounds(self) -> Optional[tuple[int, int]]:
+        b = self.info.get("bounds")
+        return (int(b[0]), int(b[1])) if b else None
+
+    def begin(self, bounds: tuple[int, int], preset: str, segmented: bool) -> None:
+        """Start (or restart) the manifest; entries from a different chunking are dropped."""
+        info = {"bounds": list(bounds), "preset": preset, "segmented": segmented}
+        if self.info and self.info != info:
+            logger.info("[TTS] Checkpoint for %s was made with %s; starting over", self.job_id, self.info)
+            self.entries = {}
+            self.redis.delete(self.key)
+        self.info = info
+        pipe = self.redis.pipeline()
+        pipe.hset(self.key, _INFO, json.dumps(info))
+        pipe.expire(self.key, settings.checkpoint_ttl)
+        pipe.execute()
+
+    def completed(self, index: int, digest: str) -> bool:
+        entry = self.entries.get(index)
+        return entry is not None and entry["hash"] == digest
+
+    def restore(self, index: int, dest_dir: str) -> str:
+        location = self.entries[index]["location"]
+        os.makedirs(dest_dir, exist_ok=True)
+        ext = os.path.splitext(location)[1]
+        return fetch_checkpoint(location, os.path.join(dest_dir, f"resume-{uuid.uuid4().hex}{ext}"))
+
+    def record(self, index: int, digest: str, path: str) -> None:
+        """Checkpoint a finished segment (called from pool threads)."""
+        location = save_checkpoint(path, self.job_id, f"{index:05d}{os.path.splitext(path)[1]}")
+        entry = {"hash": digest, "location": location}
+        pipe = self.redis.pipeline()
+        pipe.hset(self.key, str(index), json.dumps(entry))
+        pipe.expire(self.key, settings.checkpoint_ttl)
+        pipe.execute()
+        with self._lock:
+            self.entries[index] = entry
+            self._since_persist += 1
+            due = self._since_persist >= settings.checkpoint_manifest_every
+        if due:
+            self.persist()
+
+    def persist(self) -> None:
+        with self._lock:
+            snapshot = {_INFO: self.info, **{str(i): e for i, e in self.entries.items()}}
+            self._since_persist = 0
+        try:
+            # Part jobs of a distributed job share one manifest; include what the others recorded
+            stored = {k.decode(): json.loads(v) for k, v in self.redis.hgetall(self.key).items()}
+            snapshot = {**stored, **snapshot}
+        except Exception as e:
+            logger.debug("[TTS] Could not read manifest %s: %s", self.key, e)
+        try:
+            write_checkpoint_manifest(self.job_id, snapshot)
+        except Exception as e:
+            logger.warning("[TTS] Could not persist checkpoint manifest for %s: %s", self.job_id, e)
+
+    def clear(self) -> None:
+        """Drop the manifest and checkpointed segments once the job's output is stored."""
+        self.redis.delete(self.key)
+        try:
+            delete_checkpoints(self.job_id)
+        except Exception as e:
+            logger.warning("[TTS] Could not delete checkpoints for %s: %s", self.job_id, e)
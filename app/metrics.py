@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import time
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from redis import Redis
+from rq import Queue, Worker
+from rq.worker import WorkerStatus
+
+from .config import settings
+from . import scheduler
+
+logger = logging.getLogger(__name__)
+
+# Two views of the same measurements:
+# - per job: StageTimer totals (seconds, calls, bytes per stage + upstream attempt outcomes), kept in
+#   tts:metrics:job:<job_id> (part jobs add to their parent's) and copied into job meta at the end;
+# - cluster-wide: Prometheus histograms/counters buffered per process and added to Redis hashes
+#   every METRICS_FLUSH_INTERVAL (and at the end of each job), so /metrics on any API process
+#   exports what every worker and API process recorded.
+PREFIX = "tts:metrics"
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+_INF = "+Inf"
+
+# name -> (type, help); only these are exported
+METRICS = {
+    "tts_stage_seconds": ("histogram", "Time spent per pipeline stage (per call)"),
+    "tts_job_stage_seconds": ("histogram", "Time a job (or part job) spent in each stage in total"),
+    "tts_stage_bytes_total": ("counter", "Bytes processed per pipeline stage"),
+    "tts_upstream_attempt_seconds": ("histogram", "VibeVoice request attempts by outcome"),
+    "tts_upstream_retries_total": ("counter", "VibeVoice requests retried after a failed attempt"),
+    "tts_upstream_fallback_total": ("counter", "Chunks synthesized with the fallback preset"),
+    "tts_job_seconds": ("histogram", "Job run time from start to finished/failed"),
+    "tts_job_queue_seconds": ("histogram", "Time jobs waited in the queue before starting"),
+    "tts_http_request_seconds": ("histogram", "API request duration"),
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(labels: dict) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+
+
+class _Registry:
+    """Per-process buffer of metric increments since the last flush to Redis."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hist: Dict[tuple, list] = {}
+        self._counters: Dict[tuple, float] = defaultdict(float)
+        self._flusher: Optional[threading.Thread] = None
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            entry = self._hist.get(key)
+            if entry is None:
+                entry = self._hist[key] = [[0] * (len(SECONDS_BUCKETS) + 1), 0.0, 0]
+            for i, bound in enumerate(SECONDS_BUCKETS):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            else:
+                entry[0][-1] += 1
+            entry[1] += value
+            entry[2] += 1
+        self._ensure_flusher()
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        with self._lock:
+            self._counters[(name, _labels(labels))] += amount
+        self._ensure_flusher()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or not self._flusher.is_alive():
+            # Also re-created in a forked work-horse, where the parent's thread doesn't exist
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(settings.metrics_flush_interval)
+            self.flush()
+
+    def flush(self, redis: Optional[Redis] = None) -> None:
+        with self._lock:
+            hist, self._hist = self._hist, {}
+            counters, self._counters = self._counters, defaultdict(float)
+        if not hist and not counters:
+            return
+        try:
+            if redis is None:
+                from .clients import redis_client
+
+                redis = redis_client()
+            pipe = redis.pipeline(transaction=False)
+            for (name, labels), (buckets, total, count) in hist.items():
+                key = f"{PREFIX}:h:{name}"
+                for bound, n in zip((*SECONDS_BUCKETS, _INF), buckets):
+                    if n:
+                        pipe.hincrby(key, f"{labels}|{bound}", n)
+                pipe.hincrbyfloat(key, f"{labels}|sum", total)
+                pipe.hincrby(key, f"{labels}|count", count)
+            for (name, labels), amount in counters.items():
+                pipe.hincrbyfloat(f"{PREFIX}:c:{name}", labels, amount)
+            pipe.execute()
+        except Exception as e:
+            # Metrics are advisory; a lost batch only makes the aggregates slightly low
+            logger.warning("Could not flush metrics: %s", e)
+
+
+_registry = _Registry()
+_local = threading.local()
+
+
+def observe(name: str, value: float, **labels) -> None:
+    if settings.metrics_enabled:
+        _registry.observe(name, value, **labels)
+
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    if settings.metrics_enabled:
+        _registry.inc(name, amount, **labels)
+
+
+def flush(redis: Optional[Redis] = None) -> None:
+    if settings.metrics_enabled:
+        _registry.flush(redis)
+
+
+class StageTimer:
+    """Per-job totals by stage; thread-safe, shared by the job thread and its synthesis pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0, 0])  # seconds, calls, bytes
+        self.events: Dict[str, int] = defaultdict(int)
+
+    def add(self, stage: str, seconds: float, count: int = 1, nbytes: int = 0) -> None:
+        with self._lock:
+            totals = self.stages[stage]
+            totals[0] += seconds
+            totals[1] += count
+            totals[2] += nbytes
+
+    def event(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.events[name] += n
+
+    def iterate(self, stage: str, items: Iterator, exclude: Optional[str] = None) -> Iterator:
+        """Pass items through, charging the time spent producing them to stage.
+
+        Time the wrapped iterator spends in an inner stage (e.g. parse under split) is not charged twice.
+        """
+        it = iter(items)
+        while True:
+            inner = self.stages[exclude][0] if exclude else 0.0
+            started = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self._charge(stage, started, exclude, inner, count=0)
+                return
+            self._charge(stage, started, exclude, inner)
+            yield item
+
+    def _charge(self, stage: str, started: float, exclude: Optional[str], inner: float, count: int = 1) -> None:
+        elapsed = time.perf_counter() - started
+        if exclude:
+            elapsed -= self.stages[exclude][0] - inner
+        self.add(stage, max(0.0, elapsed), count)
+
+    def flush(self, redis: Redis, job_id: str) -> None:
+        """Add the totals to the job's hash (parts of a distributed job pass the parent id) and reset."""
+        with self._lock:
+            stages, self.stages = self.stages, defaultdict(lambda: [0.0, 0, 0])
+            events, self.events = self.events, defaultdict(int)
+        key = f"{PREFIX}:job:{job_id}"
+        pipe = redis.pipeline(transaction=False)
+        for stage, (seconds, count, nbytes) in stages.items():
+            observe("tts_job_stage_seconds", seconds, stage=stage)
+            pipe.hincrbyfloat(key, f"stage:{stage}:seconds", seconds)
+            pipe.hincrby(key, f"stage:{stage}:count", int(count))
+            if nbytes:
+                pipe.hincrby(key, f"stage:{stage}:bytes", int(nbytes))
+        for name, n in events.items():
+            pipe.hincrby(key, f"upstream:{name}", n)
+        pipe.expire(key, settings.job_index_ttl)
+        pipe.execute()
+
+
+def count_field(name: str, **labels) -> tuple[str, str]:
+    """(hash key, field) of a histogram series' observation count, as of each process's last flush."""
+    return f"{PREFIX}:h:{name}", f"{_labels(labels)}|count"
+
+
+def job_stats(redis: Redis, job_id: str) -> Optional[dict]:
+    """{"stages": {stage: {"seconds", "count", "bytes"}}, "upstream": {outcome: n}} for a job, or None."""
+    raw = redis.hgetall(f"{PREFIX}:job:{job_id}")
+    if not raw:
+        return None
+    stages: Dict[str, dict] = defaultdict(lambda: {"seconds": 0.0, "count": 0, "bytes": 0})
+    upstream: Dict[str, int] = {}
+    for field, value in raw.items():
+        kind, _, rest = field.decode().partition(":")
+        if kind == "stage":
+            stage, _, attr = rest.rpartition(":")
+            stages[stage][attr] = round(float(value), 3) if attr == "seconds" else int(value)
+        elif kind == "upstream":
+            upstream[rest] = int(value)
+    return {"stages": dict(stages), "upstream": upstream}
+
+
+@contextmanager
+def bound(timer: Optional[StageTimer]) -> Iterator[Optional[StageTimer]]:
+    """Make timer the current thread's job timer (what stage() and upstream hooks report to)."""
+    previous = getattr(_local, "timer", None)
+    _local.timer = timer
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+
+
+def in_context(timer: Optional[StageTimer], fn):
+    """fn wrapped to run with timer bound, for handing work to pool threads."""
+
+    def call(*args, **kwargs):
+        with bound(timer):
+            return fn(*args, **kwargs)
+
+    return call
+
+
+def current() -> Optional[StageTimer]:
+    return getattr(_local, "timer", None)
+
+
+def iterate(stage: str, items: Iterator, exclude: Optional[str] = None) -> Iterator:
+    """StageTimer.iterate on the current job timer; items unchanged outside a job."""
+    timer = current()
+    return timer.iterate(stage, items, exclude) if timer is not None else items
+
+
+@contextmanager
+def stage(name: str) -> Iterator[dict]:
+    """Time a block as one call of a stage; set info["bytes"] inside to count bytes too."""
+    info = {"bytes": 0}
+    started = time.perf_counter()
+    try:
+        yield info
+    finally:
+        record(name, time.perf_counter() - started, info["bytes"])
+
+
+def record(name: str, seconds: float, nbytes: int = 0) -> None:
+    timer = current()
+    if timer is not None:
+        timer.add(name, seconds, nbytes=nbytes)
+    observe("tts_stage_seconds", seconds, stage=name)
+    if nbytes:
+        inc("tts_stage_bytes_total", nbytes, stage=name)
+
+
+def upstream_attempt(source: str, outcome: str, seconds: float) -> None:
+    """One request to the TTS upstream: ok | throttled | rejected | error | timeout | connection."""
+    timer = current()
+    if timer is not None:
+        timer.event("attempts")
+        timer.event(outcome)
+    observe("tts_upstream_attempt_seconds", seconds, source=source, outcome=outcome)
+
+
+def retry(source: str) -> None:
+    timer = current()
+    if timer is not None:
+        timer.event("retries")
+    inc("tts_upstream_retries_total", source=source)
+
+
+def fallback(source: str) -> None:
+    timer = current()
+    if timer is not None:
+        timer.event("fallbacks")
+    inc("tts_upstream_fallback_total", source=source)
+
+
+def render(redis: Redis) -> str:
+    """Prometheus text exposition of the aggregated histograms and counters."""
+    lines: List[str] = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for labels, value in sorted(redis.hgetall(f"{PREFIX}:c:{name}").items()):
+                lines.append(f"{name}{{{labels.decode()}}} {_num(value)}" if labels else f"{name} {_num(value)}")
+            continue
+        series: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for field, value in redis.hgetall(f"{PREFIX}:h:{name}").items():
+            labels, _, part = field.decode().rpartition("|")
+            series[labels][part] = float(value)
+        for labels, parts in sorted(series.items()):
+            sep = "," if labels else ""
+            cumulative = 0.0
+            for bound in (*SECONDS_BUCKETS, _INF):
+                cumulative += parts.get(str(bound), 0.0)
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {_num(cumulative)}')
+            brace = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{brace} {_num(parts.get('sum', 0.0))}")
+            lines.append(f"{name}_count{brace} {_num(parts.get('count', 0.0))}")
+    return "\n".join(lines) + "\n"
+
+
+def _gauge(name: str, help_text: str, samples: Dict[str, float]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples.items():
+        lines.append(f"{name}{{{labels}}} {_num(value)}" if labels else f"{name} {_num(value)}")
+    return lines
+
+
+def render_cluster(redis: Redis) -> str:
+    """Live gauges read from RQ: queue depth, running/failed jobs per queue and worker utilization."""
+    queued: Dict[str, float] = {}
+    started: Dict[str, float] = {}
+    failed: Dict[str, float] = {}
+    for name in scheduler.queue_names():
+        q = Queue(name, connection=redis)
+        label = _labels({"queue": name})
+        queued[label] = q.count
+        started[label] = q.started_job_registry.count
+        failed[label] = q.failed_job_registry.count
+
+    workers = Worker.all(connection=redis)
+    states: Dict[str, float] = {_labels({"state": "busy"}): 0, _labels({"state": "idle"}): 0}
+    working = 0.0
+    for w in workers:
+        state = "busy" if w.get_state() == WorkerStatus.BUSY else "idle"
+        states[_labels({"state": state})] += 1
+        working += w.total_working_time or 0
+    busy = states[_labels({"state": "busy"})]
+
+    lines = _gauge("tts_queue_depth", "Jobs waiting per RQ queue (lane)", queued)
+    lines += _gauge("tts_jobs_running", "Jobs in each queue's started registry", started)
+    lines += _gauge("tts_jobs_failed", "Jobs in each queue's failed registry", failed)
+    lines += _gauge("tts_workers", "Registered RQ workers by state", states)
+    lines += _gauge("tts_worker_utilization", "Share of workers busy with a job", {"": busy / len(workers) if workers else 0.0})
+    # Not a counter: it drops when a worker exits or is recycled. For busy time over a window use
+    # rate(tts_job_seconds_sum), which only ever grows.
+    lines += _gauge(
+        "tts_worker_working_seconds", "Time the currently registered workers have spent on jobs", {"": working}
+    )
+    return "\n".join(lines) + "\n"
@@ -15,6 +15,40 @@ class TTSJobStatus(BaseModel):
     audio_url: Optional[str] = None
     total_chunks: Optional[int] = None
     processed_chunks: Optional[int] = None
+    stream_url: Optional[str] = None
+    stages: Optional[dict] = Field(default=None, description="Per stage: seconds, count and bytes")
+    upstream: Optional[dict] = Field(default=None, description="TTS request attempts by outcome, retries, fallbacks")
+
+
+class JobSummary(BaseModel):
+    job_id: str
+    status: str
+    filename: Optional[str] = None
+    preset: Optional[str] = None
+    created_at: Optional[float] = None  # unix time
+    started_at: Optional[float] = None
+    ended_at: Optional[float] = None
+    queued_seconds: Optional[float] = None
+    run_seconds: Optional[float] = None
+    total_chunks: Optional[int] = None
+    processed_chunks: Optional[int] = None
+    audio_url: Optional[str] = None
+    error: Optional[str] = None
+
+
+class JobList(BaseModel):
+    jobs: list[JobSummary]
+    next_cursor: Optional[str] = Field(default=None, description="Pass as ?cursor= for the next page")
+    counts: dict[str, int]
+
+
+class BatchStatusRequest(BaseModel):
+    job_ids: list[str] = Field(max_length=1000)
+
+
+class BatchStatusResponse(BaseModel):
+    jobs: list[JobSummary]
+    missing: list[str] = []
 
 
 class VoiceList(BaseModel):
@@ -2,20 +2,41 @@ from __future__ import annotations
 
 import io
 import os
-from typing import Union
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Iterator, Optional, Union
 
 from docx import Document as DocxDocument
 from pypdf import PdfReader
 
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Fragments yielded by iter_file are whole blocks (pages / paragraphs) that join with this
+FRAGMENT_SEP = "\n\n"
+
 
 def parse_file(file_path: str) -> str:
     ext = os.path.splitext(file_path)[1].lower()
     if ext == ".txt":
         return _parse_txt(file_path)
+    if ext in {".docx", ".pdf"}:
+        return FRAGMENT_SEP.join(iter_file(file_path))
+    raise ValueError(f"Unsupported file type: {ext}")
+
+
+def iter_file(file_path: str) -> Iterator[str]:
+    """Stream a document as text fragments in reading order; memory tracks fragments in flight."""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".txt":
+        return _iter_txt(file_path)
     if ext == ".docx":
-        return _parse_docx(file_path)
+        return _iter_docx(file_path)
     if ext == ".pdf":
-        return _parse_pdf(file_path)
+        return _iter_pdf(file_path)
     raise ValueError(f"Unsupported file type: {ext}")
 
 
@@ -24,21 +45,103 @@ def _parse_txt(path: str) -> str:
         return f.read()
 
 
-def _parse_docx(path: str) -> str:
+def _iter_txt(path: str) -> Iterator[str]:
+    # Cut at paragraph breaks so the fragments re-join to the original text
+    block = settings.parse_txt_block
+    buf = ""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            data = f.read(block)
+            if not data:
+                break
+            buf += data
+            cut = buf.rfind(FRAGMENT_SEP)
+            if cut <= 0 and len(buf) > 4 * block:
+                # No paragraph break in sight: settle for the last whitespace
+                cut = max(buf.rfind(" "), buf.rfind("\n"))
+            if cut > 0:
+                head, buf = buf[:cut], buf[cut:].lstrip("\n ")
+                if head.strip():
+                    yield head
+    if buf.strip():
+        yield buf
+
+
+def _iter_docx(path: str) -> Iterator[str]:
     doc = DocxDocument(path)
-    paras = [p.text.strip() for p in doc.paragraphs if p.text and p.text.strip()]
-    return "\n\n".join(paras)
+    for p in doc.paragraphs:
+        if p.text and p.text.strip():
+            yield p.text.strip()
+
+
+def _extract_text(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+
+
+# Per-process reader for the PDF pool (opened once by the pool initializer)
+_pool_reader: Optional[PdfReader] = None
 
 
-def _parse_pdf(path: str) -> str:
+def _init_pdf_worker(path: str) -> None:
+    global _pool_reader
+    _pool_reader = PdfReader(path)
+
+
+def _extract_pool_page(index: int) -> str:
+    assert _pool_reader is not None
+    return _extract_text(_pool_reader.pages[index])
+
+
+def _iter_pdf(path: str) -> Iterator[str]:
     reader = PdfReader(path)
-    parts = []
-    for page in reader.pages:
-        try:
-            text = page.extract_text() or ""
-        except Exception:
-            text = ""
-        if text:
-            parts.append(text)
-    return "\n\n".join(parts)
+    n_pages = len(reader.pages)
+    workers = settings.parse_workers or os.cpu_count() or 1
+    if workers <= 1 or n_pages < settings.parse_pool_min_pages:
+        for page in reader.pages:
+            text = _extract_text(page)
+            if text:
+                yield text
+        return
+    del reader
+
+    # spawn, not fork: the worker may already be running synthesis threads
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_pdf_worker,
+        initargs=(path,),
+    )
+    window = workers * 2  # pages in flight bounds memory
+    pending: deque = deque()
+    next_page = 0
+    stuck = False
+    try:
+        while next_page < n_pages and len(pending) < window:
+            pending.append((next_page, pool.submit(_extract_pool_page, next_page)))
+            next_page += 1
+        while pending:
+            index, fut = pending.popleft()
+            try:
+                text = fut.result(timeout=settings.parse_page_timeout)
+            except FutureTimeout:
+                logger.warning("[Parse] Page %d of %s exceeded %ss; skipping", index + 1, path, settings.parse_page_timeout)
+                stuck = True
+                text = ""
+            except Exception as e:
+                logger.warning("[Parse] Page %d of %s failed: %s", index + 1, path, e)
+                text = ""
+            if next_page < n_pages:
+                pending.append((next_page, pool.submit(_extract_pool_page, next_page)))
+                next_page += 1
+            if text:
+                yield text
+    finally:
+        if stuck:
+            # A wedged extractor would block shutdown forever
+            for proc in list(getattr(pool, "_processes", {}).values()):
+                proc.terminate()
+        pool.shutdown(wait=not stuck, cancel_futures=True)
 
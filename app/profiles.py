@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+import re
+import mimetypes
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from .config import settings
+
+# MP3 variable bitrate at LAME quality 2 (-q:a 2), the encode used before output profiles
+VBR = "vbr"
+
+# Per format: encoder, final container, container for per-segment encodes (segmented assembly
+# and HLS; must be stream-copy concatenable), whether HLS can carry those segments (MPEG audio and
+# ADTS yes, Ogg no), MIME type, and the encoding used when a job and OUTPUT_* leave it open. MP3
+# keeps the original 44.1 kHz stereo VBR encode; AAC and Opus are the opt-in compact speech encodes.
+FORMATS = {
+    "mp3": {
+        "codec": "libmp3lame", "ext": ".mp3", "segment_ext": ".mp3", "hls": True, "content_type": "audio/mpeg",
+        "bitrate": VBR, "channels": 2, "sample_rate": 44100,
+    },
+    "aac": {
+        "codec": "aac", "ext": ".m4a", "segment_ext": ".aac", "hls": True, "content_type": "audio/mp4",
+        "bitrate": "48k", "channels": 1, "sample_rate": 24000,
+    },
+    "opus": {
+        "codec": "libopus", "ext": ".ogg", "segment_ext": ".ogg", "hls": False, "content_type": "audio/ogg",
+        "bitrate": "32k", "channels": 1, "sample_rate": 24000,
+    },
+}
+SAMPLE_RATES = {8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000}
+_OPUS_RATES = {8000, 12000, 16000, 24000, 48000}
+_BITRATE = re.compile(r"^(\d{1,3})k$")
+
+CONTENT_TYPES = {
+    **{f["ext"]: f["content_type"] for f in FORMATS.values()},
+    ".aac": "audio/aac",
+    ".wav": "audio/wav",
+}
+# Not in every platform's mime.types; StaticFiles and file_response guess from these
+for _ext, _type in CONTENT_TYPES.items():
+    mimetypes.add_type(_type, _ext)
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    format: str
+    bitrate: str
+    channels: int
+    sample_rate: int
+
+    @property
+    def ext(self) -> str:
+        return FORMATS[self.format]["ext"]
+
+    @property
+    def segment_ext(self) -> str:
+        return FORMATS[self.format]["segment_ext"]
+
+    @property
+    def hls_segments(self) -> bool:
+        """Whether segmented-assembly segments can be listed in an HLS playlist."""
+        return FORMATS[self.format]["hls"]
+
+    @property
+    def content_type(self) -> str:
+        return FORMATS[self.format]["content_type"]
+
+    @property
+    def key(self) -> str:
+        """Compact identity for dedupe and checkpoint keys, e.g. "opus-32k-1-24000"."""
+        return f"{self.format}-{self.bitrate}-{self.channels}-{self.sample_rate}"
+
+    def encode_args(self, segment: bool = False) -> dict:
+        """ffmpeg output options; segment=True encodes into the concatenable segment container."""
+        args = {
+            "acodec": FORMATS[self.format]["codec"],
+            "ar": self.sample_rate,
+            "ac": self.channels,
+        }
+        if self.bitrate == VBR:
+            args["qscale:a"] = 2
+        else:
+            args["audio_bitrate"] = self.bitrate
+        if self.format == "opus":
+            args["application"] = "voip"
+        if self.format == "aac":
+            args.update({"f": "adts"} if segment else {"movflags": "+faststart"})
+        return args
+
+    def remux_args(self) -> dict:
+        """ffmpeg output options for stream-copying joined segments into the final container."""
+        if self.format == "aac":
+            return {"bsf:a": "aac_adtstoasc", "movflags": "+faststart"}
+        return {}
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def resolve(
+    format: Optional[str] = None,
+    bitrate: Optional[str] = None,
+    channels: Optional[int] = None,
+    sample_rate: Optional[int] = None,
+) -> OutputProfile:
+    """Build a profile from per-job choices over the OUTPUT_* defaults. Raises ValueError when invalid."""
+    fmt = (format or settings.output_format).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"output_format must be one of {', '.join(FORMATS)}")
+    bitrate = (bitrate or settings.output_bitrate or FORMATS[fmt]["bitrate"]).lower()
+    if bitrate == VBR:
+        if fmt != "mp3":
+            raise ValueError("bitrate vbr is only available for mp3")
+    else:
+        m = _BITRATE.match(bitrate)
+        if not m or not 8 <= int(m.group(1)) <= 320:
+            raise ValueError("bitrate must be between 8k and 320k, e.g. 48k (or vbr for mp3)")
+    channels = channels or settings.output_channels or FORMATS[fmt]["channels"]
+    if channels not in (1, 2):
+        raise ValueError("channels must be 1 or 2")
+    sample_rate = sample_rate or settings.output_sample_rate or FORMATS[fmt]["sample_rate"]
+    rates = _OPUS_RATES if fmt == "opus" else SAMPLE_RATES
+    if sample_rate not in rates:
+        raise ValueError(f"sample_rate for {fmt} must be one of {', '.join(map(str, sorted(rates)))}")
+    return OutputProfile(fmt, bitrate, channels, sample_rate)
+
+
+def from_dict(raw: Optional[dict]) -> OutputProfile:
+    """Profile recorded in job args/meta; jobs enqueued before profiles existed get the defaults."""
+    return OutputProfile(**raw) if raw else resolve()
+
+
+def content_type(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return CONTENT_TYPES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import time
+import uuid
+import random
+import logging
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Iterator, Optional
+
+import requests
+from redis import Redis, RedisError
+
+from .config import settings
+from .clients import redis_client
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "tts:upstream"
+
+
+class CircuitOpenError(Exception):
+    """The upstream circuit stayed open for longer than UPSTREAM_BREAKER_MAX_WAIT."""
+
+
+# Refill the shared bucket at the current (adaptive) rate, then take a token and a concurrency
+# lease together. Returns 0 when both were granted, otherwise milliseconds to wait.
+_ACQUIRE = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[3])
+local conc = tonumber(redis.call('HGET', KEYS[1], 'concurrency') or ARGV[4])
+local burst = tonumber(ARGV[5])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+if redis.call('ZCARD', KEYS[3]) >= math.floor(conc) then
+  return 50
+end
+local tokens = tonumber(redis.call('HGET', KEYS[2], 'tokens') or burst)
+local ts = tonumber(redis.call('HGET', KEYS[2], 'ts') or now)
+tokens = math.min(burst, tokens + (now - ts) / 1000 * rate)
+if tokens < 1 then
+  redis.call('HSET', KEYS[2], 'tokens', tokens, 'ts', now)
+  return math.ceil((1 - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[2], 'tokens', tokens - 1, 'ts', now)
+redis.call('PEXPIRE', KEYS[2], 3600000)
+redis.call('ZADD', KEYS[3], now + tonumber(ARGV[2]), ARGV[1])
+redis.call('PEXPIRE', KEYS[3], tonumber(ARGV[2]) * 2)
+return 0
+"""
+
+# AIMD on the shared limits. A burst of errors seen by many workers at once backs off only once
+# per cooldown, otherwise N workers would divide the rate by 2^N.
+_ADJUST = """
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[2])
+local conc = tonumber(redis.call('HGET', KEYS[1], 'concurrency') or ARGV[3])
+if ARGV[1] == 'up' then
+  rate = math.min(tonumber(ARGV[6]), rate + tonumber(ARGV[8]))
+  conc = math.min(tonumber(ARGV[7]), conc + 1 / conc)
+else
+  if not redis.call('SET', KEYS[2], '1', 'NX', 'PX', ARGV[10]) then
+    return 0
+  end
+  rate = math.max(tonumber(ARGV[4]), rate * tonumber(ARGV[9]))
+  conc = math.max(tonumber(ARGV[5]), conc * tonumber(ARGV[9]))
+end
+redis.call('HSET', KEYS[1], 'rate', rate, 'concurrency', conc)
+return 1
+"""
+
+
+class Permit:
+    """One granted upstream request; report what came back with observe()."""
+
+    def __init__(self, limiter: "UpstreamLimiter", probe: bool):
+        self.limiter = limiter
+        self.probe = probe
+        self.observed = False
+
+    def observe(self, status_code: int, retry_after: Optional[str] = None) -> None:
+        self.observed = True
+        if not self.limiter.enabled:
+            return
+        if status_code == 429:
+            self.limiter._throttled(retry_after)
+        elif status_code >= 500:
+            # 503/504 mean "overloaded": back off. Other 5xx only count towards the breaker.
+            self.limiter._failed(self.probe, overloaded=status_code in (503, 504))
+        elif status_code < 400:
+            self.limiter._succeeded(self.probe)
+        elif self.probe:
+            # A 4xx is the request's fault, not the upstream's; let the next request probe
+            self.limiter._release_probe()
+
+
+class UpstreamLimiter:
+    """Cluster-wide admission control for one upstream endpoint, state kept in Redis.
+
+    - token bucket (UPSTREAM_RATE/UPSTREAM_BURST) and a concurrency cap shared by all workers,
+      both adjusted AIMD-style: additive increase on success, multiplicative decrease on
+      overload signals (429, 503, 504, timeouts)
+    - 429 Retry-After pauses every worker, not just the one that got it
+    - circuit breaker: UPSTREAM_BREAKER_THRESHOLD failures (5xx, timeouts, connection errors)
+      open it for UPSTREAM_BREAKER_COOLDOWN; then one probe request decides whether it closes.
+      Callers park while it is open and get CircuitOpenError after UPSTREAM_BREAKER_MAX_WAIT.
+
+    Redis errors fail open: the request goes ahead unthrottled rather than not at all.
+    """
+
+    def __init__(self, redis: Redis, name: str):
+        self.redis = redis
+        self.name = name
+        base = f"{PREFIX}:{name}"
+        self.k_limits = f"{base}:limits"
+        self.k_bucket = f"{base}:bucket"
+        self.k_leases = f"{base}:leases"
+        self.k_backoff = f"{base}:backoff"
+        self.k_hold = f"{base}:hold"
+        self.k_failures = f"{base}:failures"
+        self.k_open = f"{base}:open"
+        self.k_half_open = f"{base}:half_open"
+        self.k_probe = f"{base}:probe"
+        self._acquire = redis.register_script(_ACQUIRE)
+        self._adjust = redis.register_script(_ADJUST)
+
+    @property
+    def enabled(self) -> bool:
+        # The in-process mock stands in for an unlimited upstream unless asked otherwise
+        if self.name == "mock":
+            return settings.upstream_limiter and settings.mock_upstream_limiter
+        return settings.upstream_limiter
+
+    @property
+    def _lease_ms(self) -> int:
+        # A worker that dies mid-request must not hold its lease forever
+        return int((settings.fal_connect_timeout + settings.fal_read_timeout + 30) * 1000)
+
+    @contextmanager
+    def permit(self) -> Iterator[Permit]:
+        if not self.enabled:
+            yield Permit(self, probe=False)
+            return
+        lease = uuid.uuid4().hex
+        try:
+            probe = self._wait_for_slot(lease)
+        except RedisError as e:
+            logger.warning("[Upstream] Limiter unavailable (%s); calling %s unthrottled", e, self.name)
+            yield Permit(self, probe=False)
+            return
+        permit = Permit(self, probe)
+        try:
+            yield permit
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if not permit.observed:
+                self._failed(probe, overloaded=isinstance(e, requests.Timeout))
+            raise
+        finally:
+            if probe and not permit.observed:
+                self._release_probe()
+            try:
+                self.redis.zrem(self.k_leases, lease)
+            except RedisError:
+                pass
+
+    def _wait_for_slot(self, lease: str) -> bool:
+        """Block until the circuit, any 429 hold, the rate and the concurrency cap all allow a request.
+
+        Returns True when this request is the half-open probe.
+        """
+        deadline = time.monotonic() + settings.upstream_breaker_max_wait
+        parked = False
+        while True:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.pttl(self.k_open)
+            pipe.pttl(self.k_hold)
+            pipe.exists(self.k_half_open)
+            open_ms, hold_ms, half_open = pipe.execute()
+            probe = False
+            wait_ms = max(open_ms, hold_ms, 0)
+            if wait_ms == 0 and half_open:
+                # Circuit cooled down: exactly one request goes through to test the upstream
+                if self.redis.set(self.k_probe, lease, nx=True, px=self._lease_ms):
+                    probe = True
+                else:
+                    wait_ms = 500
+            if wait_ms > 0:
+                if open_ms > 0 or half_open:
+                    if time.monotonic() + wait_ms / 1000 > deadline:
+                        raise CircuitOpenError(f"{self.name} unavailable: circuit open")
+                    if not parked:
+                        parked = True
+                        logger.warning("[Upstream] %s circuit open; parking request", self.name)
+                time.sleep(min(wait_ms / 1000, 1.0))
+                continue
+
+            wait_ms = self._acquire(
+                keys=[self.k_limits, self.k_bucket, self.k_leases],
+                args=[
+                    lease,
+                    self._lease_ms,
+                    settings.upstream_rate,
+                    settings.upstream_concurrency,
+                    settings.upstream_burst,
+                ],
+            )
+            if wait_ms == 0:
+                return probe
+            if probe:
+                # Don't sit on the probe while queueing for a token
+                self._release_probe()
+            # Jitter so parked workers don't all retry in the same millisecond
+            time.sleep(min(wait_ms, 1000) / 1000 * random.uniform(1.0, 1.2))
+
+    def _adjust_limits(self, direction: str) -> None:
+        self._adjust(
+            keys=[self.k_limits, self.k_backoff],
+            args=[
+                direction,
+                settings.upstream_rate,
+                settings.upstream_concurrency,
+                settings.upstream_rate_min,
+                settings.upstream_concurrency_min,
+                settings.upstream_rate_max,
+                settings.upstream_concurrency_max,
+                settings.upstream_rate_increase,
+                settings.upstream_decrease_factor,
+                int(settings.upstream_decrease_cooldown * 1000),
+            ],
+        )
+
+    def _succeeded(self, probe: bool) -> None:
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(self.k_failures)
+            if probe:
+                pipe.delete(self.k_half_open, self.k_probe)
+            pipe.execute()
+            if probe:
+                logger.info("[Upstream] %s probe succeeded; circuit closed", self.name)
+            self._adjust_limits("up")
+        except RedisError as e:
+            logger.debug("[Upstream] Could not record success: %s", e)
+
+    def _throttled(self, retry_after: Optional[str]) -> None:
+        try:
+            self._adjust_limits("down")
+            hold = retry_after_seconds(retry_after)
+            if hold:
+                self.redis.set(self.k_hold, "1", px=int(min(hold, settings.upstream_breaker_max_wait) * 1000))
+        except RedisError as e:
+            logger.debug("[Upstream] Could not record throttling: %s", e)
+
+    def _failed(self, probe: bool, overloaded: bool) -> None:
+        try:
+            if overloaded:
+                self._adjust_limits("down")
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.incr(self.k_failures)
+            pipe.expire(self.k_failures, int(settings.upstream_breaker_window))
+            pipe.exists(self.k_half_open)
+            failures, _, half_open = pipe.execute()
+            if probe or half_open or failures >= settings.upstream_breaker_threshold:
+                self._open()
+        except RedisError as e:
+            logger.debug("[Upstream] Could not record failure: %s", e)
+
+    def _open(self) -> None:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(self.k_open, "1", px=int(settings.upstream_breaker_cooldown * 1000))
+        pipe.set(self.k_half_open, "1", ex=24 * 3600)
+        pipe.delete(self.k_probe)
+        pipe.execute()
+        logger.warning("[Upstream] %s circuit opened for %.0fs", self.name, settings.upstream_breaker_cooldown)
+
+    def _release_probe(self) -> None:
+        try:
+            self.redis.delete(self.k_probe)
+        except RedisError:
+            pass
+
+    def snapshot(self) -> dict:
+        """Current shared limits and breaker state, for GET /upstream."""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(self.k_limits)
+        pipe.hgetall(self.k_bucket)
+        pipe.zcount(self.k_leases, f"({int(time.time() * 1000)}", "+inf")
+        pipe.pttl(self.k_open)
+        pipe.exists(self.k_half_open)
+        pipe.pttl(self.k_hold)
+        pipe.get(self.k_failures)
+        limits, bucket, in_flight, open_ms, half_open, hold_ms, failures = pipe.execute()
+        if open_ms > 0:
+            state = "open"
+        elif half_open:
+            state = "half_open"
+        else:
+            state = "closed"
+        return {
+            "upstream": self.name,
+            "enabled": self.enabled,
+            "rate": round(float(limits.get(b"rate", settings.upstream_rate)), 3),
+            "burst": settings.upstream_burst,
+            "tokens": round(float(bucket[b"tokens"]), 2) if b"tokens" in bucket else settings.upstream_burst,
+            "concurrency": int(float(limits.get(b"concurrency", settings.upstream_concurrency))),
+            "in_flight": in_flight,
+            "circuit": state,
+            "circuit_open_seconds": round(max(open_ms, 0) / 1000, 1),
+            "hold_seconds": round(max(hold_ms, 0) / 1000, 1),
+            "recent_failures": int(failures or 0),
+        }
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        # HTTP-date form
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+_limiters: dict[str, UpstreamLimiter] = {}
+
+
+def get_limiter(name: str) -> UpstreamLimiter:
+    """Per-process limiter handle for an upstream ("fal" or "mock"); the state itself is shared."""
+    limiter = _limiters.get(name)
+    if limiter is None or limiter.redis is not redis_client():
+        limiter = _limiters[name] = UpstreamLimiter(redis_client(), name)
+    return limiter
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import os
+import time
+import logging
+import zipfile
+from typing import List, Optional
+
+from pypdf import PdfReader
+from redis import Redis
+
+from .config import settings
+from . import chunking
+
+logger = logging.getLogger(__name__)
+
+# Jobs are routed by estimated cost to one of three RQ queues ("lanes"); workers listen on all
+# of them in priority order, so a one-paragraph upload never waits behind a 1,000-page one.
+HIGH, NORMAL, LOW = "high", "normal", "low"
+LANES = (HIGH, NORMAL, LOW)
+ACTIVE_PREFIX = "tts:sched:active"
+
+# .docx text is roughly this share of the size of word/document.xml (markup dominates)
+_DOCX_TEXT_RATIO = 0.15
+
+
+def lane_queue(lane: str) -> str:
+    if not settings.lanes:
+        return settings.queue_name
+    return settings.queue_name if lane == NORMAL else f"{settings.queue_name}-{lane}"
+
+
+def queue_names() -> List[str]:
+    """Queues for workers to listen on, highest priority first."""
+    if not settings.lanes:
+        return [settings.queue_name]
+    return [lane_queue(lane) for lane in LANES]
+
+
+def estimate_chars(file_path: str) -> tuple[int, Optional[int]]:
+    """Cheap text-size estimate without parsing the document: (chars, pages or None)."""
+    ext = os.path.splitext(file_path)[1].lower()
+    try:
+        if ext == ".pdf":
+            # Only the page tree is read here, not the page contents
+            pages = len(PdfReader(file_path).pages)
+            return pages * settings.sched_chars_per_page, pages
+        if ext == ".docx":
+            with zipfile.ZipFile(file_path) as z:
+                return int(z.getinfo("word/document.xml").file_size * _DOCX_TEXT_RATIO), None
+    except Exception as e:
+        logger.warning("Could not estimate size of %s: %s", file_path, e)
+    return os.path.getsize(file_path), None
+
+
+def _secs_per_char(redis: Redis, preset: str, source: str) -> float:
+    try:
+        measured = [
+            s["secs_per_char"]
+            for s in chunking.stats(redis, preset, source).values()
+            if s["secs_per_char"] is not None and s["n"] >= settings.chunk_min_samples
+        ]
+    except Exception:
+        measured = []
+    return min(measured) if measured else settings.sched_secs_per_char
+
+
+def estimate(redis: Redis, file_path: str, preset: str, source: str = "fal", max_chars: Optional[int] = None) -> dict:
+    """Estimated size and runtime of a job: chars, pages, chunks and seconds of wall time."""
+    chars, pages = estimate_chars(file_path)
+    per_chunk = max_chars or settings.chunk_max_chars
+    chunks = max(1, -(-chars // per_chunk))
+    seconds = chars * _secs_per_char(redis, preset, source) / max(1, settings.tts_concurrency)
+    return {"chars": chars, "pages": pages, "chunks": chunks, "seconds": round(seconds, 1)}
+
+
+def job_timeout(est: dict) -> int:
+    """RQ job timeout from the estimate: headroom for slow upstream days, within fixed bounds."""
+    timeout = int(est["seconds"] * settings.job_timeout_factor) + settings.job_timeout_min
+    return max(settings.job_timeout_min, min(timeout, settings.job_timeout_max))
+
+
+def _active_key(submitter: str) -> str:
+    return f"{ACTIVE_PREFIX}:{submitter}"
+
+
+def choose_lane(redis: Redis, est: dict, submitter: Optional[str]) -> str:
+    """Lane by estimated chunks, demoted one step per FAIR_SHARE_JOBS jobs the submitter already has running."""
+    if est["chunks"] <= settings.lane_high_max_chunks:
+        rank = 0
+    elif est["chunks"] <= settings.lane_normal_max_chunks:
+        rank = 1
+    else:
+        rank = 2
+    if submitter and settings.fair_share_jobs > 0:
+        try:
+            active = redis.zcount(_active_key(submitter), time.time(), "+inf")
+            rank += active // settings.fair_share_jobs
+        except Exception as e:
+            logger.warning("Fair-share lookup failed for %s: %s", submitter, e)
+    return LANES[min(rank, len(LANES) - 1)]
+
+
+def track(redis: Redis, submitter: Optional[str], job_id: str, timeout: int) -> None:
+    """Count a job against its submitter until release(); the lease lapses on its own after the timeout."""
+    if not submitter:
+        return
+    key = _active_key(submitter)
+    now = time.time()
+    pipe = redis.pipeline()
+    pipe.zadd(key, {job_id: now + timeout * (settings.tts_job_retries + 1)})
+    pipe.zremrangebyscore(key, "-inf", now)
+    pipe.expire(key, settings.job_timeout_max * (settings.tts_job_retries + 1))
+    pipe.execute()
+
+
+def release(redis: Redis, submitter: Optional[str], job_id: str) -> None:
+    if submitter:
+        redis.zrem(_active_key(submitter), job_id)
+
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import os
+import re
+import mimetypes
+from email.utils import parsedate
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from .config import settings
+
+# Outputs are named "<stem>-<8 hex>.<ext>" and stream segments "streams/<job>/<n>.<ext>";
+# neither is ever rewritten in place, so clients may cache them forever.
+_IMMUTABLE_NAME = re.compile(r"(-[0-9a-f]{8}\.\w+|^streams/[^/]+/\d{5}\.\w+)$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def cache_control_for(rel_path: str) -> str:
+    return IMMUTABLE if _IMMUTABLE_NAME.search(rel_path) else REVALIDATE
+
+
+def _not_modified(response_headers: Headers, request_headers: Headers) -> bool:
+    if if_none_match := request_headers.get("if-none-match"):
+        if if_none_match.strip() == "*":
+            return True
+        etag = response_headers.get("etag")
+        return etag is not None and etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    ims = request_headers.get("if-modified-since")
+    lm = response_headers.get("last-modified")
+    if ims and lm:
+        ims_t, lm_t = parsedate(ims), parsedate(lm)
+        return ims_t is not None and lm_t is not None and ims_t >= lm_t
+    return False
+
+
+def _offload_target(full_path: str) -> str:
+    if settings.sendfile_header.lower() == "x-accel-redirect":
+        # nginx: internal location that maps onto STORAGE_DIR
+        rel = os.path.relpath(full_path, settings.storage_dir).replace(os.sep, "/")
+        return settings.sendfile_prefix.rstrip("/") + "/" + rel
+    # X-Sendfile (Apache/lighttpd) takes a filesystem path
+    return full_path
+
+
+def file_response(
+    full_path: str,
+    request_headers: Headers,
+    stat_result: Optional[os.stat_result] = None,
+    filename: Optional[str] = None,
+    media_type: Optional[str] = None,
+    headers: Optional[dict] = None,
+) -> Response:
+    """Serve a stored file with ETag/Last-Modified validators, 304s, Range support and cache policy.
+
+    With SENDFILE_HEADER set, only headers are produced and the front proxy sends the bytes.
+    """
+    stat_result = stat_result or os.stat(full_path)
+    rel = os.path.relpath(full_path, settings.storage_dir).replace(os.sep, "/")
+    extra = {"Cache-Control": cache_control_for(rel), **(headers or {})}
+    # FileResponse computes ETag/Last-Modified/Content-Length and handles Range/If-Range itself
+    response = FileResponse(
+        full_path,
+        stat_result=stat_result,
+        filename=filename,
+        media_type=media_type,
+        headers=extra,
+    )
+    if _not_modified(response.headers, request_headers):
+        return NotModifiedResponse(response.headers)
+    if settings.sendfile_header:
+        offload = {
+            k: v
+            for k, v in response.headers.items()
+            if k.lower() in {"etag", "last-modified", "cache-control", "content-disposition"}
+        }
+        offload[settings.sendfile_header] = _offload_target(full_path)
+        media = media_type or mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        return Response(status_code=200, headers=offload, media_type=media)
+    return response
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with immutable caching for content-named outputs and optional proxy offload."""
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        return file_response(str(full_path), Headers(scope=scope), stat_result=stat_result)
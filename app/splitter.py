@@ -1,34 +1,96 @@
 from __future__ import annotations
 
 import re
-from typing import List
+from typing import Iterable, Iterator, List
 
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
 
-def split_text(text: str, min_chars: int = 400, max_chars: int = 700) -> List[str]:
-    # Simple sentence-aware chunker
-    sentences = re.split(r"(?<=[.!?])\s+", text.strip())
-    chunks: List[str] = []
+
+def iter_sentences(fragments: Iterable[str], sep: str = "\n\n", max_chars: int = 700) -> Iterator[str]:
+    """Yield sentences from a stream of text fragments (pages/paragraphs joined by sep).
+
+    The trailing, possibly unfinished sentence of each fragment is carried over, so sentences
+    that run across a page or paragraph break come out whole. A carried-over tail longer than
+    max_chars is flushed in _split_long pieces, so text without sentence breaks is neither held
+    in memory nor re-scanned with every fragment.
+    """
+    pending = ""
+    for frag in fragments:
+        pending = f"{pending}{sep}{frag}" if pending else frag.lstrip()
+        parts = _SENTENCE_BREAK.split(pending)
+        pending = parts.pop()
+        for s in parts:
+            s = s.strip()
+            if s:
+                yield s
+        if len(pending) > max_chars:
+            last = ""
+            for piece in _split_long(pending, max_chars):
+                if last:
+                    yield last
+                last = piece
+            pending = last
+    pending = pending.strip()
+    if pending:
+        yield pending
+
+
+def iter_chunks(sentences: Iterable[str], min_chars: int = 400, max_chars: int = 700) -> Iterator[str]:
+    """Group sentences into chunks, emitting each one as soon as it is complete.
+
+    A chunk ends at a sentence boundary once the next sentence would push it past max_chars. If
+    it is still shorter than min_chars at that point, it is topped up to max_chars with the head
+    of that sentence, cut at a clause or word boundary.
+    """
     buf: List[str] = []
-    total = 0
-    for s in sentences:
-        s = s.strip()
-        if not s:
-            continue
-        if total + len(s) + (1 if buf else 0) <= max_chars:
-            buf.append(s)
-            total += len(s) + (1 if buf else 0)
-        else:
-            if total >= min_chars or not buf:
-                if buf:
-                    chunks.append(" ".join(buf))
-                buf = [s]
-                total = len(s)
-            else:
-                # force split
-                chunks.append(" ".join(buf))
-                buf = [s]
-                total = len(s)
+    total = 0  # == len(" ".join(buf))
+    for sentence in sentences:
+        for s in _split_long(sentence.strip(), max_chars):
+            sep = 1 if buf else 0
+            if total + sep + len(s) <= max_chars:
+                buf.append(s)
+                total += sep + len(s)
+                continue
+            # Doesn't fit. Only an undersized chunk cuts the sentence in two
+            room = max_chars - total - sep
+            if total < min_chars and room > 0:
+                head = next(_split_long(s, room))
+                if s[len(head) : len(head) + 1].isspace():  # clause or word boundary, never mid-word
+                    buf.append(head)
+                    s = s[len(head) :].strip()
+            yield " ".join(buf)
+            buf = [s]
+            total = len(s)
     if buf:
-        chunks.append(" ".join(buf))
-    return [c.strip() for c in chunks if c.strip()]
+        yield " ".join(buf)
 
+
+def _split_long(sentence: str, max_chars: int) -> Iterator[str]:
+    """Break a single sentence longer than max_chars at clause, then word, boundaries."""
+    # Walks an offset instead of re-slicing the remainder, so a huge unbroken text stays linear
+    start, end = 0, len(sentence)
+    while start < end and sentence[start].isspace():
+        start += 1
+    while end - start > max_chars:
+        head = sentence[start : start + max_chars + 1]
+        cut = max(head.rfind(", "), head.rfind("; "), head.rfind(": "))
+        cut = cut + 1 if cut > max_chars // 2 else head.rfind(" ")
+        if cut <= 0:
+            cut = max_chars
+        yield head[:cut].strip()
+        start += cut
+        while start < end and sentence[start].isspace():
+            start += 1
+    tail = sentence[start:].strip()
+    if tail:
+        yield tail
+
+
+def split_stream(fragments: Iterable[str], min_chars: int = 400, max_chars: int = 700) -> Iterator[str]:
+    # Incremental counterpart of split_text for parser.iter_file output
+    return iter_chunks(iter_sentences(fragments, max_chars=max_chars), min_chars, max_chars)
+
+
+def split_text(text: str, min_chars: int = 400, max_chars: int = 700) -> List[str]:
+    # Simple sentence-aware chunker
+    return list(split_stream([text], min_chars, max_chars))
@@ -1,47 +1,108 @@
 from __future__ import annotations
 
 import os
+import json
+import errno
+import shutil
 import uuid
 from typing import Optional
 
-import boto3
-from botocore.client import Config as BotoConfig
+from boto3.s3.transfer import TransferConfig
 
 from .config import settings
+from .clients import s3_client
+from .profiles import content_type
 
+_COPY_BLOCK = 8 * 1024 * 1024
 
-def save_local(src_path: str, filename: Optional[str] = None) -> str:
+
+def _stream_copy(src_path: str, dst_path: str) -> None:
+    """Kernel-side copy (copy_file_range, then sendfile) with a bounded-buffer fallback."""
+    with open(src_path, "rb") as rf, open(dst_path, "xb") as wf:
+        remaining = os.fstat(rf.fileno()).st_size
+        for name in ("copy_file_range", "sendfile"):
+            fn = getattr(os, name, None)
+            if fn is None:
+                continue
+            try:
+                while remaining > 0:
+                    if name == "copy_file_range":
+                        n = fn(rf.fileno(), wf.fileno(), min(remaining, _COPY_BLOCK))
+                    else:
+                        n = fn(wf.fileno(), rf.fileno(), None, min(remaining, _COPY_BLOCK))
+                    if n == 0:
+                        break
+                    remaining -= n
+                return
+            except OSError as e:
+                if e.errno not in {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}:
+                    raise
+        shutil.copyfileobj(rf, wf, _COPY_BLOCK)
+
+
+def _place(src_path: str, dst_path: str, move: bool) -> str:
+    """Materialise src at dst without overwriting anything; returns the name actually used.
+
+    Same filesystem: hardlink (atomic, zero-copy). Otherwise: stream into a temp file next to
+    the destination and link it into place. Collisions get a random suffix instead of probing.
+    """
+    root, ext = os.path.splitext(dst_path)
+    while True:
+        try:
+            try:
+                os.link(src_path, dst_path)
+            except OSError as e:
+                if e.errno not in {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP}:
+                    raise
+                part = f"{dst_path}.{uuid.uuid4().hex}.part"
+                _stream_copy(src_path, part)
+                try:
+                    os.link(part, dst_path)
+                finally:
+                    os.remove(part)
+            break
+        except FileExistsError:
+            dst_path = f"{root}-{uuid.uuid4().hex[:8]}{ext}"
+    if move:
+        os.remove(src_path)
+    return dst_path
+
+
+def save_local(src_path: str, filename: Optional[str] = None, move: bool = False) -> str:
     os.makedirs(settings.storage_dir, exist_ok=True)
     base = filename or os.path.basename(src_path)
     safe_name = base.replace(" ", "_")
-    dst = os.path.join(settings.storage_dir, safe_name)
-    i = 1
-    root, ext = os.path.splitext(dst)
-    while os.path.exists(dst):
-        dst = f"{root}_{i}{ext}"
-        i += 1
-    with open(src_path, "rb") as rf, open(dst, "wb") as wf:
-        wf.write(rf.read())
+    dst = _place(src_path, os.path.join(settings.storage_dir, safe_name), move)
     # The API will serve /files as static
     return f"/files/{os.path.basename(dst)}"
 
 
-def save_s3(src_path: str, filename: Optional[str] = None) -> str:
+def _transfer_config() -> TransferConfig:
+    # upload_file streams from disk in multipart_chunksize parts: memory ~ chunksize * concurrency
+    return TransferConfig(
+        multipart_threshold=settings.s3_multipart_threshold,
+        multipart_chunksize=settings.s3_multipart_chunksize,
+        max_concurrency=settings.s3_upload_concurrency,
+        use_threads=True,
+    )
+
+
+def save_s3(src_path: str, filename: Optional[str] = None, move: bool = False) -> str:
     if not settings.s3_bucket:
         raise RuntimeError("STORAGE_BUCKET not configured for S3 backend")
     key = filename or os.path.basename(src_path)
     key = key.replace(" ", "_")
 
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=settings.s3_endpoint_url,
-        region_name=settings.s3_region or "us-east-1",
-        aws_access_key_id=settings.s3_access_key,
-        aws_secret_access_key=settings.s3_secret_key,
-        config=BotoConfig(signature_version="s3v4"),
+    s3 = s3_client()
+    s3.upload_file(
+        src_path,
+        settings.s3_bucket,
+        key,
+        ExtraArgs={"ContentType": content_type(key)},
+        Config=_transfer_config(),
     )
-    with open(src_path, "rb") as f:
-        s3.upload_fileobj(f, settings.s3_bucket, key, ExtraArgs={"ContentType": "audio/mpeg"})
+    if move:
+        os.remove(src_path)
 
     # Generate a pre-signed URL
     url = s3.generate_presigned_url(
@@ -52,8 +113,102 @@ def save_s3(src_path: str, filename: Optional[str] = None) -> str:
     return url
 
 
-def save_and_get_url(src_path: str, filename: Optional[str] = None) -> str:
+def save_stream_segment(src_path: str, job_id: str, index: int) -> str:
+    """Publish one in-progress segment under a stable per-job key and return its URL."""
+    key = f"streams/{job_id}/{index:05d}{os.path.splitext(src_path)[1]}"
     if settings.storage_backend == "s3":
-        return save_s3(src_path, filename)
-    return save_local(src_path, filename)
+        if not settings.s3_bucket:
+            raise RuntimeError("STORAGE_BUCKET not configured for S3 backend")
+        s3 = s3_client()
+        s3.upload_file(
+            src_path,
+            settings.s3_bucket,
+            key,
+            ExtraArgs={"ContentType": content_type(key)},
+            Config=_transfer_config(),
+        )
+        return s3.generate_presigned_url(
+            ClientMethod="get_object",
+            Params={"Bucket": settings.s3_bucket, "Key": key},
+            ExpiresIn=settings.stream_ttl,
+        )
+    dst = os.path.join(settings.storage_dir, key)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    # The segment is still needed for final assembly, so link rather than move
+    dst = _place(src_path, dst, move=False)
+    return f"/files/streams/{job_id}/{os.path.basename(dst)}"
+
+
+def _checkpoint_key(job_id: str, name: str) -> str:
+    return f"{settings.checkpoint_prefix.rstrip('/')}/{job_id}/{name}"
 
+
+def save_checkpoint(src_path: str, job_id: str, name: str) -> str:
+    """Copy a finished segment somewhere that outlives this worker; returns its location.
+
+    Locations are "s3://bucket/key" or a local path under CHECKPOINT_DIR (which should be a volume
+    shared by all workers for cross-node resume). The source stays in place for assembly.
+    """
+    if settings.storage_backend == "s3":
+        if not settings.s3_bucket:
+            raise RuntimeError("STORAGE_BUCKET not configured for S3 backend")
+        key = _checkpoint_key(job_id, name)
+        s3_client().upload_file(src_path, settings.s3_bucket, key, Config=_transfer_config())
+        return f"s3://{settings.s3_bucket}/{key}"
+    dst = os.path.join(settings.checkpoint_dir, job_id, name)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.exists(dst):
+        # Re-recorded after a resume: the name is per chunk index, so replace it
+        os.remove(dst)
+    return _place(src_path, dst, move=False)
+
+
+def fetch_checkpoint(location: str, dest_path: str) -> str:
+    if location.startswith("s3://"):
+        bucket, key = location[len("s3://"):].split("/", 1)
+        s3_client().download_file(bucket, key, dest_path, Config=_transfer_config())
+        return dest_path
+    return _place(location, dest_path, move=False)
+
+
+def write_checkpoint_manifest(job_id: str, manifest: dict) -> None:
+    body = json.dumps(manifest).encode("utf-8")
+    if settings.storage_backend == "s3":
+        s3_client().put_object(Bucket=settings.s3_bucket, Key=_checkpoint_key(job_id, "manifest.json"), Body=body)
+        return
+    dst = os.path.join(settings.checkpoint_dir, job_id, "manifest.json")
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.{uuid.uuid4().hex}.part"
+    with open(tmp, "wb") as f:
+        f.write(body)
+    os.replace(tmp, dst)
+
+
+def read_checkpoint_manifest(job_id: str) -> Optional[dict]:
+    try:
+        if settings.storage_backend == "s3":
+            obj = s3_client().get_object(Bucket=settings.s3_bucket, Key=_checkpoint_key(job_id, "manifest.json"))
+            return json.loads(obj["Body"].read())
+        with open(os.path.join(settings.checkpoint_dir, job_id, "manifest.json"), "rb") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def delete_checkpoints(job_id: str) -> None:
+    if settings.storage_backend == "s3":
+        s3 = s3_client()
+        prefix = _checkpoint_key(job_id, "")
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=settings.s3_bucket, Prefix=prefix):
+            keys = [{"Key": o["Key"]} for o in page.get("Contents", [])]
+            if keys:
+                s3.delete_objects(Bucket=settings.s3_bucket, Delete={"Objects": keys})
+        return
+    shutil.rmtree(os.path.join(settings.checkpoint_dir, job_id), ignore_errors=True)
+
+
+def save_and_get_url(src_path: str, filename: Optional[str] = None, move: bool = False) -> str:
+    """Store the finished file; with move=True the source is consumed (renamed/linked away or deleted)."""
+    if settings.storage_backend == "s3":
+        return save_s3(src_path, filename, move)
+    return save_local(src_path, filename, move)
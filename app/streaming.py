@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import json
+import math
+import logging
+from typing import Dict, Optional
+
+import ffmpeg  # type: ignore
+from redis import Redis
+
+from .config import settings
+from .storage import save_stream_segment
+
+logger = logging.getLogger(__name__)
+
+
+def _segments_key(job_id: str) -> str:
+    return f"tts:stream:{job_id}"
+
+
+def _done_key(job_id: str) -> str:
+    return f"tts:stream:{job_id}:done"
+
+
+def probe_duration(path: str, fallback: float) -> float:
+    try:
+        return float(ffmpeg.probe(path)["format"]["duration"])
+    except Exception as e:
+        logger.warning("[Stream] Could not probe %s (%s); estimating %.1fs", path, e, fallback)
+        return fallback
+
+
+class SegmentPublisher:
+    """Publishes finished segments of a job in document order as soon as a contiguous prefix exists.
+
+    With resume=True (a retried job) the playlist published so far is kept and continued, so
+    players don't see segments disappear and come back.
+    """
+
+    def __init__(self, job_id: str, redis: Redis, resume: bool = False):
+        self.job_id = job_id
+        self.redis = redis
+        self._pending: Dict[int, tuple[str, float]] = {}
+        if resume:
+            self.next_index = redis.llen(_segments_key(job_id)) + 1
+            redis.delete(_done_key(job_id))
+        else:
+            self.next_index = 1
+            redis.delete(_segments_key(job_id), _done_key(job_id))
+
+    def add(self, index: int, path: str, est_duration: float) -> None:
+        if index < self.next_index:
+            # Already in the playlist from an earlier attempt
+            return
+        self._pending[index] = (path, est_duration)
+        while self.next_index in self._pending:
+            seg_path, est = self._pending.pop(self.next_index)
+            duration = probe_duration(seg_path, est)
+            url = save_stream_segment(seg_path, self.job_id, self.next_index)
+            key = _segments_key(self.job_id)
+            pipe = self.redis.pipeline()
+            pipe.rpush(key, json.dumps({"url": url, "duration": duration}))
+            pipe.expire(key, settings.stream_ttl)
+            pipe.execute()
+            self.next_index += 1
+
+    def finish(self) -> None:
+        self.redis.set(_done_key(self.job_id), 1, ex=settings.stream_ttl)
+
+
+def render_playlist(redis: Redis, job_id: str, allow_empty: bool = False) -> Optional[str]:
+    """Build the HLS EVENT playlist for a streaming job; None if nothing was published (unless allow_empty)."""
+    pipe = redis.pipeline()
+    pipe.lrange(_segments_key(job_id), 0, -1)
+    pipe.exists(_done_key(job_id))
+    raw, done = pipe.execute()
+    segments = [json.loads(s) for s in raw]
+    if not segments and not done and not allow_empty:
+        return None
+    target = max([settings.stream_target_duration] + [math.ceil(s["duration"]) for s in segments])
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        "#EXT-X-PLAYLIST-TYPE:EVENT",
+        f"#EXT-X-TARGETDURATION:{target}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+    ]
+    for s in segments:
+        lines.append(f"#EXTINF:{s['duration']:.3f},")
+        lines.append(s["url"])
+    if done:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import gc
+import os
+import sys
+import time
+import uuid
+import socket
+import signal
+import logging
+import resource
+import traceback
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from redis import Redis
+from rq import Queue, SimpleWorker
+from rq.exceptions import StopRequested
+
+from .config import settings
+from .scheduler import queue_names
+
+# The heavy imports (pypdf, python-docx, boto3, ffmpeg-python, NumPy, requests) happen once, here,
+# through the job module; children forked afterwards share those pages copy-on-write.
+from . import worker as _jobs  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process (peak RSS where /proc is unavailable, e.g. macOS)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RecyclingWorker(SimpleWorker):
+    """SimpleWorker that exits after a job once it has grown past WORKER_MAX_RSS_BYTES."""
+
+    def execute_job(self, job, queue):
+        super().execute_job(job, queue)
+        rss = rss_bytes()
+        if settings.worker_max_rss_bytes and rss > settings.worker_max_rss_bytes:
+            logger.info("[Supervisor] Worker %s at %d MiB; recycling", self.name, rss // 2**20)
+            # Caught by the work loop: a clean exit, and the supervisor starts a fresh child
+            raise StopRequested()
+
+
+@dataclass
+class Child:
+    pid: int
+    name: str
+    started: float
+    retiring: bool = False
+
+
+class Supervisor:
+    """Keeps WORKERS_MIN..WORKERS_MAX forked SimpleWorkers running on this node.
+
+    Children are forked from this preloaded process, so a new worker is ready in milliseconds
+    and shares the imported modules' memory. A child that exits cleanly is replaced right away.
+    That covers recycling after WORKER_MAX_JOBS jobs or past WORKER_MAX_RSS_BYTES. After a
+    crash, new children wait for a backoff that doubles with each crash in a row. Every
+    WORKERS_SCALE_INTERVAL the target is set to busy children + queued jobs. Scaling up happens
+    at once. Idle children are stopped only after the queues have been empty for
+    WORKERS_IDLE_GRACE.
+    """
+
+    def __init__(self, minimum: int, maximum: int):
+        self.minimum = max(0, minimum)
+        self.maximum = max(self.minimum, maximum, 1)
+        self.target = self.minimum
+        self.children: Dict[int, Child] = {}
+        self.spawned = 0
+        self.crashes = 0  # in a row; a child that ran for a while resets it
+        self.not_before = 0.0  # no new children before this (crash backoff)
+        self.stopping = 0
+        self.last_demand = time.monotonic()
+        self.host = socket.gethostname()
+        self.redis = Redis.from_url(settings.redis_url)
+        self.queues = queue_names()
+
+    # -- children ---------------------------------------------------------------------------
+
+    def _spawn(self) -> None:
+        self.spawned += 1
+        name = f"{self.host}.{os.getpid()}.{self.spawned}.{uuid.uuid4().hex[:6]}"
+        pid = os.fork()
+        if pid == 0:
+            self._run_child(name)
+        self.children[pid] = Child(pid, name, time.monotonic())
+        logger.info("[Supervisor] Started worker %s (pid %d)", name, pid)
+
+    def _run_child(self, name: str) -> None:
+        code = 0
+        try:
+            # RQ installs its own handlers (warm shutdown on the first signal, cold on the second)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            redis = Redis.from_url(settings.redis_url)
+            worker = RecyclingWorker([Queue(n, connection=redis) for n in self.queues], connection=redis, name=name)
+            worker.work(max_jobs=settings.worker_max_jobs or None, logging_level=settings.worker_log_level)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 0
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            # Never return into the supervisor's loop (or run its atexit handlers) in the child
+            os._exit(code)
+
+    def _reap(self) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            child = self.children.pop(pid, None)
+            if child is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            lived = time.monotonic() - child.started
+            if code == 0 or child.retiring or self.stopping:
+                self.crashes = 0
+                logger.info("[Supervisor] Worker %s exited after %.0fs", child.name, lived)
+                continue
+            self.crashes = 1 if lived > settings.worker_restart_backoff_max else self.crashes + 1
+            backoff = min(settings.worker_restart_backoff_max, 2 ** (self.crashes - 1))
+            self.not_before = time.monotonic() + backoff
+            logger.warning(
+                "[Supervisor] Worker %s died (exit %s) after %.0fs; restarting in %ds", child.name, code, lived, backoff
+            )
+
+    # -- scaling ----------------------------------------------------------------------------
+
+    def _observe(self) -> tuple[int, Dict[int, str]]:
+        """Queued jobs on all lanes and each child's RQ state, in one round trip."""
+        pipe = self.redis.pipeline(transaction=False)
+        for name in self.queues:
+            pipe.llen(Queue(name, connection=self.redis).key)
+        children = list(self.children.values())
+        for c in children:
+            pipe.hget(f"{SimpleWorker.redis_worker_namespace_prefix}{c.name}", "state")
+        results = pipe.execute()
+        queued = sum(results[: len(self.queues)])
+        states = {c.pid: (s.decode() if s else "starting") for c, s in zip(children, results[len(self.queues) :])}
+        return queued, states
+
+    def _scale(self) -> None:
+        try:
+            queued, states = self._observe()
+        except Exception as e:
+            logger.warning("[Supervisor] Could not read queue depth: %s", e)
+            return
+        busy = sum(1 for s in states.values() if s == "busy")
+        want = min(self.maximum, max(self.minimum, busy + queued))
+        now = time.monotonic()
+        if queued:
+            self.last_demand = now
+        if want > self.target:
+            logger.info("[Supervisor] %d queued, %d busy: scaling %d -> %d workers", queued, busy, self.target, want)
+            self.target = want
+        elif want < self.target and now - self.last_demand >= settings.workers_idle_grace:
+            logger.info("[Supervisor] Queues idle for %ds: scaling %d -> %d workers", settings.workers_idle_grace, self.target, want)
+            self.target = want
+        active = [c for c in self.children.values() if not c.retiring]
+        excess = len(active) - self.target
+        # Only idle children are stopped; a busy one is never interrupted to scale down
+        for c in active:
+            if excess <= 0:
+                break
+            if states.get(c.pid) == "idle":
+                c.retiring = True
+                os.kill(c.pid, signal.SIGTERM)
+                excess -= 1
+
+    # -- main loop --------------------------------------------------------------------------
+
+    def _on_signal(self, signum, frame) -> None:
+        self.stopping += 1
+        # First signal: warm shutdown (current jobs finish); second: cold, RQ stops the jobs
+        logger.info("[Supervisor] Signal %d: %s shutdown of %d workers", signum, "warm" if self.stopping == 1 else "cold", len(self.children))
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGINT, self._on_signal)
+        signal.signal(signal.SIGTERM, self._on_signal)
+        # Objects allocated so far never move to a younger generation, so the children's
+        # garbage collector doesn't touch (and copy) the shared preloaded pages
+        gc.collect()
+        gc.freeze()
+        logger.info(
+            "[Supervisor] %d-%d workers on %s (pid %d, %d MiB preloaded)",
+            self.minimum,
+            self.maximum,
+            ", ".join(self.queues),
+            os.getpid(),
+            rss_bytes() // 2**20,
+        )
+        next_scale = 0.0
+        while True:
+            self._reap()
+            if self.stopping:
+                if not self.children:
+                    break
+                time.sleep(0.2)
+                continue
+            if time.monotonic() >= next_scale:
+                self._scale()
+                next_scale = time.monotonic() + settings.workers_scale_interval
+            active = sum(1 for c in self.children.values() if not c.retiring)
+            if active < self.target and time.monotonic() >= self.not_before:
+                for _ in range(self.target - active):
+                    self._spawn()
+            time.sleep(0.5)
+        logger.info("[Supervisor] All workers stopped")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Preloading supervisor for forked RQ SimpleWorkers")
+    parser.add_argument("--min", type=int, default=settings.workers_min, help="workers kept running (WORKERS_MIN)")
+    parser.add_argument("--max", type=int, default=settings.workers_max, help="upper bound when scaling (WORKERS_MAX)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", datefmt="%H:%M:%S")
+    Supervisor(args.min, args.max).run()
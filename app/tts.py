@@ -4,11 +4,16 @@ import os
 import uuid
 import time
 import random
+import zlib
 import logging
 import requests
 from typing import Optional
 
 from .config import settings
+from . import metrics
+from .audio_utils import mock_speech
+from .clients import http_session
+from .ratelimit import get_limiter, retry_after_seconds
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +22,20 @@ class UnsupportedPresetError(Exception):
     pass
 
 
+def _outcome(status_code: int) -> str:
+    if status_code == 429:
+        return "throttled"
+    if 400 <= status_code < 500:
+        return "rejected"
+    return "error" if status_code >= 500 else "ok"
+
+
+def _failure_outcome(exc: requests.RequestException) -> str:
+    if isinstance(exc, requests.Timeout):
+        return "timeout"
+    return "connection" if isinstance(exc, requests.ConnectionError) else "error"
+
+
 def call_vibevoice(script: str, preset: str = "Frank [EN]") -> str:
     # Pre-validate against configured presets to avoid obviously bad requests
     if settings.presets and preset not in settings.presets:
@@ -30,14 +49,28 @@ def call_vibevoice(script: str, preset: str = "Frank [EN]") -> str:
     base_sleep = 1.0
     last_exc: Optional[Exception] = None
 
+    limiter = get_limiter("fal")
     for attempt in range(1, max_attempts + 1):
+        retry_after = None
         try:
-            r = requests.post(
-                settings.fal_url,
-                json=payload,
-                headers=headers,
-                timeout=(settings.fal_connect_timeout, settings.fal_read_timeout),
-            )
+            # Shared across all workers: rate, concurrency and circuit state for the endpoint
+            waited = time.perf_counter()
+            with limiter.permit() as permit:
+                sent = time.perf_counter()
+                metrics.record("rate_limit_wait", sent - waited)
+                try:
+                    r = http_session().post(
+                        settings.fal_url,
+                        json=payload,
+                        headers=headers,
+                        timeout=(settings.fal_connect_timeout, settings.fal_read_timeout),
+                    )
+                except requests.RequestException as e:
+                    metrics.upstream_attempt("fal", _failure_outcome(e), time.perf_counter() - sent)
+                    raise
+                metrics.upstream_attempt("fal", _outcome(r.status_code), time.perf_counter() - sent)
+                retry_after = r.headers.get("Retry-After")
+                permit.observe(r.status_code, retry_after)
             if r.status_code in (400, 422):
                 # Likely validation/preset issue — raise clearly so caller can decide about fallback
                 msg = None
@@ -79,6 +112,8 @@ def call_vibevoice(script: str, preset: str = "Frank [EN]") -> str:
                 break
             delay = base_sleep * (2 ** (attempt - 1))
             delay += random.uniform(0, 0.5)
+            # Honour the upstream's own hint; the limiter already holds back every other worker
+            delay = max(delay, min(retry_after_seconds(retry_after) or 0, settings.upstream_breaker_max_wait))
             logger.warning(
                 "VibeVoice request failed (attempt %d/%d, preset=%s): %s; retrying in %.1fs",
                 attempt,
@@ -87,6 +122,7 @@ def call_vibevoice(script: str, preset: str = "Frank [EN]") -> str:
                 e,
                 delay,
             )
+            metrics.retry("fal")
             time.sleep(delay)
         except ValueError as e:
             # Response shape unexpected — don't keep retrying endlessly
@@ -98,5 +134,47 @@ def call_vibevoice(script: str, preset: str = "Frank [EN]") -> str:
     raise last_exc
 
 
+def mock_vibevoice(script: str, preset: str = "Frank [EN]", dest_dir: Optional[str] = None) -> str:
+    """Stand-in for call_vibevoice + download_audio: same validation, latency and failure profile, local WAV out."""
+    if settings.presets and preset not in settings.presets:
+        raise UnsupportedPresetError(f"Preset '{preset}' is not in allowed presets list")
+
+    text = script.split(":", 1)[-1].strip()
+    duration = max(0.5, len(text) / settings.mock_tts_chars_per_second)
+    # Give each preset its own pitch so fallbacks are audible
+    frequency = 160 + (zlib.crc32(preset.encode("utf-8")) % 120)
+
+    max_attempts = settings.fal_max_attempts
+    limiter = get_limiter("mock")
+    for attempt in range(1, max_attempts + 1):
+        waited = time.perf_counter()
+        with limiter.permit() as permit:
+            sent = time.perf_counter()
+            metrics.record("rate_limit_wait", sent - waited)
+            if settings.mock_tts_latency > 0:
+                time.sleep(random.uniform(0.5, 1.5) * settings.mock_tts_latency)
+            ok = random.random() >= settings.mock_tts_failure_rate
+            # Simulated failures count like upstream 500s: towards the breaker, no backoff
+            permit.observe(200 if ok else 500)
+            metrics.upstream_attempt("mock", "ok" if ok else "error", time.perf_counter() - sent)
+        if ok:
+            return mock_speech(duration, frequency, dest_dir=dest_dir)
+        e = requests.ConnectionError(f"Simulated VibeVoice failure (preset={preset})")
+        if attempt == max_attempts:
+            raise e
+        delay = settings.mock_tts_latency * (2 ** (attempt - 1))
+        logger.warning(
+            "Mock VibeVoice request failed (attempt %d/%d, preset=%s): %s; retrying in %.1fs",
+            attempt,
+            max_attempts,
+            preset,
+            e,
+            delay,
+        )
+        metrics.retry("mock")
+        time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
 def should_mock_tts() -> bool:
     return settings.mock_tts or not settings.fal_key
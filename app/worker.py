@@ -2,94 +2,690 @@ from __future__ import annotations
 
 import os
 import uuid
+import time
+import queue
 import logging
-from typing import List
+import functools
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
 
 from redis import Redis
-from rq import Queue, get_current_job
+from rq import Queue, Retry, get_current_job
+from rq.job import Dependency, Job
 import requests
 
 from .config import settings
-from .parser import parse_file
-from .splitter import split_text
-from .tts import call_vibevoice, should_mock_tts, UnsupportedPresetError
-from .audio_utils import download_audio, mock_tone, concat_and_normalize
+from .parser import iter_file
+from .splitter import split_stream
+from .tts import call_vibevoice, mock_vibevoice, should_mock_tts, UnsupportedPresetError
+from .audio_utils import download_audio, concat_and_normalize, concat_segments, normalize_segment
 from .storage import save_and_get_url
+from .cache import get_segment_cache, segment_key
+from .clients import pool_stats, redis_client
+from . import chunking, dedupe, fanout, jobindex, metrics, scheduler, workspace
+from .streaming import SegmentPublisher
+from .events import ProgressPublisher, timestamp
+from .manifest import Manifest, chunk_hash
+from .profiles import OutputProfile, from_dict
 
 logger = logging.getLogger(__name__)
 
 
-def process_tts_job(file_path: str, filename: str, preset: str = "Frank [EN]") -> str:
-    text = parse_file(file_path)
-    chunks = split_text(text)
+def _call_with_fallback(script: str, preset: str, idx: int, call=call_vibevoice) -> tuple[str, str]:
+    """Call VibeVoice for one chunk, falling back to the configured preset; returns (result, preset used)."""
+    try:
+        return call(script, preset=preset), preset
+    except UnsupportedPresetError:
+        if preset != settings.fallback_preset:
+            logger.warning("[TTS] Preset '%s' not allowed. Falling back to '%s' (chunk %d)", preset, settings.fallback_preset, idx)
+            return call(script, preset=settings.fallback_preset), settings.fallback_preset
+        raise
+    except requests.HTTPError as e:
+        # If preset seems unsupported (400/422), try fallback to configured fallback preset
+        code = getattr(getattr(e, 'response', None), 'status_code', None)
+        if code in {400, 422} and preset != settings.fallback_preset:
+            logger.warning(
+                "[TTS] Preset '%s' failed with %s. Falling back to '%s' for this chunk.",
+                preset,
+                code,
+                settings.fallback_preset,
+            )
+            return call(script, preset=settings.fallback_preset), settings.fallback_preset
+        raise
+    except requests.RequestException as e:
+        # Network/timeout after retries — try fallback once if not already fallback preset
+        if preset != settings.fallback_preset:
+            logger.warning("[TTS] Network error for preset '%s': %s. Trying fallback '%s'", preset, e, settings.fallback_preset)
+            return call(script, preset=settings.fallback_preset), settings.fallback_preset
+        raise
 
-    # Progress meta
+
+class ChunkAborted(Exception):
+    """The job failed while this chunk was in flight; nothing more may be written for it."""
+
+
+def _check_abort(abort: Optional[threading.Event]) -> None:
+    # The job's workspace may already be gone; don't recreate it or write into it
+    if abort is not None and abort.is_set():
+        raise ChunkAborted()
+
+
+def _timed_call(redis: Optional[Redis], chunk: str, script: str, preset: str, idx: int, call, source: str) -> tuple[str, str]:
+    """_call_with_fallback, feeding latency/outcome by chunk size to the chunk-size controller."""
+    started = time.monotonic()
+    ok = False
+    try:
+        with metrics.stage("synthesize"):
+            result = _call_with_fallback(script, preset, idx, call=call)
+        if result[1] != preset:
+            metrics.fallback(source)
+        ok = True
+        return result
+    finally:
+        if redis is not None:
+            try:
+                chunking.record(redis, preset, len(chunk), time.monotonic() - started, ok, source)
+            except Exception as e:
+                logger.debug("[TTS] Could not record chunk stats: %s", e)
+
+
+def _synthesize_chunk(
+    chunk: str,
+    preset: str,
+    idx: int,
+    total: Optional[int],
+    redis: Optional[Redis] = None,
+    workdir: Optional[str] = None,
+    abort: Optional[threading.Event] = None,
+) -> tuple[str, Optional[bool]]:
+    """Synthesize one chunk into workdir (default TMP_DIR); returns (segment path, cache hit) with hit=None when uncached."""
+    script = f"Speaker 0: {chunk}"
+    _check_abort(abort)
+    if should_mock_tts():
+        logger.info("[TTS] Mocking chunk %d/%s", idx, total or "?")
+        call = functools.partial(mock_vibevoice, dest_dir=workdir)
+        path, _ = _timed_call(redis, chunk, script, preset, idx, call, "mock")
+        return path, None
+
+    cache = get_segment_cache()
+    if cache:
+        with metrics.stage("cache_lookup"):
+            cached = cache.get(segment_key(script, preset), workdir or settings.tmp_dir)
+        if cached:
+            logger.info("[TTS] Chunk %d/%s served from segment cache", idx, total or "?")
+            return cached, True
+
+    logger.info("[TTS] Generating chunk %d/%s via VibeVoice (preset=%s)", idx, total or "?", preset)
+    url, used_preset = _timed_call(redis, chunk, script, preset, idx, call_vibevoice, "fal")
+    _check_abort(abort)
+    with metrics.stage("download") as info:
+        path = download_audio(url, dest_dir=workdir)
+        info["bytes"] = os.path.getsize(path)
+    if cache and used_preset == preset:
+        # Only cache what was actually asked for; fallback audio would poison the key
+        try:
+            cache.put(segment_key(script, preset), path)
+        except Exception as e:
+            logger.warning("[TTS] Failed to cache chunk %d: %s", idx, e)
+    return path, (False if cache else None)
+
+
+def _produce_segment(
+    chunk: str,
+    preset: str,
+    idx: int,
+    total: Optional[int],
+    normalize: bool,
+    redis: Optional[Redis] = None,
+    workdir: Optional[str] = None,
+    profile: Optional[OutputProfile] = None,
+    abort: Optional[threading.Event] = None,
+) -> tuple[str, Optional[bool]]:
+    """Pool task: synthesize a chunk and, in segmented assembly, normalize + encode it right away."""
+    path, hit = _synthesize_chunk(chunk, preset, idx, total, redis, workdir, abort)
+    if normalize:
+        _check_abort(abort)
+        profile = profile or from_dict(None)
+        root, _ = os.path.splitext(path)
+        with metrics.stage("normalize"):
+            path = normalize_segment(path, f"{root}-norm{profile.segment_ext}", profile)
+    return path, hit
+
+
+def _resume_or_produce(
+    manifest: Optional[Manifest],
+    chunk: str,
+    preset: str,
+    idx: int,
+    segmented: bool,
+    redis: Optional[Redis] = None,
+    workdir: Optional[str] = None,
+    profile: Optional[OutputProfile] = None,
+    abort: Optional[threading.Event] = None,
+) -> tuple[str, Optional[bool], bool]:
+    """Pool task: reuse the checkpointed segment for this chunk if there is one, else produce and checkpoint it.
+
+    Returns (segment path, cache hit, resumed).
+    """
+    _check_abort(abort)
+    if manifest is None:
+        return (*_produce_segment(chunk, preset, idx, None, segmented, redis, workdir, profile, abort), False)
+    digest = chunk_hash(chunk, preset, segmented, profile.key if profile else "")
+    if manifest.completed(idx, digest):
+        try:
+            with metrics.stage("restore") as info:
+                path = manifest.restore(idx, workdir or settings.tmp_dir)
+                info["bytes"] = os.path.getsize(path)
+            logger.info("[TTS] Chunk %d restored from checkpoint", idx)
+            return path, None, True
+        except Exception as e:
+            logger.warning("[TTS] Checkpoint for chunk %d unusable (%s); synthesizing again", idx, e)
+    path, hit = _produce_segment(chunk, preset, idx, None, segmented, redis, workdir, profile, abort)
+    _check_abort(abort)
+    try:
+        with metrics.stage("checkpoint"):
+            manifest.record(idx, digest, path)
+    except Exception as e:
+        # A missing checkpoint only costs a re-synthesis on resume
+        logger.warning("[TTS] Could not checkpoint chunk %d: %s", idx, e)
+    return path, hit, False
+
+
+def process_tts_job(
+    file_path: str,
+    filename: str,
+    preset: str = "Frank [EN]",
+    content_hash: Optional[str] = None,
+    stream: bool = False,
+    min_chars: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    distributed: bool = False,
+    output: Optional[dict] = None,
+) -> Optional[str]:
+    """Synthesize a document; with distributed=True large documents are handed to part jobs.
+
+    In that case this job returns None once the parts are enqueued and finalize_tts_job
+    reports the outcome under this job's id.
+    """
     job = get_current_job()
-    if job:
-        job.meta["total_chunks"] = len(chunks)
-        job.meta["processed_chunks"] = 0
-        job.save_meta()
-
-    seg_paths: List[str] = []
-    for idx, chunk in enumerate(chunks, start=1):
-        script = f"Speaker 0: {chunk}"
-        if should_mock_tts():
-            logger.info("[TTS] Mocking chunk %d/%d", idx, len(chunks))
-            seg_paths.append(mock_tone(1.2))
+    redis = job.connection if job else redis_client()
+    progress = ProgressPublisher(job, redis)
+    progress.start()
+    profile = from_dict(output)
+
+    def run() -> Optional[str]:
+        bounds = chunking.override_bounds(min_chars, max_chars)
+        workspace.sweep_in_background(redis)
+        workspace.wait_for_room(redis, workspace.estimated_bytes(job.meta if job else {}))
+        with workspace.job_workspace(job.id if job else uuid.uuid4().hex, redis) as workdir:
+            url = _run_tts_job(
+                job, progress, redis, file_path, filename, preset, profile, content_hash, stream, bounds, distributed, workdir
+            )
+        if url is not None:
+            # Failed jobs keep their upload for a resume; the sweeper expires it otherwise
+            workspace.discard_upload(file_path, redis)
+        return url
+
+    return _settle(job, progress, redis, preset, profile, content_hash, job.id if job else None, run)
+
+
+def _settle(
+    job,
+    progress: ProgressPublisher,
+    redis: Redis,
+    preset: str,
+    profile: OutputProfile,
+    content_hash: Optional[str],
+    owner_id: Optional[str],
+    run,
+) -> Optional[str]:
+    """Run a job body and record its outcome: dedupe records, terminal event and index status.
+
+    A None result means the work was handed off (distributed mode) and nothing is settled yet.
+    """
+    dedupe_on = settings.dedupe_enabled and content_hash
+    timer = metrics.StageTimer()
+    try:
+        try:
+            with metrics.bound(timer):
+                url = run()
+        finally:
+            _record_stages(redis, progress, timer, owner_id)
+    except BaseException as e:
+        if job is not None and job.should_retry:
+            # RQ requeues it and the retry resumes from the checkpoint; keep the dedupe claim meanwhile
+            progress.requeued(e)
+            raise
+        if dedupe_on:
+            dedupe.release_inflight(redis, content_hash, preset, profile.key, owner_id)
+        _release_share(redis, progress)
+        progress.fail(e)
+        raise
+    if url is None:
+        progress.flush()
+        return None
+    if dedupe_on:
+        dedupe.record_audio(redis, content_hash, preset, profile.key, url, owner_id)
+        dedupe.release_inflight(redis, content_hash, preset, profile.key, owner_id)
+    _release_share(redis, progress)
+    progress.finish(url)
+    return url
+
+
+def _record_stages(redis: Redis, progress: ProgressPublisher, timer: metrics.StageTimer, owner_id: Optional[str]) -> None:
+    """Add this run's stage timings to the job's totals and copy them into its meta."""
+    if owner_id is None:
+        return
+    try:
+        timer.flush(redis, owner_id)
+        stats = metrics.job_stats(redis, owner_id) or {}
+        progress.update(stages=stats.get("stages"), upstream=stats.get("upstream"))
+        metrics.flush(redis)
+    except Exception as e:
+        logger.warning("[TTS] Could not record stage timings for %s: %s", owner_id, e)
+
+
+def _release_share(redis: Redis, progress: ProgressPublisher) -> None:
+    # The submitter's fair-share slot; progress.job is the parent for finalize jobs too
+    if progress.job is None:
+        return
+    try:
+        scheduler.release(redis, progress.job.meta.get("submitter"), progress.job.id)
+    except Exception as e:
+        logger.warning("[TTS] Could not release fair-share slot for %s: %s", progress.job.id, e)
+
+
+def _synthesize_stream(
+    progress: ProgressPublisher,
+    redis: Optional[Redis],
+    chunks: Iterator[str],
+    preset: str,
+    segmented: bool,
+    publisher,
+    manifest: Optional[Manifest] = None,
+    first_index: int = 1,
+    workdir: Optional[str] = None,
+    profile: Optional[OutputProfile] = None,
+) -> List[str]:
+    """Parse/split → synthesize pipeline; returns segment paths in document order.
+
+    A producer thread pulls chunks from the (lazy) parse/split stream and submits them to the
+    synthesis pool; a semaphore caps chunks in flight so parsing can't run arbitrarily far ahead.
+    Completions are handled here, on the job's thread, in whatever order they finish. With a
+    manifest, chunks already checkpointed by an earlier attempt are restored instead of synthesized.
+    """
+    concurrency = max(1, settings.tts_concurrency)
+    in_flight = threading.Semaphore(concurrency + settings.pipeline_prefetch)
+    completed: "queue.Queue[tuple]" = queue.Queue()
+    abort = threading.Event()
+    # Pool threads report their stages to the job's timer
+    produce_segment = metrics.in_context(metrics.current(), _resume_or_produce)
+
+    def produce(pool: ThreadPoolExecutor) -> None:
+        discovered = 0
+        try:
+            for idx, chunk in enumerate(chunks, start=first_index):
+                while not in_flight.acquire(timeout=0.5):
+                    if abort.is_set():
+                        return
+                if abort.is_set():
+                    return
+                fut = pool.submit(
+                    produce_segment, manifest, chunk, preset, idx, segmented, redis, workdir, profile, abort
+                )
+                fut.add_done_callback(lambda f, idx=idx, n=len(chunk): completed.put(("done", idx, n, f)))
+                discovered += 1
+            completed.put(("eof", discovered, 0, None))
+        except BaseException as e:
+            completed.put(("error", 0, 0, e))
+
+    seg_paths: Dict[int, str] = {}
+    total: Optional[int] = None
+    done = hits = misses = resumed = 0
+    # Not a context manager: its exit would wait for in-flight upstream calls of a failing job
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="tts-chunk")
+    producer = threading.Thread(target=produce, args=(pool,), name="tts-split", daemon=True)
+    producer.start()
+    try:
+        while total is None or done < total:
+            kind, idx, nchars, payload = completed.get()
+            if kind == "eof":
+                total = idx
+                logger.info("[TTS] Document split into %d chunks", total)
+                progress.update(total_chunks=total)
+                continue
+            if kind == "error":
+                raise payload
+            path, hit, restored = payload.result()
+            in_flight.release()
+            seg_paths[idx] = path
+            if publisher:
+                publisher.add(idx, path, est_duration=nchars / 15.0)
+            done += 1
+            resumed += restored
+            if hit is not None:
+                hits += hit
+                misses += not hit
+            # Coalesced: at most one meta save + event per PROGRESS_INTERVAL
+            progress.update(
+                total_chunks=total, processed_chunks=done, cache_hits=hits, cache_misses=misses, resumed_chunks=resumed
+            )
+    except BaseException:
+        # Don't keep paying for chunks of a job that is going to fail anyway
+        abort.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()  # every chunk has completed; just releases the threads
+
+    progress.update(total_chunks=total)
+    progress.flush()
+    return [seg_paths[i] for i in sorted(seg_paths)]
+
+
+def _run_tts_job(
+    job,
+    progress: ProgressPublisher,
+    redis: Redis,
+    file_path: str,
+    filename: str,
+    preset: str,
+    profile: OutputProfile,
+    content_hash: Optional[str],
+    stream: bool,
+    bounds: Optional[tuple[int, int]] = None,
+    distributed: bool = False,
+    workdir: Optional[str] = None,
+) -> Optional[str]:
+    segmented = settings.assembly_mode == "segmented"
+    if stream and segmented and not profile.hls_segments:
+        # The API refuses these; a job queued before ASSEMBLY_MODE changed just isn't streamed
+        logger.warning("[TTS] %s segments can't be streamed over HLS; job runs without streaming", profile.format)
+        stream = False
+    manifest = Manifest.load(redis, job.id) if settings.checkpoints and job else None
+    if manifest and manifest.entries:
+        logger.info("[TTS] Resuming job %s: %d chunks checkpointed", job.id, len(manifest.entries))
+    if bounds is None:
+        # A resumed job keeps the chunking its checkpoints were made with, and a document parsed
+        # before keeps the bounds of its cached chunks (a preset-only change skips parsing)
+        bounds = (
+            (manifest.bounds if manifest else None)
+            or (dedupe.recorded_bounds(redis, content_hash) if settings.dedupe_enabled and content_hash else None)
+            or chunking.choose_bounds(redis, preset, "mock" if should_mock_tts() else "fal")
+        )
+    if manifest:
+        manifest.begin(bounds, preset, segmented)
+    min_chars, max_chars = bounds
+    logger.info("[TTS] Chunk size %d-%d chars (preset=%s)", min_chars, max_chars, preset)
+
+    chunks: Optional[Iterator[str]] = None
+    if settings.dedupe_enabled and content_hash:
+        cached = dedupe.load_chunks(redis, content_hash, bounds)
+        if cached:
+            logger.info("[TTS] Reusing %d parsed chunks for document %s", len(cached), content_hash[:12])
+            chunks = iter(cached)
+    if chunks is None:
+        # Lazy: pages are parsed and split only as fast as synthesis consumes chunks
+        blocks = metrics.iterate("parse", iter_file(file_path))
+        chunks = metrics.iterate("split", split_stream(blocks, min_chars, max_chars), exclude="parse")
+        if settings.dedupe_enabled and content_hash:
+            chunks = dedupe.record_chunks(redis, content_hash, bounds, chunks)
+
+    # Progress meta
+    progress.update(total_chunks=None, processed_chunks=0, stream=stream, chunk_bounds=[min_chars, max_chars])
+    if distributed and job:
+        if stream or not manifest:
+            # Parts publish out of order and hand segments over through checkpoints
+            logger.warning("[TTS] Distributed mode needs CHECKPOINTS and no streaming; running %s on one worker", job.id)
         else:
-            logger.info("[TTS] Generating chunk %d/%d via VibeVoice (preset=%s)", idx, len(chunks), preset)
-            try:
-                url = call_vibevoice(script, preset=preset)
-            except UnsupportedPresetError:
-                if preset != settings.fallback_preset:
-                    logger.warning("[TTS] Preset '%s' not allowed. Falling back to '%s' (chunk %d)", preset, settings.fallback_preset, idx)
-                    url = call_vibevoice(script, preset=settings.fallback_preset)
-                else:
-                    raise
-            except requests.HTTPError as e:
-                # If preset seems unsupported (400/422), try fallback to configured fallback preset
-                code = getattr(getattr(e, 'response', None), 'status_code', None)
-                if code in {400, 422} and preset != settings.fallback_preset:
-                    logger.warning(
-                        "[TTS] Preset '%s' failed with %s. Falling back to '%s' for this chunk.",
-                        preset,
-                        code,
-                        settings.fallback_preset,
-                    )
-                    url = call_vibevoice(script, preset=settings.fallback_preset)
-                else:
-                    raise
-            except requests.RequestException as e:
-                # Network/timeout after retries — try fallback once if not already fallback preset
-                if preset != settings.fallback_preset:
-                    logger.warning("[TTS] Network error for preset '%s': %s. Trying fallback '%s'", preset, e, settings.fallback_preset)
-                    url = call_vibevoice(script, preset=settings.fallback_preset)
-                else:
-                    raise
-            seg_paths.append(download_audio(url))
-
-        if job:
-            job.meta["processed_chunks"] = idx
-            job.save_meta()
-
-    # Concatenate + normalize
-    os.makedirs(settings.tmp_dir, exist_ok=True)
-    out_basename = f"{os.path.splitext(filename)[0]}-{uuid.uuid4().hex[:8]}.mp3"
-    out_path = os.path.join(settings.tmp_dir, out_basename)
-    final_path = concat_and_normalize(seg_paths, out_path)
-
-    # Upload to storage
-    return save_and_get_url(final_path, out_basename)
-
-
-def enqueue_tts_job(file_path: str, filename: str, preset: str = "Frank [EN]"):
-    redis = Redis.from_url(settings.redis_url)
-    q = Queue(settings.queue_name, connection=redis)
-    job = q.enqueue(
-        process_tts_job,
+            head = list(itertools.islice(chunks, settings.distributed_batch_chunks + 1))
+            if len(head) > settings.distributed_batch_chunks:
+                rest = itertools.chain(head, chunks)
+                _fan_out(job, progress, redis, rest, file_path, filename, preset, profile, content_hash, segmented)
+                return None
+            # Fits in one part: not worth the extra jobs
+            chunks = iter(head)
+    publisher = SegmentPublisher(job.id, redis, resume=bool(manifest and manifest.entries)) if stream and job else None
+
+    try:
+        seg_paths = _synthesize_stream(
+            progress, redis, chunks, preset, segmented, publisher, manifest, workdir=workdir, profile=profile
+        )
+    except BaseException:
+        if manifest:
+            manifest.persist()
+        raise
+    if not seg_paths:
+        raise ValueError("Document contains no extractable text")
+
+    url = _assemble(seg_paths, filename, segmented, profile, workdir)
+    if manifest:
+        manifest.clear()
+    progress.update(http_pool=pool_stats())
+    if publisher:
+        publisher.finish()
+    return url
+
+
+def _assemble(
+    seg_paths: List[str], filename: str, segmented: bool, profile: OutputProfile, workdir: Optional[str] = None
+) -> str:
+    """Concatenate (+ normalize) segments in order, encode with the output profile and store the result; returns its URL."""
+    workdir = workdir or settings.tmp_dir
+    os.makedirs(workdir, exist_ok=True)
+    out_basename = f"{os.path.splitext(filename)[0]}-{uuid.uuid4().hex[:8]}{profile.ext}"
+    out_path = os.path.join(workdir, out_basename)
+    with metrics.stage("assemble"):
+        if segmented:
+            # Segments are already normalized and encoded; just stitch them together
+            final_path = concat_segments(seg_paths, out_path, profile)
+        else:
+            final_path = concat_and_normalize(seg_paths, out_path, profile)
+    with metrics.stage("upload") as info:
+        info["bytes"] = os.path.getsize(final_path)
+        return save_and_get_url(final_path, out_basename, move=True)
+
+
+def _retry() -> Optional[Retry]:
+    # Each retry resumes from the job's checkpoint rather than starting over
+    if settings.tts_job_retries <= 0:
+        return None
+    return Retry(max=settings.tts_job_retries, interval=settings.tts_job_retry_interval)
+
+
+def _fan_out(
+    job,
+    progress: ProgressPublisher,
+    redis: Redis,
+    chunks: Iterator[str],
+    file_path: str,
+    filename: str,
+    preset: str,
+    profile: OutputProfile,
+    content_hash: Optional[str],
+    segmented: bool,
+) -> None:
+    """Enqueue part jobs as batches of chunks come off the splitter, then the finalize job.
+
+    Chunk texts go to Redis so parts don't re-parse the document; parts record their segments
+    in this job's checkpoint manifest, which is where the finalize job collects them.
+    """
+    q = Queue(job.origin, connection=redis)
+    final_id = fanout.finalize_job_id(job.id)
+    fanout.reset(redis, job.id)
+    # Before any part exists, so status reads switch to the aggregate straight away
+    progress.update(distributed=True, finalize_job_id=final_id)
+    progress.flush()
+
+    part_ids: List[str] = []
+    first = 1
+    for part, batch in enumerate(fanout.iter_batches(chunks, settings.distributed_batch_chunks), start=1):
+        fanout.push_chunks(redis, job.id, batch)
+        part_ids.append(
+            q.enqueue(
+                process_tts_part,
+                job.id,
+                first,
+                len(batch),
+                preset,
+                segmented,
+                profile.to_dict(),
+                job_id=fanout.part_job_id(job.id, part),
+                job_timeout=settings.tts_job_timeout,
+                retry=_retry(),
+                meta={"parent": job.id},
+            ).id
+        )
+        first += len(batch)
+    total = first - 1
+    fanout.set_plan(redis, job.id, total_chunks=total, parts=len(part_ids))
+    fanout.PartProgress(redis, job.id).flush(force=True)
+    # allow_failure: finalize also runs after a part gave up, and synthesizes what that part left undone
+    q.enqueue(
+        finalize_tts_job,
+        job.id,
         file_path,
         filename,
         preset,
+        content_hash,
+        segmented,
+        profile.to_dict(),
+        job_id=final_id,
         job_timeout=settings.tts_job_timeout,
+        retry=_retry(),
+        depends_on=Dependency(jobs=part_ids, allow_failure=True),
+        meta={"parent": job.id},
+    )
+    logger.info("[TTS] Job %s: %d chunks across %d part jobs", job.id, total, len(part_ids))
+
+
+def process_tts_part(
+    parent_id: str, first: int, count: int, preset: str, segmented: bool, output: Optional[dict] = None
+) -> int:
+    """Synthesize chunks first..first+count-1 of a distributed job into its checkpoint manifest."""
+    job = get_current_job()
+    redis = job.connection if job else redis_client()
+    manifest = Manifest.load(redis, parent_id)
+    chunks = fanout.load_chunks(redis, parent_id, first, count)
+    progress = fanout.PartProgress(redis, parent_id)
+    timer = metrics.StageTimer()
+    # The finalize job reads the checkpoints; the local copies go with the workspace
+    with metrics.bound(timer), workspace.job_workspace(job.id if job else fanout.part_job_id(parent_id, first), redis) as workdir:
+        try:
+            seg_paths = _synthesize_stream(
+                progress, redis, iter(chunks), preset, segmented, None, manifest, first, workdir, from_dict(output)
+            )
+        except BaseException:
+            manifest.persist()
+            raise
+        finally:
+            # Parts add to the parent's totals; the finalize job copies them into its meta
+            try:
+                timer.flush(redis, parent_id)
+                metrics.flush(redis)
+            except Exception as e:
+                logger.warning("[TTS] Could not record stage timings for %s: %s", parent_id, e)
+    return len(seg_paths)
+
+
+def finalize_tts_job(
+    parent_id: str,
+    file_path: str,
+    filename: str,
+    preset: str,
+    content_hash: Optional[str],
+    segmented: bool,
+    output: Optional[dict] = None,
+) -> Optional[str]:
+    """Assemble a distributed job from its checkpoints and settle it under the parent job id."""
+    job = get_current_job()
+    redis = job.connection if job else redis_client()
+    parent = Job.fetch(parent_id, connection=redis)
+    progress = ProgressPublisher(parent, redis, started_at=timestamp(parent.started_at))
+    profile = from_dict(output)
+
+    def run() -> str:
+        manifest = Manifest.load(redis, parent_id)
+        chunks = fanout.load_chunks(redis, parent_id)
+        missing = sum(1 for i, c in enumerate(chunks, start=1) if not manifest.completed(i, chunk_hash(c, preset, segmented, profile.key)))
+        if missing:
+            # A part failed for good (or lost a checkpoint): its chunks are synthesized here
+            logger.warning("[TTS] Job %s: %d chunks missing after the part jobs; synthesizing them now", parent_id, missing)
+        quiet = fanout.PartProgress(redis, parent_id, report=False)
+        workspace.wait_for_room(redis, workspace.estimated_bytes(parent.meta))
+        with workspace.job_workspace(job.id if job else fanout.finalize_job_id(parent_id), redis) as workdir:
+            seg_paths = _synthesize_stream(
+                quiet, redis, iter(chunks), preset, segmented, None, manifest, workdir=workdir, profile=profile
+            )
+            if not seg_paths:
+                raise ValueError("Document contains no extractable text")
+            url = _assemble(seg_paths, filename, segmented, profile, workdir)
+        fanout.clear(redis, parent_id, len(chunks))
+        manifest.clear()
+        workspace.discard_upload(file_path, redis)
+        progress.update(total_chunks=len(chunks), processed_chunks=len(chunks), http_pool=pool_stats())
+        return url
+
+    return _settle(job, progress, redis, preset, profile, content_hash, parent_id, run)
+
+
+def enqueue_tts_job(
+    file_path: str,
+    filename: str,
+    preset: str = "Frank [EN]",
+    content_hash: Optional[str] = None,
+    job_id: Optional[str] = None,
+    stream: bool = False,
+    min_chars: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    distributed: Optional[bool] = None,
+    submitter: Optional[str] = None,
+    profile: Optional[OutputProfile] = None,
+):
+    redis = redis_client()
+    profile = profile or from_dict(None)
+    # Cost estimate → lane and timeout; part/finalize jobs of a distributed job follow it to the lane
+    est = scheduler.estimate(redis, file_path, preset, "mock" if should_mock_tts() else "fal", max_chars)
+    lane = scheduler.choose_lane(redis, est, submitter)
+    timeout = scheduler.job_timeout(est)
+    q = Queue(scheduler.lane_queue(lane), connection=redis)
+    # Index first: a fast worker could otherwise mark the job started before it is listed as queued
+    job_id = job_id or str(uuid.uuid4())
+    created_at = time.time()
+    jobindex.add(redis, job_id, filename, preset, created_at)
+    scheduler.track(redis, submitter, job_id, timeout)
+    distributed = settings.distributed if distributed is None else distributed
+    logger.info(
+        "[TTS] Job %s: ~%d chunks, ~%.0fs -> %s lane, timeout %ds", job_id, est["chunks"], est["seconds"], lane, timeout
     )
+    try:
+        job = q.enqueue(
+            process_tts_job,
+            file_path,
+            filename,
+            preset,
+            content_hash=content_hash,
+            stream=stream,
+            min_chars=min_chars,
+            max_chars=max_chars,
+            distributed=distributed,
+            output=profile.to_dict(),
+            job_id=job_id,
+            job_timeout=timeout,
+            retry=_retry(),
+            meta={
+                "content_hash": content_hash,
+                "stream": stream,
+                "created_at": created_at,
+                "submitter": submitter,
+                "lane": lane,
+                "estimate": est,
+                "output": profile.to_dict(),
+            },
+        )
+    except Exception as e:
+        scheduler.release(redis, submitter, job_id)
+        jobindex.set_status(redis, job_id, "failed", created_at, error=f"Enqueue failed: {e}")
+        raise
     return job
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import os
+import time
+import shutil
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from redis import Redis
+from rq.job import Job
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# TMP_DIR layout: uploads/ holds API uploads until their job is done, jobs/<job_id>/ is one
+# job's scratch space (segments, normalized copies, the pre-upload output) and is removed when
+# the job ends however it ends. The sweeper removes what crashed processes leave behind.
+UPLOADS = "uploads"
+JOBS = "jobs"
+STATS_PREFIX = "tts:workspace"
+_ACTIVE = {"queued", "started", "deferred", "scheduled"}
+# For the scratch-space estimate: speech rate and raw segment bitrate (24 kHz 16-bit mono WAV)
+_CHARS_PER_SECOND = 15.0
+_AUDIO_BYTES_PER_SECOND = 48_000
+
+
+class DiskFullError(RuntimeError):
+    """Not enough free space on TMP_DIR's volume to start a job within DISK_WAIT_MAX."""
+
+
+def uploads_dir() -> str:
+    return os.path.join(settings.tmp_dir, UPLOADS)
+
+
+def upload_name(job_id: str, filename: str) -> str:
+    """Upload file name; carries the job id so the sweeper can tell whether a job still needs it."""
+    return f"upload-{job_id}{os.path.splitext(filename)[1]}"
+
+
+def _upload_job_id(name: str) -> str:
+    return os.path.splitext(name[len("upload-") :])[0]
+
+
+def job_dir(job_id: str) -> str:
+    return os.path.join(settings.tmp_dir, JOBS, job_id)
+
+
+def _stats_key() -> str:
+    # Per host: every node has its own TMP_DIR
+    return f"{STATS_PREFIX}:{socket.gethostname()}"
+
+
+def _size(path: str) -> tuple[int, int]:
+    """(bytes, files) under path, not following symlinks."""
+    if os.path.isfile(path):
+        return os.path.getsize(path), 1
+    total = files = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+                files += 1
+            except OSError:
+                pass
+    return total, files
+
+
+def _remove(path: str) -> tuple[int, int]:
+    size = _size(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return 0, 0
+    return size
+
+
+def _account(redis: Optional[Redis], kind: str, reclaimed: tuple[int, int], **gauges) -> None:
+    if redis is None:
+        return
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.hincrby(_stats_key(), f"{kind}_bytes", reclaimed[0])
+        pipe.hincrby(_stats_key(), f"{kind}_files", reclaimed[1])
+        if gauges:
+            pipe.hset(_stats_key(), mapping=gauges)
+        pipe.execute()
+    except Exception as e:
+        logger.debug("[Workspace] Could not record stats: %s", e)
+
+
+@contextmanager
+def job_workspace(job_id: str, redis: Optional[Redis] = None) -> Iterator[str]:
+    """Scratch directory for one job, removed on success, failure and timeout alike."""
+    path = job_dir(job_id)
+    os.makedirs(path, exist_ok=True)
+    try:
+        yield path
+    finally:
+        # RQ's timeout is an exception raised in the job, so this also runs then
+        _account(redis, "cleanup", _remove(path))
+
+
+def discard_upload(file_path: str, redis: Optional[Redis] = None) -> None:
+    """Drop a finished job's upload; failed jobs keep theirs for a resume until the sweeper expires it."""
+    if os.path.realpath(file_path).startswith(os.path.realpath(settings.tmp_dir) + os.sep):
+        _account(redis, "cleanup", _remove(file_path))
+
+
+def disk_status(path: Optional[str] = None) -> dict:
+    usage = shutil.disk_usage(path or settings.tmp_dir)
+    return {"total": usage.total, "used": usage.used, "free": usage.free}
+
+
+def has_room(needed: int = 0) -> bool:
+    return disk_status()["free"] - needed >= settings.disk_min_free_bytes
+
+
+def wait_for_room(redis: Optional[Redis], needed: int = 0) -> None:
+    """Hold a job back while TMP_DIR's volume is below DISK_MIN_FREE_BYTES (+ what the job needs).
+
+    Sweeps first; then waits for running jobs to finish and free space, up to DISK_WAIT_MAX.
+    """
+    if has_room(needed):
+        return
+    sweep(redis)
+    deadline = time.monotonic() + settings.disk_wait_max
+    while not has_room(needed):
+        if time.monotonic() >= deadline:
+            free = disk_status()["free"]
+            raise DiskFullError(f"{free} bytes free on {settings.tmp_dir}; need {settings.disk_min_free_bytes + needed}")
+        logger.warning("[Workspace] Low disk space on %s; delaying job start", settings.tmp_dir)
+        time.sleep(min(5.0, max(0.0, deadline - time.monotonic())))
+
+
+def estimated_bytes(meta: dict) -> int:
+    """Scratch space a job needs: its audio roughly three times over (raw, normalized, final)."""
+    chars = (meta.get("estimate") or {}).get("chars") or 0
+    return int(chars / _CHARS_PER_SECOND * _AUDIO_BYTES_PER_SECOND * 3)
+
+
+def _older_than(path: str, seconds: float, now: float) -> bool:
+    try:
+        return now - os.lstat(path).st_mtime > seconds
+    except FileNotFoundError:
+        return False
+
+
+def sweep(redis: Optional[Redis] = None) -> dict:
+    """Remove orphans: workspaces of jobs no longer running, stale uploads and pre-workspace files,
+    and (local backend) expired stream segments and checkpoints. Returns what was reclaimed."""
+    now = time.time()
+    grace = settings.sweep_grace
+    reclaimed = [0, 0]
+
+    def drop(path: str) -> None:
+        size, files = _remove(path)
+        reclaimed[0] += size
+        reclaimed[1] += files
+
+    jobs_root = os.path.join(settings.tmp_dir, JOBS)
+    if os.path.isdir(jobs_root):
+        candidates = [n for n in os.listdir(jobs_root) if _older_than(os.path.join(jobs_root, n), grace, now)]
+        statuses = _statuses(redis, candidates)
+        for name in candidates:
+            path = os.path.join(jobs_root, name)
+            # Unknown status (no Redis) only counts once the workspace is older than any job can run
+            status = statuses.get(name)
+            if status in _ACTIVE or (status is None and not _older_than(path, settings.job_timeout_max, now)):
+                continue
+            drop(path)
+
+    expired_uploads = []
+    for root, max_age in ((uploads_dir(), settings.upload_retention), (settings.tmp_dir, grace)):
+        if not os.path.isdir(root):
+            continue
+        for entry in os.scandir(root):
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            # Loose files in TMP_DIR itself predate workspaces (or are uploads from older API versions)
+            if entry.name.startswith("upload-"):
+                if _older_than(entry.path, settings.upload_retention, now):
+                    expired_uploads.append(entry)
+            elif _older_than(entry.path, max_age, now):
+                drop(entry.path)
+    # A job can wait in a low lane for longer than UPLOAD_RETENTION; its upload stays until it has run
+    statuses = _statuses(redis, [_upload_job_id(e.name) for e in expired_uploads])
+    for entry in expired_uploads:
+        if statuses.get(_upload_job_id(entry.name)) not in _ACTIVE:
+            drop(entry.path)
+
+    if settings.storage_backend == "local":
+        for root, max_age in (
+            (os.path.join(settings.storage_dir, "streams"), settings.stream_ttl),
+            (settings.checkpoint_dir, settings.checkpoint_ttl),
+        ):
+            if os.path.isdir(root):
+                for entry in os.scandir(root):
+                    if _older_than(entry.path, max_age, now):
+                        drop(entry.path)
+
+    tmp_bytes, tmp_files = _size(settings.tmp_dir)
+    _account(redis, "swept", tuple(reclaimed), tmp_bytes=tmp_bytes, tmp_files=tmp_files, last_sweep=now)
+    if reclaimed[1]:
+        logger.info("[Workspace] Sweep reclaimed %d bytes in %d files", reclaimed[0], reclaimed[1])
+    return {"reclaimed_bytes": reclaimed[0], "reclaimed_files": reclaimed[1], "tmp_bytes": tmp_bytes}
+
+
+def _statuses(redis: Optional[Redis], job_ids: list[str]) -> dict[str, Optional[str]]:
+    if redis is None or not job_ids:
+        return {}
+    try:
+        jobs = Job.fetch_many(job_ids, connection=redis)
+    except Exception as e:
+        logger.warning("[Workspace] Could not look up jobs for sweep: %s", e)
+        return {}
+    # A workspace whose job is gone from Redis is an orphan
+    return {j: (job.get_status(refresh=False) if job else "gone") for j, job in zip(job_ids, jobs)}
+
+
+def maybe_sweep(redis: Redis) -> bool:
+    """Sweep at most once per SWEEP_INTERVAL per host, whichever process gets there first."""
+    if settings.sweep_interval <= 0:
+        return False
+    try:
+        if not redis.set(f"{_stats_key()}:lock", 1, nx=True, ex=settings.sweep_interval):
+            return False
+    except Exception:
+        return False
+    try:
+        sweep(redis)
+    except Exception as e:
+        logger.warning("[Workspace] Sweep failed: %s", e)
+    return True
+
+
+def sweep_in_background(redis: Redis) -> None:
+    threading.Thread(target=maybe_sweep, args=(redis,), name="tmp-sweep", daemon=True).start()
+
+
+def stats(redis: Redis) -> dict:
+    raw = {k.decode(): float(v) for k, v in redis.hgetall(_stats_key()).items()}
+    return {"host": socket.gethostname(), "disk": disk_status(), **raw}
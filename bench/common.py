@@ -0,0 +1,92 @@
+"""Shared helpers for the benchmark suites: timing stats, environment capture, result files."""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import math
+import time
+import platform
+import resource
+import subprocess
+from typing import Iterable, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+
+
+def percentile(values: Iterable[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for no data."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples: List[float]) -> dict:
+    return {
+        "n": len(samples),
+        "min": min(samples) if samples else None,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples) if samples else None,
+    }
+
+
+def time_call(fn, repeat: int, warmup: int = 1) -> List[float]:
+    """Wall-clock seconds of repeat calls of fn after warmup unmeasured ones."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def peak_rss(children: bool = False) -> int:
+    """Peak resident set size in bytes of this process (or of its reaped children)."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        out = subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() if out.returncode == 0 else None
+
+
+def environment() -> dict:
+    """What a result was measured on; compare only results from like environments."""
+    ffmpeg_version = None
+    try:
+        out = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True, timeout=10)
+        ffmpeg_version = out.stdout.split("\n", 1)[0]
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "ffmpeg": ffmpeg_version,
+    }
+
+
+def write_result(suite: str, data: dict, path: Optional[str] = None) -> str:
+    """Write {"suite", "created_at", "env", ...data} to bench/results/<suite>-<time>-<commit>.json."""
+    env = environment()
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        path = os.path.join(RESULTS_DIR, f"{suite}-{stamp}-{(env['commit'] or 'nogit')[:8]}.json")
+    with open(path, "w") as f:
+        json.dump({"suite": suite, "created_at": time.time(), "env": env, **data}, f, indent=2, sort_keys=True)
+    return path
@@ -0,0 +1,87 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python -m bench.compare bench/results/micro-...-abc123.json bench/results/micro-...-def456.json
+    python -m bench.compare BASE NEW --threshold 0.15
+
+Micro results are compared case by case on p50 seconds; e2e results on throughput, job latency,
+time to first audio and peak RSS. A metric more than --threshold worse than BASE is a regression
+and makes the exit status 1, so this can gate a CI job.
+"""
+from __future__ import annotations
+
+import sys
+import json
+import argparse
+from typing import Iterator, Optional, Tuple
+
+# (label, path into the result, higher is better)
+E2E_METRICS = (
+    ("chunks/s", ("chunks_per_s",), True),
+    ("job latency p50", ("job_latency_s", "p50"), False),
+    ("job latency p95", ("job_latency_s", "p95"), False),
+    ("job latency p99", ("job_latency_s", "p99"), False),
+    ("first audio p50", ("time_to_first_audio_s", "p50"), False),
+    ("first audio p95", ("time_to_first_audio_s", "p95"), False),
+    ("peak RSS api", ("peak_rss_bytes", "api"), False),
+    ("peak RSS workers", ("peak_rss_bytes", "workers"), False),
+)
+# Environment fields that make timings incomparable when they differ
+_ENV_KEYS = ("cpus", "python", "platform", "ffmpeg")
+
+
+def _get(data: dict, path: Tuple[str, ...]) -> Optional[float]:
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data if isinstance(data, (int, float)) else None
+
+
+def _metrics(base: dict, new: dict) -> Iterator[Tuple[str, Optional[float], Optional[float], bool]]:
+    if base["suite"] == "micro":
+        for name in sorted(set(base["cases"]) | set(new["cases"])):
+            yield name, _get(base["cases"], (name, "p50")), _get(new["cases"], (name, "p50")), False
+    else:
+        for label, path, higher_better in E2E_METRICS:
+            yield label, _get(base, path), _get(new, path), higher_better
+
+
+def compare(base: dict, new: dict, threshold: float) -> int:
+    if base["suite"] != new["suite"]:
+        sys.exit(f"Cannot compare a {base['suite']} result with a {new['suite']} result")
+    for key in _ENV_KEYS:
+        if base["env"].get(key) != new["env"].get(key):
+            print(f"warning: {key} differs ({base['env'].get(key)} vs {new['env'].get(key)})")
+    if base.get("params") != new.get("params"):
+        print("warning: benchmark parameters differ")
+    print(f"base {(base['env'].get('commit') or '?')[:10]}  new {(new['env'].get('commit') or '?')[:10]}")
+
+    regressions = 0
+    for name, old, cur, higher_better in _metrics(base, new):
+        if old is None or cur is None or old == 0:
+            print(f"  {name:<40} {'-' if old is None else f'{old:.4g}':>12} {'-' if cur is None else f'{cur:.4g}':>12}")
+            continue
+        change = (cur - old) / old
+        worse = -change if higher_better else change
+        mark = "REGRESSION" if worse > threshold else ("improved" if worse < -threshold else "")
+        regressions += worse > threshold
+        print(f"  {name:<40} {old:>12.4g} {cur:>12.4g} {change:+8.1%}  {mark}")
+    print(f"{regressions} regression(s) beyond {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts (default 0.10)")
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    sys.exit(compare(base, new, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Deterministic benchmark documents (.txt, .docx, .pdf), generated on first use and cached.
+
+The text is seeded pseudo-prose with realistic sentence and paragraph lengths, abbreviations
+and the odd overlong sentence, so splitter and parser timings are stable across machines.
+"""
+from __future__ import annotations
+
+import os
+import random
+from typing import List
+
+from .common import ROOT
+
+CORPUS_DIR = os.path.join(ROOT, "bench", ".corpus")
+# Bump when generation changes so cached fixtures are rebuilt and old results aren't compared blindly
+VERSION = 1
+
+_WORDS = (
+    "the of and to in is that for it as was with be by on not he this are or his from at which but have an "
+    "they you were her she there been one all we their has would when if so no what can more out time up "
+    "about into them only some could other new then these two may first any like now my such make over our "
+    "even most after also made many before must through back years where much your way well down should "
+    "because each just those people how too little state good very world still own see men work long get "
+    "here between both life being under never day same another know while last might us great old year off "
+    "come since against go came right used take three himself few house use during without again place "
+    "American around however home small found thought went say part once general high upon school every "
+    "does got united left number course war until always away something fact though water less public put "
+    "synthesis document chapter narrative evidence hypothesis framework analysis interpretation"
+).split()
+_ABBREVIATIONS = ("Dr.", "Mr.", "e.g.", "i.e.", "U.S.", "etc.", "No.", "Fig.")
+
+
+def _sentence(rng: random.Random) -> str:
+    n = max(3, int(rng.gauss(18, 8)))
+    if rng.random() < 0.01:
+        # Run-on sentences exercise the clause/word fallback of the splitter
+        n = rng.randint(150, 300)
+    words = [rng.choice(_WORDS) for _ in range(n)]
+    if rng.random() < 0.1:
+        words.insert(rng.randrange(len(words)), rng.choice(_ABBREVIATIONS))
+    if n > 12 and rng.random() < 0.4:
+        words[rng.randrange(3, n - 3)] += rng.choice((",", ";", ":"))
+    text = " ".join(words)
+    return text[0].upper() + text[1:] + rng.choice(".....?!")
+
+
+def paragraphs(chars: int, seed: int = 0) -> List[str]:
+    """Paragraphs of 2-9 sentences totalling about chars characters."""
+    rng = random.Random(seed)
+    out: List[str] = []
+    total = 0
+    while total < chars:
+        para = " ".join(_sentence(rng) for _ in range(rng.randint(2, 9)))
+        out.append(para)
+        total += len(para) + 2
+    return out
+
+
+def text(chars: int, seed: int = 0) -> str:
+    return "\n\n".join(paragraphs(chars, seed))
+
+
+def _path(name: str, chars: int, seed: int, ext: str) -> str:
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    return os.path.join(CORPUS_DIR, f"v{VERSION}-{name}-{chars}-{seed}{ext}")
+
+
+def txt_file(chars: int, seed: int = 0) -> str:
+    path = _path("text", chars, seed, ".txt")
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text(chars, seed))
+    return path
+
+
+def docx_file(chars: int, seed: int = 0) -> str:
+    path = _path("text", chars, seed, ".docx")
+    if not os.path.exists(path):
+        from docx import Document
+
+        doc = Document()
+        for para in paragraphs(chars, seed):
+            doc.add_paragraph(para)
+        doc.save(path)
+    return path
+
+
+def pdf_file(chars: int, seed: int = 0, chars_per_page: int = 1800) -> str:
+    path = _path("text", chars, seed, ".pdf")
+    if not os.path.exists(path):
+        _write_pdf(path, _pages(paragraphs(chars, seed), chars_per_page))
+    return path
+
+
+def _pages(paras: List[str], chars_per_page: int, width: int = 90) -> List[List[str]]:
+    """Wrap paragraphs into lines and lines into pages of about chars_per_page characters."""
+    lines: List[str] = []
+    for para in paras:
+        line = ""
+        for word in para.split():
+            if len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.extend([line, ""])
+    per_page = max(1, chars_per_page // width)
+    return [lines[i : i + per_page] for i in range(0, len(lines), per_page)]
+
+
+def _write_pdf(path: str, pages: List[List[str]]) -> None:
+    """Minimal text-only PDF (Helvetica, one content stream per page); enough for pypdf extraction."""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 1 + 2 * len(pages)
+    page_ids = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 760 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", errors="replace")
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(
+            add(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content, font)
+            )
+        )
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    tmp = f"{path}.part"
+    with open(tmp, "wb") as f:
+        f.write(out)
+    os.replace(tmp, path)
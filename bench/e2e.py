@@ -0,0 +1,285 @@
+"""End-to-end benchmark: API + RQ workers + the real HTTP path against a local fake VibeVoice.
+
+    python -m bench.e2e --jobs 20 --chars 20000 --workers 2 --latency lognormal:1.0:0.4 --per-char 0.002
+
+Starts bench.fake_fal, points FAL_URL at it (MOCK_TTS off), serves app.main with uvicorn on a
+free port, starts worker processes and submits --jobs documents through POST /tts. Reports
+chunks/s, job latency percentiles (submit -> finished), time to first audio (submit -> first
+chunk synthesized) and peak RSS of the API and worker processes, and writes a result file to
+bench/results/ (see bench.compare).
+
+Needs Redis; by default a dedicated database (redis://localhost:6379/15). --flush empties it
+first so limiter and chunk-size stats from earlier runs don't skew the result. --fakeredis runs
+without a server: one in-process worker, started once every job is queued.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List
+
+from . import corpus
+from .common import ROOT, peak_rss, summarize, write_result
+from .fake_fal import FakeVibeVoice, add_profile_args, profile_from_args
+
+TERMINAL = {"finished", "failed"}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _configure(args: argparse.Namespace, fal_url: str, workdir: str) -> None:
+    """Environment for the API and workers; must run before anything under app/ is imported."""
+    env = {
+        "FAL_URL": fal_url,
+        "FAL_KEY": "bench",
+        "MOCK_TTS": "false",
+        "REDIS_URL": args.redis,
+        "QUEUE_NAME": "bench",
+        "TMP_DIR": os.path.join(workdir, "tmp"),
+        "STORAGE_BACKEND": "local",
+        "STORAGE_DIR": os.path.join(workdir, "storage"),
+        "CHECKPOINT_DIR": os.path.join(workdir, "checkpoints"),
+        "SEGMENT_CACHE_DIR": os.path.join(workdir, "segments"),
+        # Every job does the full work, with the same chunking on every run
+        "SEGMENT_CACHE": "off",
+        "DEDUPE_ENABLED": "false",
+        "CHUNK_ADAPTIVE": "false",
+        # Progress events are the time-to-first-audio probe; don't coalesce them
+        "PROGRESS_INTERVAL": "0",
+        "SWEEP_INTERVAL": "0",
+        "DISK_MIN_FREE_BYTES": "0",
+    }
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    os.environ.update(env)
+
+
+def _patch_fakeredis() -> None:
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("--fakeredis needs the fakeredis package (pip install fakeredis)")
+    import redis
+    import redis.asyncio
+
+    server = fakeredis.FakeServer()
+    redis.Redis.from_url = classmethod(lambda cls, *a, **k: fakeredis.FakeRedis(server=server))
+    redis.asyncio.Redis.from_url = classmethod(lambda cls, *a, **k: fakeredis.FakeAsyncRedis(server=server))
+
+
+class FirstAudio:
+    """Listens to job progress events and notes when each job's first chunk was synthesized."""
+
+    def __init__(self, redis):
+        self.first: Dict[str, float] = {}
+        self._pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe("tts:events:*")
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bench-events", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            msg = self._pubsub.get_message(timeout=0.2)
+            if not msg or msg["type"] != "pmessage":
+                continue
+            job_id = msg["channel"].decode().rsplit(":", 1)[1]
+            if job_id in self.first:
+                continue
+            event = json.loads(msg["data"])
+            if (event.get("processed_chunks") or 0) >= 1 or event.get("status") == "finished":
+                self.first[job_id] = time.time()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self._pubsub.close()
+
+
+def _start_api(port: int):
+    import uvicorn
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-api", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 15
+    while not server.started:
+        if time.monotonic() > deadline:
+            sys.exit("API did not start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def _run_worker() -> None:
+    """Worker process entry point (--worker); same worker class as start_simple_worker.py."""
+    from redis import Redis
+    from rq import Queue, SimpleWorker
+
+    from app.config import settings
+    from app.scheduler import queue_names
+
+    # SIGTERM from the runner is RQ's warm shutdown
+    redis = Redis.from_url(settings.redis_url)
+    SimpleWorker([Queue(n, connection=redis) for n in queue_names()], connection=redis).work(logging_level="WARNING")
+
+
+def _documents(args: argparse.Namespace) -> List[str]:
+    if args.file:
+        return [args.file] * args.jobs
+    # A different document per job, so nothing is shared between jobs beyond what the pipeline shares
+    return [corpus.txt_file(args.chars, seed=i) for i in range(args.jobs)]
+
+
+def run(args: argparse.Namespace) -> dict:
+    fake = FakeVibeVoice(profile_from_args(args)).start()
+    workdir = tempfile.mkdtemp(prefix="tts-bench-")
+    _configure(args, fake.url, workdir)
+    if args.fakeredis:
+        _patch_fakeredis()
+        args.workers = 1
+
+    from app import jobindex
+    from app.clients import redis_client
+
+    redis = redis_client()
+    if args.flush:
+        redis.flushdb()
+    port = _free_port()
+    api, api_thread = _start_api(port)
+    probe = FirstAudio(redis)
+
+    workers: List[subprocess.Popen] = []
+    if not args.fakeredis:
+        for _ in range(args.workers):
+            cmd = [sys.executable, "-m", "bench.e2e", "--worker"]
+            workers.append(subprocess.Popen(cmd, cwd=ROOT, env=os.environ.copy()))
+
+    import requests
+
+    submitted: Dict[str, float] = {}
+    started = time.time()
+    for i, path in enumerate(_documents(args)):
+        with open(path, "rb") as f:
+            data = {"stream": "true" if args.stream else "false"}
+            r = requests.post(f"http://127.0.0.1:{port}/tts", files={"file": (os.path.basename(path), f)}, data=data)
+        r.raise_for_status()
+        submitted[r.json()["job_id"]] = time.time()
+        if args.interval and i + 1 < args.jobs:
+            time.sleep(args.interval)
+
+    if args.fakeredis:
+        from rq import Queue, SimpleWorker
+        from app.scheduler import queue_names
+
+        SimpleWorker([Queue(n, connection=redis) for n in queue_names()], connection=redis).work(
+            burst=True, logging_level="WARNING"
+        )
+
+    deadline = time.monotonic() + args.timeout
+    while True:
+        jobs = jobindex.get_many(redis, submitted)
+        if all(j and j["status"] in TERMINAL for j in jobs.values()):
+            break
+        if time.monotonic() > deadline:
+            print(f"Timed out after {args.timeout}s; reporting finished jobs only", file=sys.stderr)
+            break
+        time.sleep(0.2)
+    wall_end = time.time()
+
+    for w in workers:
+        w.send_signal(signal.SIGTERM)
+    for w in workers:
+        try:
+            w.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            w.kill()
+            w.wait()
+    probe.stop()
+    api.should_exit = True
+    api_thread.join(timeout=5)
+    upstream = fake.stats.snapshot()
+    fake.stop()
+
+    finished = {j: v for j, v in jobs.items() if v and v["status"] == "finished"}
+    latency = [v["ended_at"] - submitted[j] for j, v in finished.items()]
+    ttfa = [probe.first[j] - submitted[j] for j in finished if j in probe.first]
+    chunks = sum(v["total_chunks"] or 0 for v in finished.values())
+    last_end = max((v["ended_at"] for v in finished.values()), default=wall_end)
+    elapsed = max(1e-9, last_end - started)
+    return {
+        "params": {k: v for k, v in vars(args).items() if k not in {"worker", "output"}},
+        "jobs": {"submitted": len(submitted), "finished": len(finished), "failed": len(submitted) - len(finished)},
+        "chunks": chunks,
+        "elapsed_s": round(elapsed, 3),
+        "chunks_per_s": round(chunks / elapsed, 3),
+        "job_latency_s": summarize(latency),
+        "run_s": summarize([v["run_seconds"] for v in finished.values() if v.get("run_seconds") is not None]),
+        "time_to_first_audio_s": summarize(ttfa),
+        "peak_rss_bytes": {
+            # In --fakeredis mode the worker runs inside this process
+            "api": peak_rss(),
+            "workers": peak_rss(children=True) if workers else None,
+        },
+        "upstream": upstream,
+    }
+
+
+def _print(result: dict) -> None:
+    def fmt(stats: dict) -> str:
+        if not stats["n"]:
+            return "n/a"
+        return "p50 {p50:.2f}s  p95 {p95:.2f}s  p99 {p99:.2f}s  max {max:.2f}s".format(**stats)
+
+    jobs = result["jobs"]
+    rss = result["peak_rss_bytes"]
+    print(f"Jobs: {jobs['finished']}/{jobs['submitted']} finished, {jobs['failed']} failed")
+    print(f"Throughput: {result['chunks']} chunks in {result['elapsed_s']:.1f}s = {result['chunks_per_s']:.2f} chunks/s")
+    print(f"Job latency: {fmt(result['job_latency_s'])}")
+    print(f"Time to first audio: {fmt(result['time_to_first_audio_s'])}")
+    workers = f"{rss['workers'] / 2**20:.0f} MiB" if rss["workers"] else "in-process"
+    print(f"Peak RSS: API {rss['api'] / 2**20:.0f} MiB, worker {workers}")
+    up = result["upstream"]
+    print(f"Upstream: {up['requests']} requests, {up['errors']} errors, {up['throttled']} throttled, peak {up['peak_in_flight']} in flight")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--chars", type=int, default=20000, help="size of each generated document")
+    parser.add_argument("--file", help="submit this document instead of generated ones")
+    parser.add_argument("--interval", type=float, default=0.0, help="seconds between submissions")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes")
+    parser.add_argument("--stream", action="store_true", help="submit with stream=true")
+    parser.add_argument("--redis", default="redis://localhost:6379/15")
+    parser.add_argument("--flush", action="store_true", help="FLUSHDB the --redis database first")
+    parser.add_argument("--fakeredis", action="store_true", help="in-process Redis and worker (no server needed)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app settings")
+    parser.add_argument("--timeout", type=float, default=1800)
+    parser.add_argument("--output", help="result file (default: bench/results/e2e-<time>-<commit>.json)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    add_profile_args(parser)
+    args = parser.parse_args()
+    if args.worker:
+        _run_worker()
+        return
+    result = run(args)
+    _print(result)
+    print(f"Result: {write_result('e2e', result, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
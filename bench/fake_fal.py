@@ -0,0 +1,268 @@
+"""Local stand-in for the fal.ai VibeVoice endpoint (FAL_URL) with configurable latency, errors and audio.
+
+    python -m bench.fake_fal --port 8787 --latency lognormal:1.2:0.5 --per-char 0.002 --error-rate 0.02
+
+then point a worker at it with FAL_URL=http://127.0.0.1:8787/ FAL_KEY=bench MOCK_TTS=false.
+POST / takes the VibeVoice payload and answers {"audio": {"url": ...}} after a sampled delay;
+GET /audio/<seconds>.<ext> serves speech-length placeholder audio; GET /stats reports counters.
+"""
+from __future__ import annotations
+
+import io
+import json
+import math
+import time
+import wave
+import random
+import argparse
+import threading
+import subprocess
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import numpy as np
+
+# Speech rate used to size the returned audio from the script length
+CHARS_PER_SECOND = 15.0
+SAMPLE_RATE = 24000
+
+
+@dataclass
+class Profile:
+    """Behaviour of the fake upstream. Latency = base distribution + per_char * script length."""
+
+    latency: str = "fixed:0.5"  # fixed:S | uniform:LO:HI | lognormal:MEDIAN:SIGMA
+    per_char: float = 0.0
+    error_rate: float = 0.0  # answered 500
+    throttle_rate: float = 0.0  # answered 429 with Retry-After
+    retry_after: float = 1.0
+    payload: str = "mp3"  # mp3 | wav
+    seed: Optional[int] = None
+
+    def sample_latency(self, rng: random.Random, chars: int) -> float:
+        kind, *params = self.latency.split(":")
+        values = [float(p) for p in params]
+        if kind == "fixed":
+            base = values[0]
+        elif kind == "uniform":
+            base = rng.uniform(values[0], values[1])
+        elif kind == "lognormal":
+            base = rng.lognormvariate(math.log(values[0]), values[1])
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.latency}")
+        return base + self.per_char * chars
+
+
+@dataclass
+class Stats:
+    requests: int = 0
+    errors: int = 0
+    throttled: int = 0
+    downloads: int = 0
+    download_bytes: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    latencies: list = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            lat = sorted(self.latencies)
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "throttled": self.throttled,
+                "downloads": self.downloads,
+                "download_bytes": self.download_bytes,
+                "peak_in_flight": self.peak_in_flight,
+                "latency_p50": lat[len(lat) // 2] if lat else None,
+            }
+
+
+class _AudioCache:
+    """Placeholder audio per whole second of duration, encoded once."""
+
+    def __init__(self, payload: str):
+        self.payload = payload
+        self._files: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+
+    def get(self, seconds: int) -> bytes:
+        with self._lock:
+            data = self._files.get(seconds)
+            if data is None:
+                data = self._render(seconds)
+                self._files[seconds] = data
+            return data
+
+    def _render(self, seconds: int) -> bytes:
+        t = np.arange(seconds * SAMPLE_RATE, dtype=np.float32) / SAMPLE_RATE
+        envelope = 0.5 * (1.0 - np.cos(2 * np.pi * 4.0 * t))
+        pcm = (0.3 * 32767 * envelope * np.sin(2 * np.pi * 200.0 * t)).astype("<i2")
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(SAMPLE_RATE)
+            w.writeframes(pcm.tobytes())
+        if self.payload == "wav":
+            return buf.getvalue()
+        # VibeVoice returns MP3; encode like it so downloads and ffmpeg decode cost the same
+        out = subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-f", "wav", "-i", "pipe:0", "-c:a", "libmp3lame", "-b:a", "64k", "-f", "mp3", "pipe:1"],
+            input=buf.getvalue(),
+            capture_output=True,
+            check=True,
+        )
+        return out.stdout
+
+
+class FakeVibeVoice:
+    """Threaded HTTP server; start() runs it in the background, stop() shuts it down."""
+
+    def __init__(self, profile: Profile, host: str = "127.0.0.1", port: int = 0):
+        self.profile = profile
+        self.stats = Stats()
+        self.audio = _AudioCache(profile.payload)
+        self._rng = random.Random(profile.seed)
+        self._rng_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "FakeVibeVoice":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-fal", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _draw(self, chars: int) -> tuple[float, float]:
+        with self._rng_lock:
+            return self.profile.sample_latency(self._rng, chars), self._rng.random()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, status: int, data: dict, headers: Optional[dict] = None) -> None:
+                self._send(status, json.dumps(data).encode(), "application/json", headers)
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    script = json.loads(body)["script"]
+                except (ValueError, KeyError):
+                    self._json(422, {"detail": "script is required"})
+                    return
+                text = script.split(":", 1)[-1].strip()
+                delay, roll = fake._draw(len(text))
+                stats = fake.stats
+                with stats.lock:
+                    stats.requests += 1
+                    stats.in_flight += 1
+                    stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+                try:
+                    profile = fake.profile
+                    if roll < profile.throttle_rate:
+                        with stats.lock:
+                            stats.throttled += 1
+                        self._json(429, {"detail": "rate limited"}, {"Retry-After": f"{profile.retry_after:g}"})
+                        return
+                    time.sleep(delay)
+                    if roll < profile.throttle_rate + profile.error_rate:
+                        with stats.lock:
+                            stats.errors += 1
+                        self._json(500, {"detail": "simulated upstream failure"})
+                        return
+                    seconds = max(1, round(len(text) / CHARS_PER_SECOND))
+                    host = self.headers.get("Host") or "%s:%d" % fake.server.server_address[:2]
+                    url = f"http://{host}/audio/{seconds}.{profile.payload}"
+                    with stats.lock:
+                        stats.latencies.append(delay)
+                    self._json(200, {"audio": {"url": url}})
+                finally:
+                    with stats.lock:
+                        stats.in_flight -= 1
+
+            def do_GET(self) -> None:
+                if self.path == "/stats":
+                    self._json(200, fake.stats.snapshot())
+                    return
+                if not self.path.startswith("/audio/"):
+                    self._json(404, {"detail": "not found"})
+                    return
+                try:
+                    seconds = int(self.path.rsplit("/", 1)[1].split(".", 1)[0])
+                except ValueError:
+                    self._json(404, {"detail": "not found"})
+                    return
+                data = fake.audio.get(min(seconds, 600))
+                with fake.stats.lock:
+                    fake.stats.downloads += 1
+                    fake.stats.download_bytes += len(data)
+                self._send(200, data, "audio/mpeg" if fake.profile.payload == "mp3" else "audio/wav")
+
+        return Handler
+
+
+def add_profile_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", default="fixed:0.5", help="fixed:S | uniform:LO:HI | lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--per-char", type=float, default=0.0, help="extra seconds per script character")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After on 429, seconds")
+    parser.add_argument("--payload", choices=("mp3", "wav"), default="mp3")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def profile_from_args(args: argparse.Namespace) -> Profile:
+    return Profile(
+        latency=args.latency,
+        per_char=args.per_char,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        payload=args.payload,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    add_profile_args(parser)
+    args = parser.parse_args()
+    fake = FakeVibeVoice(profile_from_args(args), args.host, args.port)
+    print(f"Fake VibeVoice listening on {fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
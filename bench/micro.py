@@ -0,0 +1,126 @@
+"""Microbenchmarks of the pipeline's hot paths on generated corpus fixtures.
+
+    python -m bench.micro                 # everything
+    python -m bench.micro --only split    # cases whose name contains "split"
+    python -m bench.micro --quick         # smaller inputs, fewer repeats
+
+Cases: split_text and split_stream over plain text and over text without sentence breaks, parse_file per format, and audio assembly
+(concat_and_normalize, normalize_segment, concat_segments) by segment count. Each case reports
+min/p50/p95 seconds over --repeat runs after a warm-up run; compare p50s across commits with
+bench.compare.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import argparse
+import tempfile
+from typing import Callable, Dict, List, Tuple
+
+from . import corpus
+from .common import summarize, time_call, write_result
+
+
+Case = Tuple[str, Callable[[], object], Dict[str, float]]
+
+
+def _text_cases(quick: bool) -> List[Case]:
+    """(name, fn, units) where units maps a throughput unit to the amount one call processes."""
+    from app.parser import iter_file, parse_file
+    from app.splitter import split_stream, split_text
+
+    scale = 0.1 if quick else 1.0
+    big = int(1_000_000 * scale)
+    small = int(100_000 * scale)
+    doc = int(300_000 * scale)
+    cases: List[Case] = []
+
+    for chars in (small, big):
+        text = corpus.text(chars)
+        cases.append((f"split_text[{chars}]", lambda t=text: split_text(t), {"chars": len(text)}))
+    # No sentence breaks at all: must stay linear (the unfinished-sentence tail is flushed at max_chars)
+    frags = ["word " * 20] * (big // 100)
+    cases.append(
+        (f"split_stream[unpunctuated {big}]", lambda: sum(1 for _ in split_stream(frags)), {"chars": 100 * len(frags)})
+    )
+    txt = corpus.txt_file(big)
+    cases.append(
+        (f"split_stream(iter_file)[txt {big}]", lambda: sum(1 for _ in split_stream(iter_file(txt))), {"chars": big})
+    )
+    for path in (corpus.txt_file(big), corpus.docx_file(doc), corpus.pdf_file(doc)):
+        chars = big if path.endswith(".txt") else doc
+        ext = os.path.splitext(path)[1][1:]
+        cases.append((f"parse_file[{ext} {chars}]", lambda p=path: parse_file(p), {"chars": chars}))
+    return cases
+
+
+def _audio_cases(quick: bool, workdir: str) -> List[Case]:
+    from app.audio_utils import concat_and_normalize, concat_segments, mock_speech, normalize_segment
+
+    cases: List[Case] = []
+    # 4 s speech-like segments, like a ~60-char chunk
+    segments = [mock_speech(4.0, 160 + i % 40, dest_dir=workdir) for i in range(32)]
+    out = os.path.join(workdir, "out")
+    for n in ((1, 8) if quick else (1, 8, 32)):
+        cases.append(
+            (
+                f"concat_and_normalize[{n} segments]",
+                lambda n=n: concat_and_normalize(segments[:n], f"{out}-single.mp3"),
+                {"audio_s": 4.0 * n},
+            )
+        )
+    cases.append(
+        ("normalize_segment", lambda: normalize_segment(segments[0], os.path.join(workdir, "norm.mp3")), {"audio_s": 4.0})
+    )
+    encoded = [normalize_segment(p, os.path.join(workdir, f"enc-{i}.mp3")) for i, p in enumerate(segments)]
+    for n in ((8,) if quick else (8, 32)):
+        cases.append(
+            (
+                f"concat_segments[{n} segments]",
+                lambda n=n: concat_segments(encoded[:n], f"{out}-segmented.mp3"),
+                {"audio_s": 4.0 * n},
+            )
+        )
+    return cases
+
+
+AUDIO_CASES = ("concat_and_normalize", "normalize_segment", "concat_segments")
+
+
+def run(args: argparse.Namespace) -> dict:
+    workdir = tempfile.mkdtemp(prefix="tts-micro-")
+    results = {}
+    try:
+        cases = _text_cases(args.quick)
+        # Rendering and encoding the audio fixtures takes a while; only when an audio case is wanted
+        if not args.only or any(args.only in name for name in AUDIO_CASES):
+            cases += _audio_cases(args.quick, workdir)
+        for name, fn, units in cases:
+            if args.only and args.only not in name:
+                continue
+            samples = time_call(fn, repeat=args.repeat)
+            stats = summarize(samples)
+            stats["throughput"] = {f"{unit}/s": round(amount / stats["p50"], 1) for unit, amount in units.items()}
+            results[name] = stats
+            rate = ", ".join(f"{v:,.0f} {k}" for k, v in stats["throughput"].items())
+            print(f"{name:<40} p50 {stats['p50'] * 1000:9.2f} ms  min {stats['min'] * 1000:9.2f} ms  ({rate})")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"params": {"quick": args.quick, "repeat": args.repeat, "only": args.only}, "cases": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help="run only cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=None, help="measured runs per case (default 5, quick 3)")
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--output", help="result file (default: bench/results/micro-<time>-<commit>.json)")
+    args = parser.parse_args()
+    if args.repeat is None:
+        args.repeat = 3 if args.quick else 5
+    result = run(args)
+    print(f"Result: {write_result('micro', result, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,49 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 
 const API_URL = import.meta.env.VITE_API_URL || '' // same origin by default
 
+const resolveUrl = (u) => {
+  if (!u) return null
+  if (/^https?:\/\//i.test(u)) return u
+  const base = (API_URL || '').replace(/\/+$/, '')
+  const path = u.startsWith('/') ? u : `/${u}`
+  return `${base}${path}`
+}
+
+// Live HLS playlist: native in Safari, through hls.js (loaded on demand) everywhere else
+function StreamPlayer({ src }) {
+  const ref = useRef(null)
+
+  useEffect(() => {
+    const audio = ref.current
+    if (!audio || !src) return
+    if (audio.canPlayType('application/vnd.apple.mpegurl')) {
+      audio.src = src
+      return
+    }
+    let hls = null
+    let cancelled = false
+    import('hls.js')
+      .then(({ default: Hls }) => {
+        if (cancelled) return
+        if (!Hls.isSupported()) {
+          audio.src = src
+          return
+        }
+        hls = new Hls()
+        hls.loadSource(src)
+        hls.attachMedia(audio)
+      })
+      .catch((e) => console.error(e))
+    return () => {
+      cancelled = true
+      if (hls) hls.destroy()
+    }
+  }, [src])
+
+  return <audio ref={ref} controls style={{ width: '100%' }} />
+}
+
 export default function App() {
   const [file, setFile] = useState(null)
   const [presets, setPresets] = useState([])
@@ -13,6 +55,9 @@ export default function App() {
   const [totalChunks, setTotalChunks] = useState(null)
   const [processedChunks, setProcessedChunks] = useState(null)
   const [filename, setFilename] = useState(() => localStorage.getItem('tts-filename') || null)
+  const [stream, setStream] = useState(false)
+  const [outputFormat, setOutputFormat] = useState('')
+  const [streamUrl, setStreamUrl] = useState(null)
 
   // Load voice presets from API
   useEffect(() => {
@@ -33,38 +78,64 @@ export default function App() {
 
   useEffect(() => {
     if (!jobId) return
-    const t = setInterval(async () => {
-      try {
-        const r = await fetch(`${API_URL}/tts/${jobId}`)
-        if (!r.ok) throw new Error('Failed to fetch status')
-        const data = await r.json()
-        setStatus(data.status)
-        setTotalChunks(data.total_chunks ?? null)
-        setProcessedChunks(data.processed_chunks ?? null)
-        if (data.status === 'finished' && data.audio_url) {
-          const resolveUrl = (u) => {
-            if (!u) return null
-            if (/^https?:\/\//i.test(u)) return u
-            const base = (API_URL || '').replace(/\/+$/, '')
-            const path = u.startsWith('/') ? u : `/${u}`
-            return `${base}${path}`
-          }
-          const resolvedUrl = resolveUrl(data.audio_url)
-          setAudioUrl(resolvedUrl)
-          // Persist to localStorage
-          localStorage.setItem('tts-status', data.status)
-          localStorage.setItem('tts-audio-url', resolvedUrl)
-          clearInterval(t)
-        }
-        if (data.status === 'failed') {
-          setError(data.error || 'Job failed')
-          clearInterval(t)
+    let es = null
+    let poll = null
+
+    // Same payload from the event stream and from GET /tts/{job_id}; returns true once the job is done
+    const apply = (data) => {
+      setStatus(data.status)
+      setTotalChunks(data.total_chunks ?? null)
+      setProcessedChunks(data.processed_chunks ?? null)
+      setStreamUrl(data.stream_url ? resolveUrl(data.stream_url) : null)
+      if (data.status === 'finished' && data.audio_url) {
+        const resolvedUrl = resolveUrl(data.audio_url)
+        setAudioUrl(resolvedUrl)
+        // Persist to localStorage
+        localStorage.setItem('tts-status', data.status)
+        localStorage.setItem('tts-audio-url', resolvedUrl)
+        return true
+      }
+      if (data.status === 'failed') {
+        setError(data.error || 'Job failed')
+        return true
+      }
+      if (data.status === 'stopped' || data.status === 'canceled') {
+        setError(data.error || `Job ${data.status}`)
+        return true
+      }
+      return false
+    }
+
+    // Fallback when EventSource is unavailable or the events endpoint can't be reached
+    const startPolling = () => {
+      if (poll) return
+      poll = setInterval(async () => {
+        try {
+          const r = await fetch(`${API_URL}/tts/${jobId}`)
+          if (!r.ok) throw new Error('Failed to fetch status')
+          if (apply(await r.json())) clearInterval(poll)
+        } catch (e) {
+          console.error(e)
         }
-      } catch (e) {
-        console.error(e)
+      }, 1500)
+    }
+
+    if (typeof window.EventSource === 'function') {
+      es = new EventSource(`${API_URL}/tts/${jobId}/events`)
+      es.onmessage = (ev) => {
+        if (apply(JSON.parse(ev.data))) es.close()
+      }
+      es.onerror = () => {
+        // CONNECTING means the browser is retrying by itself; CLOSED means it gave up
+        if (es.readyState === EventSource.CLOSED) startPolling()
       }
-    }, 1500)
-    return () => clearInterval(t)
+    } else {
+      startPolling()
+    }
+    return () => {
+      if (es) es.close()
+      if (poll) clearInterval(poll)
+    }
   }, [jobId])
 
   const onSubmit = async (e) => {
@@ -75,6 +146,7 @@ export default function App() {
     setJobId(null)
     setTotalChunks(null)
     setProcessedChunks(null)
+    setStreamUrl(null)
     if (!file) {
       setError('Please select a file')
       return
@@ -82,17 +154,27 @@ export default function App() {
     const form = new FormData()
     form.append('file', file)
     form.append('preset', preset)
+    form.append('stream', stream ? 'true' : 'false')
+    if (outputFormat) form.append('output_format', outputFormat)
     try {
       const r = await fetch(`${API_URL}/tts`, { method: 'POST', body: form })
       if (!r.ok) throw new Error(await r.text())
       const data = await r.json()
-      setJobId(data.job_id)
       setStatus(data.status)
       setFilename(file.name)
+      localStorage.setItem('tts-filename', file.name)
+      // Identical document already converted: the API answers with the audio straight away
+      if (data.status === 'finished' && data.audio_url) {
+        const resolvedUrl = resolveUrl(data.audio_url)
+        setAudioUrl(resolvedUrl)
+        localStorage.setItem('tts-status', data.status)
+        localStorage.setItem('tts-audio-url', resolvedUrl)
+        return
+      }
+      setJobId(data.job_id)
       // Persist to localStorage
       localStorage.setItem('tts-job-id', data.job_id)
       localStorage.setItem('tts-status', data.status)
-      localStorage.setItem('tts-filename', file.name)
     } catch (e) {
       setError(String(e))
     }
@@ -105,6 +187,7 @@ export default function App() {
     setError(null)
     setTotalChunks(null)
     setProcessedChunks(null)
+    setStreamUrl(null)
     setFilename(null)
     localStorage.removeItem('tts-job-id')
     localStorage.removeItem('tts-status')
@@ -144,6 +227,20 @@ export default function App() {
             ))}
           </select>
         </div>
+        <div style={{ margin: '1rem 0' }}>
+          <label>Output format: </label>
+          <select value={outputFormat} onChange={(e) => setOutputFormat(e.target.value)}>
+            <option value="">Server default</option>
+            <option value="mp3">MP3</option>
+            <option value="aac">AAC (.m4a)</option>
+            <option value="opus">Opus (.ogg)</option>
+          </select>
+        </div>
+        <div style={{ margin: '1rem 0' }}>
+          <label>
+            <input type="checkbox" checked={stream} onChange={(e) => setStream(e.target.checked)} /> Listen while generating (HLS)
+          </label>
+        </div>
         <div style={{ display: 'flex', gap: '0.5rem' }}>
           <button type="submit">Generate Audio</button>
           {(audioUrl || status) && (
@@ -154,10 +251,17 @@ export default function App() {
         </div>
       </form>
       {status && <p>Status: <strong>{status}</strong></p>}
-      {(status === 'queued' || status === 'started' || status === 'running') && totalChunks && (
+      {(status === 'queued' || status === 'started' || status === 'running') && (totalChunks || processedChunks) && (
+        <div style={{ margin: '0.5rem 0' }}>
+          {/* total_chunks stays null until the document has been fully read */}
+          <div style={{ marginBottom: 4 }}>Progress: {processedChunks ?? 0} / {totalChunks ?? '…'}</div>
+          <progress value={totalChunks ? (processedChunks ?? 0) : undefined} max={totalChunks || undefined} style={{ width: '100%' }} />
+        </div>
+      )}
+      {streamUrl && !audioUrl && (
         <div style={{ margin: '0.5rem 0' }}>
-          <div style={{ marginBottom: 4 }}>Progress: {processedChunks ?? 0} / {totalChunks}</div>
-          <progress value={processedChunks ?? 0} max={totalChunks} style={{ width: '100%' }} />
+          <StreamPlayer src={streamUrl} />
+          <a href={streamUrl} target="_blank" rel="noopener noreferrer">Open live stream playlist</a>
         </div>
       )}
       {error && <p style={{ color: 'crimson' }}>Error: {error}</p>}
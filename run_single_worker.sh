@@ -29,4 +29,4 @@ export OBJC_DISABLE_INITIALIZE_FORK_SAFETY=YES
 export PATH="/opt/homebrew/bin:$PATH"
 
 # Start single worker with explicit process replacement
-exec python -c "from redis import Redis; from rq import Worker, Queue; from app.config import settings; r=Redis.from_url(settings.redis_url); Worker([Queue(settings.queue_name, connection=r)], connection=r).work()"
+exec python -c "from redis import Redis; from rq import Worker, Queue; from app.config import settings; from app.scheduler import queue_names; r=Redis.from_url(settings.redis_url); Worker([Queue(n, connection=r) for n in queue_names()], connection=r).work()"
@@ -11,6 +11,7 @@ os.environ['PATH'] = '/opt/homebrew/bin:' + os.environ.get('PATH', '')
 
 # Import settings after environment is set
 from app.config import settings
+from app.scheduler import queue_names
 
 def signal_handler(signum, frame):
     print(f"\nReceived signal {signum}. Shutting down gracefully...")
@@ -26,13 +27,13 @@ if __name__ == '__main__':
     # Connect to Redis
     redis_conn = Redis.from_url(settings.redis_url)
     
-    # Create queue
-    queue = Queue(settings.queue_name, connection=redis_conn)
+    # Create queues (priority lanes, highest first)
+    queues = [Queue(name, connection=redis_conn) for name in queue_names()]
     
     # Create worker with no forking
-    worker = Worker([queue], connection=redis_conn)
+    worker = Worker(queues, connection=redis_conn)
     
-    print(f"Worker listening on queue: {settings.queue_name}")
+    print(f"Worker listening on queues: {', '.join(q.name for q in queues)}")
     print(f"Redis URL: {settings.redis_url}")
     print("Press Ctrl+C to stop...")
     
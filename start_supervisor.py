@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""Run WORKERS_MIN..WORKERS_MAX SimpleWorkers forked from one preloaded process (see app/supervisor.py)."""
+
+import os
+
+# macOS compatibility (forking after Objective-C frameworks were loaded)
+os.environ['OBJC_DISABLE_INITIALIZE_FORK_SAFETY'] = 'YES'
+os.environ['PATH'] = '/opt/homebrew/bin:' + os.environ.get('PATH', '')
+
+# .env is read once here; every worker inherits the environment and the imported modules
+from app.envfile import load_env
+
+load_env()
+
+from app.supervisor import main
+
+if __name__ == '__main__':
+    main()
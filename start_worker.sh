@@ -8,4 +8,4 @@ export PATH="/opt/homebrew/bin:$PATH"
 PYTHON_PATH="/Users/my_studio/.local/share/mamba/envs/ai38/bin/python"
 
 # Start the worker
-$PYTHON_PATH -c "from redis import Redis; from rq import Worker, Queue; from app.config import settings; r=Redis.from_url(settings.redis_url); Worker([Queue(settings.queue_name, connection=r)], connection=r).work()"
\ No newline at end of file
+$PYTHON_PATH -c "from redis import Redis; from rq import Worker, Queue; from app.config import settings; from app.scheduler import queue_names; r=Redis.from_url(settings.redis_url); Worker([Queue(n, connection=r) for n in queue_names()], connection=r).work()"
\ No newline at end of file
@@ -1,14 +1,37 @@
 #!/usr/bin/env python3
 """
-TTS Status Monitor - Check the status of the TTS job queue and workers
+TTS Status Monitor - queues, workers and jobs of the TTS cluster
+
+    python tts_monitor.py                 # one report
+    python tts_monitor.py --watch         # refresh every 2s with rates and a throughput trend
+    python tts_monitor.py --watch 5 --json   # one JSON snapshot per line, for scripts
+    python tts_monitor.py --clean         # unregister dead workers, requeue/fail their abandoned jobs
+
+Each refresh costs three pipelined Redis round trips (queues + registries + index counts, then
+worker hashes, then the jobs workers are running), however many jobs there are. Rates are
+differences between refreshes, so they appear from the second one on.
 """
-import os
 import sys
+import json
+import time
+import argparse
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
 from redis import Redis
 from rq import Queue
-from rq.job import Job
-from rq.registry import FailedJobRegistry
+from rq.defaults import DEFAULT_WORKER_TTL
+from rq.worker import BaseWorker
+from rq.worker_registration import REDIS_WORKER_KEYS, WORKERS_BY_QUEUE_KEY
+
 from app.config import settings
+from app import fanout, jobindex, metrics
+from app.scheduler import queue_names
+
+WORKER_FIELDS = ("state", "current_job", "last_heartbeat", "hostname", "pid", "successful_job_count", "failed_job_count")
+SPARK = " ▁▂▃▄▅▆▇█"
+
 
 def check_redis():
     """Check Redis connection."""
@@ -20,126 +43,283 @@ def check_redis():
         print(f"❌ Redis connection failed: {e}")
         return None, False
 
-def get_queue_stats(redis_conn):
-    """Get queue statistics."""
-    try:
-        q = Queue(settings.queue_name, connection=redis_conn)
-        failed_registry = FailedJobRegistry(queue=q)
-        
-        # Count workers differently
-        worker_keys = redis_conn.smembers('rq:workers:tts')
-        worker_count = len(worker_keys) if worker_keys else 0
-        
-        stats = {
-            'queued': len(q),
-            'failed': len(failed_registry),
-            'workers': worker_count,
-            'wip': redis_conn.zcard('rq:wip:tts')
-        }
-        return stats
-    except Exception as e:
-        print(f"❌ Failed to get queue stats: {e}")
+
+def _text(value) -> Optional[str]:
+    return value.decode("utf-8", errors="replace") if isinstance(value, bytes) else value
+
+
+def _heartbeat_age(raw: Optional[str], now: float) -> Optional[float]:
+    if not raw:
         return None
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ"):
+        try:
+            beat = datetime.strptime(raw, fmt).replace(tzinfo=timezone.utc).timestamp()
+            return max(0.0, now - beat)
+        except ValueError:
+            continue
+    return None
+
+
+def snapshot(redis_conn: Redis, stale_after: float) -> dict:
+    """Queues, workers and running jobs in three pipelined round trips."""
+    now = time.time()
+    queues = [Queue(name, connection=redis_conn) for name in queue_names()]
+    synth_key, synth_field = metrics.count_field("tts_stage_seconds", stage="synthesize")
+
+    pipe = redis_conn.pipeline(transaction=False)
+    for q in queues:
+        pipe.llen(q.key)
+        pipe.zcard(q.started_job_registry.key)
+        pipe.zcard(q.failed_job_registry.key)
+        pipe.lindex(q.key, 0)  # oldest queued job
+        pipe.smembers(WORKERS_BY_QUEUE_KEY % q.name)
+    jobindex.queue_counts(pipe, since=now - 300)
+    pipe.hget(synth_key, synth_field)
+    results = pipe.execute()
+
+    lanes = {}
+    worker_keys = set()
+    heads = {}
+    for i, q in enumerate(queues):
+        queued, running, failed, head, members = results[i * 5 : i * 5 + 5]
+        lanes[q.name] = {"queued": queued, "running": running, "failed": failed, "oldest_wait_s": None}
+        if head:
+            heads[q.name] = _text(head)
+        worker_keys.update(_text(k) for k in members)
+    rest = results[len(queues) * 5 :]
+    index_counts = dict(zip(jobindex.STATUSES, rest[: len(jobindex.STATUSES)]))
+    created_total, created_5m, synthesized = rest[len(jobindex.STATUSES) :]
+
+    # Worker hashes and the queue heads' creation times
+    worker_keys = sorted(worker_keys)
+    pipe = redis_conn.pipeline(transaction=False)
+    for key in worker_keys:
+        pipe.hmget(key, WORKER_FIELDS)
+    for job_id in heads.values():
+        jobindex.queue_created_at(pipe, job_id)
+    results = pipe.execute()
+    for name, created in zip(heads, results[len(worker_keys) :]):
+        if created:
+            lanes[name]["oldest_wait_s"] = round(now - float(created), 1)
+
+    workers = []
+    for key, values in zip(worker_keys, results[: len(worker_keys)]):
+        fields = dict(zip(WORKER_FIELDS, (_text(v) for v in values)))
+        age = _heartbeat_age(fields["last_heartbeat"], now)
+        if fields["state"] is None:
+            # Still registered but the hash expired: the worker died without unregistering
+            health = "dead"
+        elif fields["state"] != "busy" and age is not None and age > stale_after:
+            # Busy workers heartbeat per job (timeout + 60s); idle ones at least every worker TTL
+            health = "stale"
+        else:
+            health = "ok"
+        workers.append(
+            {
+                "name": key[len(BaseWorker.redis_worker_namespace_prefix) :],
+                "key": key,
+                "health": health,
+                "state": fields["state"],
+                "host": fields["hostname"],
+                "pid": int(fields["pid"]) if fields["pid"] else None,
+                "heartbeat_age_s": round(age, 1) if age is not None else None,
+                "current_job": fields["current_job"],
+                "successful": int(fields["successful_job_count"] or 0),
+                "failed": int(fields["failed_job_count"] or 0),
+            }
+        )
+
+    # What busy workers are on: part/finalize jobs report progress under their parent
+    current = {w["current_job"]: fanout.parent_of(w["current_job"]) or w["current_job"] for w in workers if w["current_job"]}
+    indexed = jobindex.get_many(redis_conn, sorted(set(current.values()))) if current else {}
+    for w in workers:
+        job = indexed.get(current.get(w["current_job"]))
+        if job:
+            w["job"] = {
+                "job_id": job["job_id"],
+                "filename": job["filename"],
+                "processed_chunks": job["processed_chunks"],
+                "total_chunks": job["total_chunks"],
+                "queued_seconds": job["queued_seconds"],
+                "running_s": round(now - job["started_at"], 1) if job["started_at"] else None,
+            }
+    waits = [j["queued_seconds"] for j in indexed.values() if j and j["queued_seconds"] is not None]
+
+    return {
+        "time": now,
+        "lanes": lanes,
+        "queued": sum(lane["queued"] for lane in lanes.values()),
+        "running": sum(lane["running"] for lane in lanes.values()),
+        "failed": sum(lane["failed"] for lane in lanes.values()),
+        "index": index_counts,
+        "created_total": created_total,
+        "enqueued_5m": created_5m,
+        # Cluster-wide, as of each process's last metrics flush (METRICS_FLUSH_INTERVAL)
+        "chunks_synthesized": int(synthesized) if synthesized else None,
+        "running_queue_wait_s": round(sum(waits) / len(waits), 1) if waits else None,
+        "workers": workers,
+    }
+
+
+def add_rates(snap: dict, prev: Optional[dict], trend: deque) -> None:
+    """Per-minute rates since the previous snapshot; trend keeps recent chunks/min samples."""
+    snap["rates_per_min"] = None
+    if prev is None:
+        return
+    minutes = max(1e-9, (snap["time"] - prev["time"]) / 60)
+
+    def rate(cur, old) -> Optional[float]:
+        if cur is None or old is None:
+            return None
+        # Index trims and resumed jobs can make a count go down; that isn't negative throughput
+        return round(max(0, cur - old) / minutes, 2)
+
+    snap["rates_per_min"] = {
+        "enqueued": rate(snap["created_total"], prev["created_total"]),
+        "finished": rate(snap["index"]["finished"], prev["index"]["finished"]),
+        "failed": rate(snap["index"]["failed"], prev["index"]["failed"]),
+        "chunks": rate(snap["chunks_synthesized"], prev["chunks_synthesized"]),
+    }
+    if snap["rates_per_min"]["chunks"] is not None:
+        trend.append(snap["rates_per_min"]["chunks"])
+    snap["chunks_per_min_trend"] = list(trend)
 
-def show_recent_jobs(redis_conn, limit=5):
+
+def _spark(values) -> str:
+    if not values:
+        return ""
+    top = max(values) or 1
+    return "".join(SPARK[round(v / top * (len(SPARK) - 1))] for v in values)
+
+
+def _age(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    return f"{seconds / 60:.0f}m" if seconds < 7200 else f"{seconds / 3600:.1f}h"
+
+
+def render(snap: dict) -> str:
+    lines = [f"🔍 TTS Status Monitor — {datetime.fromtimestamp(snap['time']).strftime('%H:%M:%S')}", "=" * 60]
+    lines.append(f"📊 Queued {snap['queued']}  running {snap['running']}  failed {snap['failed']}  (enqueued last 5m: {snap['enqueued_5m']})")
+    for name, lane in snap["lanes"].items():
+        lines.append(
+            f"   {name:<16} queued {lane['queued']:>4}  running {lane['running']:>3}  failed {lane['failed']:>4}"
+            f"  oldest waiting {_age(lane['oldest_wait_s'])}"
+        )
+    counts = ", ".join(f"{k}: {v}" for k, v in snap["index"].items())
+    lines.append(f"   Indexed jobs — {counts}")
+    if snap["running_queue_wait_s"] is not None:
+        lines.append(f"   Running jobs waited {_age(snap['running_queue_wait_s'])} in the queue on average")
+
+    rates = snap.get("rates_per_min")
+    if rates:
+        def fmt(v):
+            return "-" if v is None else f"{v:g}"
+
+        lines.append(
+            f"📈 Per minute: enqueued {fmt(rates['enqueued'])}  finished {fmt(rates['finished'])}"
+            f"  failed {fmt(rates['failed'])}  chunks {fmt(rates['chunks'])}"
+        )
+        if snap.get("chunks_per_min_trend"):
+            lines.append(f"   Chunks/min trend: {_spark(snap['chunks_per_min_trend'])}")
+
+    workers = snap["workers"]
+    alive = [w for w in workers if w["health"] != "dead"]
+    lines.append(f"\n👷 Workers: {len(alive)} ({sum(w['state'] == 'busy' for w in alive)} busy)")
+    for w in workers:
+        mark = {"ok": "✅", "stale": "⚠️ ", "dead": "💀"}[w["health"]]
+        where = f"{w['host']}:{w['pid']}" if w["host"] else w["name"]
+        line = f"  {mark} {where:<28} {w['state'] or 'gone':<9} heartbeat {_age(w['heartbeat_age_s'])} ago"
+        job = w.get("job")
+        if job:
+            done = f"{job['processed_chunks'] or 0}/{job['total_chunks'] or '?'}"
+            line += f" | {job['job_id'][:8]} {job['filename'] or ''} {done} chunks, running {_age(job['running_s'])}"
+        elif w["current_job"]:
+            line += f" | {w['current_job'][:8]}"
+        lines.append(line)
+    if not alive:
+        lines.append("⚠️  WARNING: No active workers found! Run 'make worker' to start a worker process")
+    elif any(w["health"] != "ok" for w in workers):
+        lines.append("   Dead/stale workers can be unregistered with --clean")
+    return "\n".join(lines)
+
+
+def show_recent_jobs(redis_conn: Redis, limit: int = 5) -> None:
     """Show recent job statuses."""
-    try:
-        # Get job IDs from failed registry
-        failed_jobs = redis_conn.zrange('rq:failed:tts', 0, limit-1)
-        
-        print(f"\n📋 Recent Jobs (last {limit}):")
-        print("-" * 60)
-        
-        for job_id_bytes in failed_jobs[-limit:]:
-            try:
-                job_id = job_id_bytes.decode('utf-8') if isinstance(job_id_bytes, bytes) else job_id_bytes
-                job = Job.fetch(job_id, connection=redis_conn)
-                print(f"Job {job_id[:8]}... | Status: {job.get_status()} | Created: {job.created_at}")
-                if hasattr(job, 'meta') and job.meta:
-                    total = job.meta.get('total_chunks', '?')
-                    processed = job.meta.get('processed_chunks', '?')
-                    print(f"  Progress: {processed}/{total} chunks")
-            except Exception as e:
-                job_display = job_id_bytes[:8] if isinstance(job_id_bytes, bytes) else job_id_bytes[:8]
-                print(f"Job {job_display}... | Error fetching details: {e}")
-        
-        # Also check for any jobs in work-in-progress
-        wip_jobs = redis_conn.zrange('rq:wip:tts', 0, -1)
-        if wip_jobs:
-            print(f"\n⏳ Work-in-Progress Jobs:")
-            for wip_id in wip_jobs:
-                # Redis returns bytes; decode to str before splitting/printing
-                if isinstance(wip_id, bytes):
-                    wip_id_str = wip_id.decode('utf-8', errors='replace')
-                else:
-                    wip_id_str = wip_id
-                job_id = wip_id_str.split(':')[0]
-                print(f"  {job_id[:8]}...")
-                
-    except Exception as e:
-        print(f"❌ Failed to show recent jobs: {e}")
+    # One page from the job index: two pipelined round trips however many jobs are shown
+    page = jobindex.list_jobs(redis_conn, limit=limit)
+    print(f"\n📋 Recent Jobs (last {limit}):")
+    print("-" * 60)
+    for job in page["jobs"]:
+        created = datetime.fromtimestamp(job["created_at"]) if job["created_at"] else "?"
+        print(f"Job {job['job_id'][:8]}... | Status: {job['status']} | {job['filename']} | Created: {created}")
+        if job["processed_chunks"] is not None:
+            print(f"  Progress: {job['processed_chunks']}/{job['total_chunks'] or '?'} chunks")
+        if job["error"]:
+            print(f"  Error: {job['error']}")
+
+
+def clean_stale_data(redis_conn: Redis, snap: dict) -> dict:
+    """Unregister dead workers and let RQ fail or requeue the jobs they abandoned.
+
+    Only workers whose hash has expired are removed: a live worker registers once at startup,
+    so removing it would hide it from every monitor until it restarts.
+    """
+    dead = [w for w in snap["workers"] if w["health"] == "dead"]
+    if dead:
+        pipe = redis_conn.pipeline(transaction=False)
+        for w in dead:
+            pipe.srem(REDIS_WORKER_KEYS, w["key"])
+            for name in snap["lanes"]:
+                pipe.srem(WORKERS_BY_QUEUE_KEY % name, w["key"])
+        pipe.execute()
+    # Jobs past their timeout in the started registry: retried if they have retries left, else failed
+    for name in snap["lanes"]:
+        Queue(name, connection=redis_conn).started_job_registry.cleanup()
+    return {"workers_removed": len(dead)}
 
-def clean_stale_data(redis_conn):
-    """Clean stale worker registrations and orphaned jobs."""
-    try:
-        # Clean stale worker registrations
-        workers_cleaned = redis_conn.delete('rq:workers:tts')
-        
-        # Clean orphaned work-in-progress jobs
-        wip_jobs = redis_conn.zrange('rq:wip:tts', 0, -1)
-        wip_cleaned = 0
-        if wip_jobs:
-            wip_cleaned = redis_conn.zrem('rq:wip:tts', *wip_jobs)
-        
-        print(f"🧹 Cleaned {workers_cleaned} worker registrations, {wip_cleaned} orphaned WIP jobs")
-        return True
-    except Exception as e:
-        print(f"❌ Failed to clean stale data: {e}")
-        return False
 
 def main():
-    """Main function."""
-    print("🔍 TTS Status Monitor")
-    print("=" * 50)
-    
-    # Check Redis
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--watch", nargs="?", type=float, const=2.0, metavar="SECONDS", help="refresh every SECONDS (default 2)")
+    parser.add_argument("--json", action="store_true", help="print snapshots as JSON (one line each with --watch)")
+    parser.add_argument("--clean", action="store_true", help="unregister dead workers and clean up abandoned jobs")
+    parser.add_argument("--stale", type=float, default=DEFAULT_WORKER_TTL, help="idle heartbeat age that counts as stale, seconds")
+    parser.add_argument("--trend", type=int, default=30, help="chunks/min samples in the trend line")
+    args = parser.parse_args()
+
     redis_conn, redis_ok = check_redis()
     if not redis_ok:
         sys.exit(1)
-    print("✅ Redis connection OK")
-    
-    # Get queue statistics
-    stats = get_queue_stats(redis_conn)
-    if stats:
-        print(f"\n📊 Queue Statistics:")
-        print(f"  Queued jobs: {stats['queued']}")
-        print(f"  Failed jobs: {stats['failed']}")
-        print(f"  Active workers: {stats['workers']}")
-        print(f"  Work-in-progress: {stats['wip']}")
-        
-        # Status assessment
-        if stats['workers'] == 0:
-            print("\n⚠️  WARNING: No active workers found!")
-            print("   Run 'make worker' to start a worker process")
-        elif stats['queued'] > 0:
-            print(f"\n✅ {stats['queued']} job(s) waiting to be processed")
-        else:
-            print("\n✅ System ready - no jobs in queue")
-    
-    # Show recent jobs
-    show_recent_jobs(redis_conn)
-    
-    # Offer to clean stale data if needed
-    if stats and (stats['wip'] > 0 or len(sys.argv) > 1 and sys.argv[1] == '--clean'):
-        print(f"\n🧹 Clean stale data? (y/N): ", end='')
-        if len(sys.argv) > 1 and sys.argv[1] == '--clean':
-            response = 'y'
-            print('y (auto-clean)')
-        else:
-            response = input().lower().strip()
-        
-        if response in ['y', 'yes']:
-            clean_stale_data(redis_conn)
+
+    trend: deque = deque(maxlen=args.trend)
+    prev = None
+    tty = sys.stdout.isatty()
+    try:
+        while True:
+            snap = snapshot(redis_conn, args.stale)
+            add_rates(snap, prev, trend)
+            if args.clean:
+                snap["cleaned"] = clean_stale_data(redis_conn, snap)
+            if args.json:
+                print(json.dumps(snap, indent=None if args.watch else 2), flush=True)
+            else:
+                if args.watch and tty:
+                    print("\x1b[H\x1b[2J", end="")
+                print(render(snap))
+                if "cleaned" in snap:
+                    print(f"🧹 Unregistered {snap['cleaned']['workers_removed']} dead worker(s)")
+                if not args.watch:
+                    show_recent_jobs(redis_conn)
+            if not args.watch:
+                break
+            prev = snap
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        pass
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()